@@ -0,0 +1,232 @@
+import gzip
+import io
+import json
+import logging
+import os
+import threading
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+from urllib.parse import parse_qsl, urlencode, urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPResponse
+import client
+import httpcache
+
+logger = logging.getLogger(__name__)
+
+# Headers of a misportal response kept in the archive
+ARCHIVED_HEADERS = ["Content-Type", "ETag", "Last-Modified"]
+
+def requestKey(url: str) -> str:
+    """
+    Returns the key of a request in an archive: its path and sorted query.
+
+    The host is left out, so an archive replays whatever MISPORTALHOST and
+    the json_record_urls of its listings point to.
+
+    Args:
+        url (str): The URL of the request.
+
+    Returns:
+        str: The key, e.g. "/sti/publications/search.json?search%5Bpub_year%5D=2020&...".
+    """
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return f"{parts.path}?{query}" if query else parts.path
+
+def _rawResponse(status: int, headers: dict, body: bytes) -> HTTPResponse:
+    return HTTPResponse(body=io.BytesIO(body), headers=headers, status=status,
+                        preload_content=False, decode_content=False)
+
+class ArchiveWriter:
+    """
+    Appends misportal responses to a gzipped JSONL archive.
+
+    Each capture appends a new gzip member to the file, which gzip readers
+    see as one stream, so an archive grows over many captures and nothing
+    in it is ever rewritten. Each line holds the key, status, headers and
+    body of one response, or the passes of the run captured.
+
+    Args:
+        path (str): The archive, e.g. "archives/pub.jsonl.gz".
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.file = gzip.open(path, "at", encoding="utf-8")
+        self.lock = threading.Lock()
+        self.count = 0
+
+    def write(self, url: str, status: int, headers, body: bytes):
+        line = json.dumps({"key": requestKey(url), "status": status,
+                           "headers": {name: headers[name] for name in ARCHIVED_HEADERS if name in headers},
+                           "body": body.decode("utf-8", "replace"),
+                           "captured_at": datetime.now().isoformat()},
+                          separators=(",", ":"), ensure_ascii=False)
+        with self.lock:
+            self.file.write(line + "\n")
+            self.count += 1
+
+    def writePasses(self, passes: list[dict]):
+        """
+        Records the passes of the run, so a replay lists the same windows.
+
+        Args:
+            passes (list[dict]): The keyword arguments of each pass, as built by shards.
+        """
+        line = json.dumps({"passes": passes, "captured_at": datetime.now().isoformat()}, separators=(",", ":"))
+        with self.lock:
+            self.file.write(line + "\n")
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+class CaptureAdapter(HTTPAdapter):
+    """Sends requests as usual and archives the GET responses."""
+
+    def __init__(self, writer: ArchiveWriter, **kwargs):
+        super().__init__(**kwargs)
+        self.writer = writer
+
+    def send(self, request, **kwargs):
+        res = super().send(request, **kwargs)
+        if request.method != "GET":
+            return res
+        # The body is read whole to archive it, then served again from
+        # memory, so streamed listings are still parsed as they would be
+        body = res.content
+        self.writer.write(request.url, res.status_code, res.headers, body)
+        headers = {name: res.headers[name] for name in ARCHIVED_HEADERS if name in res.headers}
+        return self.build_response(request, _rawResponse(res.status_code, headers, body))
+
+class ReplayAdapter(HTTPAdapter):
+    """
+    Answers GET requests from the responses of an archive, without any network.
+
+    Bodies are kept zlib-compressed in memory, so a replay holds about the
+    size of the archive. When a request was captured more than once, the
+    last capture wins. A request missing from the archive gets a 404.
+    passes holds the passes of the last run captured, if recorded.
+
+    Args:
+        path (str): The archive.
+    """
+
+    def __init__(self, path: str, **kwargs):
+        super().__init__(**kwargs)
+        self.responses, self.passes = readArchive(path)
+        self.missing = 0
+        self.lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        key = requestKey(request.url)
+        archived = self.responses.get(key)
+        if archived is None:
+            logger.warning(f"{key} is not in the archive")
+            with self.lock:
+                self.missing += 1
+            raw = _rawResponse(404, {"Content-Type": "application/json"}, b'{"error": "not in the archive"}')
+        else:
+            status, headers, body = archived
+            raw = _rawResponse(status, headers, zlib.decompress(body))
+        return self.build_response(request, raw)
+
+def readArchive(path: str) -> tuple[dict[str, tuple], list[dict]]:
+    """
+    Reads the responses of an archive.
+
+    A capture interrupted partway leaves a truncated last line or gzip
+    member, which is skipped with a warning.
+
+    Args:
+        path (str): The archive.
+
+    Returns:
+        tuple: A dict mapping the key of each request to (status, headers,
+            zlib-compressed body), and the passes of the last run captured.
+    """
+    responses = {}
+    passes = []
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        try:
+            for line in file:
+                try:
+                    archived = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping a truncated line of {path}")
+                    continue
+                if "passes" in archived:
+                    passes = archived["passes"]
+                    continue
+                responses[archived["key"]] = (archived["status"], archived["headers"],
+                                              zlib.compress(archived["body"].encode("utf-8")))
+        except (EOFError, gzip.BadGzipFile) as err:
+            logger.warning(f"{path} ends with a truncated capture, replaying what was read: {err}")
+    logger.info(f"Loaded {len(responses)} responses from {path}")
+    return responses, passes
+
+@contextmanager
+def capturing(source, path: str):
+    """
+    Archives every misportal response of a source while the context is active.
+
+    Requests are sent to misportal as usual, through a session of their own
+    with the same host limits as the shared one. The response cache is
+    turned off meanwhile, so every record is really fetched and archived.
+
+    Args:
+        source (syncsource.Source): The source whose misportal requests are captured.
+        path (str): The archive to append to.
+    """
+    writer = ArchiveWriter(path)
+    adapter = CaptureAdapter(writer, pool_connections=1, pool_maxsize=client.MISPORTAL_POOL_MAXSIZE, pool_block=True)
+    session = client.newSession(client.MISPORTALHOST, adapter)
+    # The record URLs come from the listings, and may name another host
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    # Like client.getListingSession, listings get a pool that never blocks
+    listingSession = client.newSession(client.MISPORTALHOST, CaptureAdapter(
+        writer, pool_connections=1, pool_maxsize=client.MISPORTAL_POOL_MAXSIZE))
+    with _replacingMisportal(source, session, listingSession):
+        try:
+            yield writer
+        finally:
+            writer.close()
+            logger.info(f"Captured {writer.count} responses to {path}")
+
+@contextmanager
+def replaying(source, path: str):
+    """
+    Answers the misportal requests of a source from an archive while the context is active.
+
+    The replay session has no rate or concurrency limit and never touches
+    the network, so the listing and fetch stages run at local speed and the
+    rest of the pipeline, uploads included, runs as usual.
+
+    Args:
+        source (syncsource.Source): The source whose misportal requests are replayed.
+        path (str): The archive, see capturing.
+    """
+    adapter = ReplayAdapter(path)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    with _replacingMisportal(source, session):
+        yield adapter
+    if adapter.missing:
+        logger.warning(f"{adapter.missing} requests were not in {path}")
+
+@contextmanager
+def _replacingMisportal(source, session: requests.Session, listingSession: requests.Session | None = None):
+    previous = source._misportal, source._misportalListings, httpcache.ENABLED
+    source.misportal = session
+    source.misportalListings = listingSession or session
+    httpcache.ENABLED = False
+    try:
+        yield
+    finally:
+        source.misportal, source.misportalListings, httpcache.ENABLED = previous
@@ -0,0 +1,129 @@
+"""
+Startup benchmark of the sync modules.
+
+Imports each module in a fresh interpreter, --repeat times, and reports the
+best and median import time against its budget in IMPORT_BUDGETS_MS. The
+transform modules must stay cheap to import, since they are reused outside
+of the syncs and imported again by every transform worker process. With
+--first-call, the first transform of a record is timed too, which pays for
+whatever the transform loads on first use.
+
+Exits with status 1 when a module is over budget, so it can run in CI.
+
+    python benchmarks/bench_startup.py --repeat 10
+    python benchmarks/bench_startup.py --top 15
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+
+# Best import time allowed per module, in milliseconds, on top of the interpreter startup
+IMPORT_BUDGETS_MS = {
+    "mapping": 15,
+    "identifiers": 15,
+    "pub": 30,
+    "pac": 30,
+    "engine": 250,
+    "scheduler": 250,
+}
+
+# Modules reused outside of the syncs, which must not import HEAVY_MODULES
+TRANSFORM_MODULES = ["mapping", "identifiers", "pub", "pac"]
+HEAVY_MODULES = ["requests", "idutils", "engine", "client", "sqlite3", "concurrent.futures.process"]
+
+MEASURE = """
+import sys, time
+started = time.perf_counter()
+import {module}
+print(time.perf_counter() - started)
+"""
+
+FIRST_CALL = """
+import sys, time
+sys.path.insert(0, {benchmarks!r})
+import corpus
+entry = corpus.{entry}(1)
+started = time.perf_counter()
+import {module}
+{module}.transform(entry)
+print(time.perf_counter() - started)
+"""
+
+def runPython(code: str, *options: str) -> subprocess.CompletedProcess:
+    # Run from the root, so the modules are imported from this tree; a sync
+    # imported this way creates nothing on disk
+    return subprocess.run([sys.executable, *options, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+
+def timeImport(module: str, repeat: int) -> list[float]:
+    """Returns the import times of module in fresh interpreters, in milliseconds."""
+    return [float(runPython(MEASURE.format(module=module)).stdout) * 1000 for _ in range(repeat)]
+
+def timeFirstCall(module: str, entry: str, repeat: int) -> list[float]:
+    """Returns the time to import module and transform one record, in milliseconds."""
+    code = FIRST_CALL.format(benchmarks=BENCHMARKS, entry=entry, module=module)
+    return [float(runPython(code).stdout) * 1000 for _ in range(repeat)]
+
+def heavyImports(module: str) -> list[str]:
+    """Returns the HEAVY_MODULES importing module loads."""
+    code = f"import sys, {module}; print(' '.join(name for name in {HEAVY_MODULES!r} if name in sys.modules))"
+    return runPython(code).stdout.split()
+
+def topImports(module: str, count: int) -> list[tuple[str, float]]:
+    """Returns the count slowest imports of module, by cumulative time, from python -X importtime."""
+    stderr = runPython(f"import {module}", "-X", "importtime").stderr
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if name.strip() == "site":
+            # What was imported so far is the startup of the interpreter
+            imports = []
+            continue
+        imports.append((name.strip(), int(cumulative) / 1000))
+    return sorted(imports, key=lambda item: item[1], reverse=True)[:count]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the import time of the sync modules.")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per module, the best is kept")
+    parser.add_argument("--first-call", action="store_true",
+                        help="also time the first transform of a record after import")
+    parser.add_argument("--top", type=int, default=0, help="also list the slowest imports of each module")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = []
+    overBudget = False
+    print(f"{'module':<14}{'best ms':>10}{'median ms':>11}{'budget ms':>11}")
+    for module, budget in IMPORT_BUDGETS_MS.items():
+        times = timeImport(module, args.repeat)
+        best = min(times)
+        heavy = heavyImports(module) if module in TRANSFORM_MODULES else []
+        over = best > budget or bool(heavy)
+        overBudget |= over
+        results.append({"module": module, "best_ms": round(best, 2), "median_ms": round(statistics.median(times), 2),
+                        "budget_ms": budget, "heavy_imports": heavy})
+        print(f"{module:<14}{best:>10.1f}{statistics.median(times):>11.1f}{budget:>11}"
+              + ("  OVER BUDGET" if best > budget else "") + (f"  imports {', '.join(heavy)}" if heavy else ""))
+        if args.top:
+            for name, milliseconds in topImports(module, args.top):
+                print(f"    {name:<40}{milliseconds:>8.1f}")
+    if args.first_call:
+        for module, entry in (("pub", "pubEntry"), ("pac", "pacEntry")):
+            times = timeFirstCall(module, entry, args.repeat)
+            results.append({"module": f"{module} first transform", "best_ms": round(min(times), 2),
+                            "median_ms": round(statistics.median(times), 2)})
+            print(f"{module + ' +transform':<14}{min(times):>10.1f}{statistics.median(times):>11.1f}")
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"args": vars(args), "results": results}, file, indent=2)
+    sys.exit(1 if overBudget else 0)
+
+if __name__ == "__main__":
+    main()
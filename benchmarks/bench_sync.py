@@ -0,0 +1,149 @@
+"""
+Offline throughput benchmark of the pub and pac syncs.
+
+Starts a mock misportal and a mock Invenio (see mockservers), then runs a
+sync pass of callPUBDB / callPACDB twice over a synthetic corpus: once
+creating every record, and once more after every record was revised, so
+that each one gets a new version. Each phase reports records/sec, the
+p50/p95 latency and error count of every HTTP step, and the number of
+requests per record.
+
+The syncs run in a scratch directory, so their index, caches, journals
+and logs do not touch the ones of the working tree.
+
+    python benchmarks/bench_sync.py --records 500 --latency 0.02 --error-rate 0.01
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.dirname(os.path.abspath(__file__))]
+
+import mockservers
+import scratch
+
+# Steps of a sync, recognized by the method and path of their requests. The
+# first match wins.
+STEPS = [
+    ("GET", r"/sti/publications/search\.json|/pacProposals/proposals/download\.json", "listing"),
+    ("GET", r"/sti/publications/\d+\.json", "fetch"),
+    ("GET", r"/api/records", "exists-check"),
+    ("POST", r"/api/records", "create"),
+    ("PUT", r"/api/records/\w+/draft/review", "review"),
+    ("POST", r"/api/requests/\w+/actions/submit", "submit"),
+    ("POST", r"/api/requests/\w+/actions/accept", "accept"),
+    ("POST", r"/api/records/\w+/versions", "new-version"),
+    ("GET", r"/api/records/\w+/draft", "get-draft"),
+    ("PUT", r"/api/records/\w+/draft", "update-draft"),
+    ("POST", r"/api/records/\w+/draft/actions/publish", "publish"),
+]
+
+class StepTimer:
+    """Collects the latency of every response, by step."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def hook(self, res, *args, **kwargs):
+        path = urlparse(res.request.url).path
+        step = next((name for method, pattern, name in STEPS
+                     if res.request.method == method and re.fullmatch(pattern, path)), "other")
+        with self.lock:
+            self.latencies[step].append(res.elapsed.total_seconds())
+            if res.status_code >= 400:
+                self.errors[step] += 1
+
+    def reset(self):
+        with self.lock:
+            self.latencies.clear()
+            self.errors.clear()
+
+def percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+def runPhase(name: str, call, records: int, timer: StepTimer, **kwargs) -> dict:
+    import checkpoint
+    timer.reset()
+    started = time.perf_counter()
+    call("sync", **mockservers.WINDOW, journal=checkpoint.Journal(), **kwargs)
+    seconds = time.perf_counter() - started
+    requests = sum(len(latencies) for latencies in timer.latencies.values())
+    return {
+        "phase": name,
+        "records": records,
+        "seconds": round(seconds, 3),
+        "records_per_second": round(records / seconds, 2),
+        "requests": requests,
+        "requests_per_record": round(requests / records, 2),
+        "steps": {step: {"count": len(latencies), "errors": timer.errors[step],
+                         "p50_ms": round(percentile(latencies, 0.5) * 1000, 2),
+                         "p95_ms": round(percentile(latencies, 0.95) * 1000, 2)}
+                  for step, latencies in sorted(timer.latencies.items())},
+    }
+
+def printPhase(result: dict):
+    print(f"{result['phase']}: {result['records']} records in {result['seconds']:.2f}s, "
+          f"{result['records_per_second']:.1f} records/s, {result['requests_per_record']:.2f} requests/record")
+    print(f"  {'step':<14}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}")
+    for step, stats in result["steps"].items():
+        print(f"  {step:<14}{stats['count']:>7}{stats['errors']:>8}{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pub and pac syncs against local mock servers.")
+    parser.add_argument("--source", choices=["pub", "pac", "both"], default="both")
+    parser.add_argument("--records", type=int, default=200, help="size of the synthetic corpus")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many more seconds, at random")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests failed with --error-status")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--unlimited", action="store_true",
+                        help="lift the per-host rate limits of client, to measure the sync code alone")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    servers = [mockservers.MockServer(args.records, args.latency, args.jitter, args.error_rate,
+                                      args.error_status, args.seed).start() for _ in range(2)]
+    misportalServer, invenioServer = servers
+    cwd = os.getcwd()
+    workdir = scratch.enterScratchDirectory("bench_sync_")
+
+    import client
+    client.MISPORTALHOST = misportalServer.url
+    if args.unlimited:
+        client.INVENIO_RATE_LIMIT = client.MISPORTAL_RATE_LIMIT = float("inf")
+    timer = StepTimer()
+    results = []
+    for source in ["pub", "pac"] if args.source == "both" else [args.source]:
+        module = __import__(source)
+        module.source.invenioHost = invenioServer.url
+        module.source.invenio = client.getSession(invenioServer.url, module.source.headers)
+        for session in (module.source.invenio, module.source.misportal, module.source.misportalListings):
+            if timer.hook not in session.hooks["response"]:
+                session.hooks["response"].append(timer.hook)
+        call = module.callPUBDB if source == "pub" else module.callPACDB
+        results.append(runPhase(f"{source} create", call, args.records, timer))
+        misportalServer.revise()
+        results.append(runPhase(f"{source} version", call, args.records, timer))
+    for server in servers:
+        server.stop()
+
+    for result in results:
+        printPhase(result)
+    if args.json:
+        with open(os.path.join(cwd, args.json), "w") as file:
+            json.dump({"args": vars(args), "results": results}, file, indent=2)
+    print(f"Scratch directory: {workdir}")
+
+if __name__ == "__main__":
+    main()
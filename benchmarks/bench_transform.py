@@ -0,0 +1,131 @@
+"""
+Microbenchmarks of the transform functions of the pub and pac syncs.
+
+Runs pub.transform, pub.getDocumentDict, pub.getAuthorDict,
+pac.processCreators and pac.transform over synthetic corpora (see corpus):
+a realistic mix, collaboration papers with very long author lists, theses
+with advisors, and PAC proposals. For each function and corpus it reports
+the best time per record over --repeat runs, with warm caches, and the
+average peak memory traced while transforming one record.
+
+    python benchmarks/bench_transform.py --records 2000 --repeat 5
+    python benchmarks/bench_transform.py --profile transform.prof
+"""
+import argparse
+import cProfile
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.dirname(os.path.abspath(__file__))]
+
+import corpus
+import scratch
+
+def corpora(records: int, largeAuthors: int, seed: int) -> dict[str, list[dict]]:
+    """
+    Generates the corpora of the benchmark.
+
+    Args:
+        records (int): The number of records of the mixed corpora.
+        largeAuthors (int): The number of authors of a collaboration paper.
+        seed (int): The seed of the corpora.
+
+    Returns:
+        dict: Maps the name of each corpus to its records.
+    """
+    # Long author lists are slow to generate and to transform, so fewer are used
+    fewer = max(1, records // 20)
+    return {
+        "pub mixed": [corpus.pubEntry(pubID, seed=seed) for pubID in range(1, records + 1)],
+        "pub collaboration": [corpus.pubEntry(pubID, authors=largeAuthors, documentType="Journal Article", seed=seed)
+                              for pubID in range(1, fewer + 1)],
+        "pub thesis": [corpus.pubEntry(pubID, documentType="Thesis", seed=seed) for pubID in range(1, records + 1)],
+        "pac mixed": [corpus.pacEntry(pacID, seed=seed) for pacID in range(1, records + 1)],
+        "pac large": [corpus.pacEntry(pacID, authors=largeAuthors, seed=seed) for pacID in range(1, fewer + 1)],
+    }
+
+def cases(pub, pac) -> list[tuple]:
+    """Returns (function name, function, corpus names) of every benchmark."""
+    return [
+        ("pub.transform", pub.transform, ["pub mixed", "pub collaboration", "pub thesis"]),
+        ("pub.getDocumentDict", pub.getDocumentDict, ["pub mixed", "pub thesis"]),
+        ("pub.getAuthorDict", lambda entry: pub.getAuthorDict(entry["authors"]), ["pub mixed", "pub collaboration"]),
+        ("pac.processCreators", pac.processCreators, ["pac mixed", "pac large"]),
+        ("pac.transform", pac.transform, ["pac mixed", "pac large"]),
+    ]
+
+def timePerRecord(func, entries: list[dict], repeat: int) -> float:
+    """Returns the best time per record over repeat runs, in nanoseconds."""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter_ns()
+        for entry in entries:
+            func(entry)
+        elapsed = time.perf_counter_ns() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(entries)
+
+def peakPerRecord(func, entries: list[dict]) -> float:
+    """Returns the average peak memory traced while transforming one record, in bytes."""
+    tracemalloc.start()
+    total = 0
+    for entry in entries:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        func(entry)
+        total += tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+    return total / len(entries)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the transform functions of the pub and pac syncs.")
+    parser.add_argument("--records", type=int, default=1000, help="records of each mixed corpus")
+    parser.add_argument("--large-authors", type=int, default=1500, help="authors of a collaboration paper")
+    parser.add_argument("--repeat", type=int, default=5, help="runs of each benchmark, the best is kept")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", help="only run the functions whose name contains this")
+    parser.add_argument("--profile", metavar="PATH", help="also run every benchmark once under cProfile")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    scratch.enterScratchDirectory("bench_transform_")
+    import pac
+    import pub
+
+    data = corpora(args.records, args.large_authors, args.seed)
+    selected = [case for case in cases(pub, pac) if not args.only or args.only in case[0]]
+    results = []
+    print(f"{'function':<22}{'corpus':<20}{'records':>8}{'us/record':>12}{'peak KiB/record':>17}")
+    for name, func, corpusNames in selected:
+        for corpusName in corpusNames:
+            entries = data[corpusName]
+            # Warm the lookup caches of mapping and identifiers, like a long sync does
+            for entry in entries:
+                func(entry)
+            nanoseconds = timePerRecord(func, entries, args.repeat)
+            peak = peakPerRecord(func, entries)
+            results.append({"function": name, "corpus": corpusName, "records": len(entries),
+                            "ns_per_record": round(nanoseconds), "peak_bytes_per_record": round(peak)})
+            print(f"{name:<22}{corpusName:<20}{len(entries):>8}{nanoseconds / 1000:>12.1f}{peak / 1024:>17.1f}")
+
+    if args.profile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        for name, func, corpusNames in selected:
+            for corpusName in corpusNames:
+                for entry in data[corpusName]:
+                    func(entry)
+        profiler.disable()
+        profiler.dump_stats(os.path.join(cwd, args.profile))
+        print(f"Profile written to {args.profile}")
+    if args.json:
+        with open(os.path.join(cwd, args.json), "w") as file:
+            json.dump({"args": vars(args), "results": results}, file, indent=2)
+
+if __name__ == "__main__":
+    main()
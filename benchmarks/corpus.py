@@ -0,0 +1,130 @@
+"""
+Synthetic misportal records for the benchmarks.
+
+The records have the shape of the misportal publication JSON and PAC
+download.json entries that pub.transform and pac.transform read. They are
+generated from a seed, so every run of a benchmark sees the same corpus.
+"""
+import random
+
+FIRST_NAMES = ["Alice", "Bo", "Carlos", "Dana", "Eitan", "Fatima", "Guo", "Hana", "Ivan", "Jun",
+               "Kofi", "Lena", "Mateo", "Nadia", "Omar", "Priya", "Quinn", "Rosa", "Sven", "Tariq"]
+LAST_NAMES = ["Anders", "Baker", "Chen", "Diaz", "Evans", "Fischer", "Garcia", "Huang", "Ito", "Jones",
+              "Kim", "Lopez", "Meyer", "Nguyen", "Okafor", "Park", "Rossi", "Singh", "Tanaka", "Weber"]
+INSTITUTIONS = ["Thomas Jefferson National Accelerator Facility, Newport News, VA",
+                "Old Dominion University, Norfolk, VA", "Argonne National Laboratory, Lemont, IL",
+                "Massachusetts Institute of Technology, Cambridge, MA", "Duke University, Durham, NC"]
+AFFILIATIONS = ["Exp Nuclear Physics / Experimental Halls / Hall A",
+                "Exp Nuclear Physics / Experimental Halls / Hall B",
+                "Accelerator Ops, R&D / Center for Injectors and Sources",
+                "Theory Center", ""]
+DOCUMENT_TYPES = ["Journal Article", "Journal Article", "Journal Article", "Thesis", "Meeting", "Book", "Other"]
+PAC_STATUSES = ["A- Approved", "C1- Conditionally Approved", "Deferred", "Rejected", "Approved"]
+PAC_HALLS = ["A", "B", "C", "D", "Hall A", ""]
+
+def personName(rng: random.Random) -> str:
+    middle = f" {rng.choice('ABCDEFGH')}." if rng.random() < 0.3 else ""
+    return f"{rng.choice(FIRST_NAMES)}{middle} {rng.choice(LAST_NAMES)}"
+
+def pubEntry(pubID: int, baseURL: str = "https://misportal.jlab.org", authors: int | None = None,
+             documentType: str | None = None, revision: int = 0, seed: int = 0) -> dict:
+    """
+    Generates the publication JSON of one record.
+
+    Args:
+        pubID (int): The pub_id of the record.
+        baseURL (str): The misportal URL the links of the record point to.
+        authors (int, optional): The number of authors. Defaults to a random
+            count, with now and then a large collaboration paper.
+        documentType (str, optional): The document_type. Defaults to a
+            random one, mostly journal articles.
+        revision (int): Bumped to make the record differ from its last sync.
+        seed (int): The seed of the corpus.
+
+    Returns:
+        dict: The publication JSON.
+    """
+    rng = random.Random(seed * 1000003 + pubID)
+    if authors is None:
+        authors = rng.choice([1, 2, 3, 5, 8, 12, 20]) if rng.random() < 0.97 else rng.randint(200, 1500)
+    documentType = documentType or rng.choice(DOCUMENT_TYPES)
+    year = rng.randint(2000, 2024)
+    entry = {
+        "pub_id": str(pubID),
+        "submit_date": f"{year}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "publication_date": f"{rng.choice(['January', 'April', 'July', 'October'])} {year}",
+        "submitter_name": f"{personName(rng)} (x{rng.randint(1000, 9999)})",
+        "title": f"Measurement {pubID} of the nucleon structure" + (f" (rev {revision})" if revision else ""),
+        "abstract": " ".join(rng.choice(LAST_NAMES).lower() for _ in range(rng.randint(50, 250))),
+        "affiliation": rng.choice(AFFILIATIONS),
+        "jlab_number": f"JLAB-PHY-{year % 100:02d}-{pubID}",
+        "osti_number": f"DOE/OR/23177-{pubID}" if rng.random() < 0.5 else "",
+        "lanl_number": f"arXiv:{year % 100:02d}{rng.randint(1, 12):02d}.{rng.randint(10000, 99999)}" if rng.random() < 0.6 else "",
+        "doi_link": f"https://doi.org/10.1103/PhysRevC.{rng.randint(1, 110)}.{rng.randint(1000, 99999)}" if rng.random() < 0.8 else "",
+        "ldrd_funding": "yes" if rng.random() < 0.05 else "no",
+        "proposals": [{"proposal_num": f"LD{year % 100:02d}{rng.randint(1, 30):02d}"}] if rng.random() < 0.05 else [],
+        "experiments": [{"paperid": f"E12-{rng.randint(6, 20):02d}-{rng.randint(1, 130):03d}"}
+                        for _ in range(rng.randint(0, 3))],
+        "attachments": [{"url": f"{baseURL}/sti/attachments/{pubID}-{n}.pdf", "name": f"{pubID}-{n}.pdf",
+                         "type": "Full text"} for n in range(rng.randint(0, 2))],
+        "links": {"html_record_url": f"{baseURL}/sti/publications/{pubID}",
+                  "json_record_url": f"{baseURL}/sti/publications/{pubID}.json"},
+        "authors": [{"name": personName(rng), "institution": "JLab",
+                     "institution_fullname": rng.choice(INSTITUTIONS)} for _ in range(authors)],
+        "document_type": documentType,
+    }
+    if documentType == "Journal Article":
+        entry.update({"journal_name": "Physical Review C", "volume": str(rng.randint(1, 110)),
+                      "issue": str(rng.randint(1, 6)), "pages": str(rng.randint(1, 99999))})
+    elif documentType == "Thesis":
+        entry.update({"primary_institution": rng.choice(INSTITUTIONS),
+                      "theses": [{"advisor": personName(rng), "institution": rng.choice(INSTITUTIONS)}
+                                 for _ in range(rng.randint(1, 3))]})
+    elif documentType == "Meeting":
+        entry.update({"document_subtype": rng.choice(["Talk", "Poster", "Paper"]),
+                      "meeting_name": "Fall Meeting of the APS Division of Nuclear Physics",
+                      "meeting_date": f"{year}-10-{rng.randint(1, 28):02d}"})
+    elif documentType == "Book":
+        entry["book_title"] = "Lecture Notes in Nuclear Physics"
+    return entry
+
+def pacEntry(pacID: int, authors: int | None = None, revision: int = 0, seed: int = 0) -> dict:
+    """
+    Generates the download.json entry of one PAC proposal.
+
+    Args:
+        pacID (int): The id of the proposal.
+        authors (int, optional): The number of authors. Defaults to a random count.
+        revision (int): Bumped to make the proposal differ from its last sync.
+        seed (int): The seed of the corpus.
+
+    Returns:
+        dict: The proposal entry.
+    """
+    rng = random.Random(seed * 1000003 + pacID)
+    authors = rng.randint(2, 60) if authors is None else authors
+    pacNumber = rng.randint(30, 52)
+
+    def person():
+        first, last = personName(rng).rsplit(" ", 1)
+        return {"first_name": first, "last_name": last, "institution": rng.choice(["JLab", "Jefferson Lab"] + INSTITUTIONS)}
+
+    submitted = f"20{rng.randint(10, 24)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+    return {
+        "id": pacID,
+        "title": f"Proposal {pacID}: precision measurement" + (f" (rev {revision})" if revision else ""),
+        "submitted_date": submitted,
+        "updated_date": submitted if not revision else f"{submitted}T00:00:{revision:02d}",
+        "authors": [person() for _ in range(authors)],
+        "spokespersons": [person() for _ in range(rng.randint(1, 4))],
+        "contact_person": {"name": personName(rng), "institution": "JLab"},
+        "links": {"proposal_html_url": f"https://misportal.jlab.org/pacProposals/proposals/{pacID}",
+                  "proposal_pdf_url": f"https://misportal.jlab.org/pacProposals/proposals/{pacID}.pdf"},
+        "proposal_number": f"PR12-{rng.randint(10, 24)}-{rng.randint(1, 20):03d}",
+        "pac_number": str(pacNumber),
+        "beam_days": str(rng.choice([10, 20, 35.5, 60])) if rng.random() < 0.7 else "",
+        "rating": rng.choice(["A", "B", ""]),
+        "status": rng.choice(PAC_STATUSES),
+        "experiment_number": f"E12-{rng.randint(10, 24)}-{rng.randint(1, 20):03d}" if rng.random() < 0.5 else "",
+        "experiment_hall": rng.choice(PAC_HALLS),
+    }
@@ -0,0 +1,262 @@
+"""
+Local stand-ins for misportal and Invenio, for offline benchmarks.
+
+A MockServer answers the endpoints of both; benchmarks start one per host,
+so that each gets its own connection pool and rate limit in client:
+
+- misportal: /sti/publications/search.json, the per-record publication
+  JSON and /pacProposals/proposals/download.json.
+- Invenio: record search, create, review, submit, accept, new version,
+  draft read and update, and publish.
+
+Every request waits latency seconds (plus up to jitter), and fails with
+errorStatus at errorRate, so the retry and throttling paths are exercised
+too. failures makes one endpoint fail every time, e.g. {"review": 400},
+to strand records partway through their chain. Like Invenio, searches
+only page through their first resultWindow hits.
+"""
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import corpus
+
+# Window wide enough to list the whole mock corpus
+WINDOW = {"submit_date_after": "01/01/1990", "submit_date_before": "12/31/2099",
+          "modification_date_after": "01/01/1990", "modification_date_before": "12/31/2099"}
+
+class MockServer:
+    """
+    A mock misportal and Invenio holding a synthetic corpus.
+
+    Args:
+        records (int): The number of publications and of PAC proposals.
+        latency (float): Seconds every request waits before it is answered.
+        jitter (float): Up to this many more seconds, at random.
+        errorRate (float): Fraction of requests answered with errorStatus.
+        errorStatus (int): The status of the injected errors.
+        seed (int): The seed of the corpus and of the injected errors.
+    """
+
+    def __init__(self, records: int = 100, latency: float = 0.0, jitter: float = 0.0,
+                 errorRate: float = 0.0, errorStatus: int = 503, seed: int = 0):
+        self.count = records
+        self.latency = latency
+        self.jitter = jitter
+        self.errorRate = errorRate
+        self.errorStatus = errorStatus
+        self.seed = seed
+        self.revision = 0
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.records = {}
+        self.drafts = {}
+        self.requests = Counter()
+        # Route name, e.g. "create" or "review", to the status it always fails with
+        self.failures = {}
+        # Most hits a search pages through, as Invenio's index.max_result_window
+        self.resultWindow = 10000
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _handler(self))
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = None
+
+    def start(self) -> "MockServer":
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def revise(self):
+        """Changes every record of the corpus, so the next sync versions all of them."""
+        with self.lock:
+            self.revision += 1
+
+    def pubEntry(self, pubID: int) -> dict:
+        entry = corpus.pubEntry(pubID, self.url, revision=self.revision, seed=self.seed)
+        # The listing only tells records apart by their dates
+        entry["modification_date"] = entry["submit_date"] + (f"T00:00:{self.revision:02d}" if self.revision else "")
+        return entry
+
+    def pacEntry(self, pacID: int) -> dict:
+        return corpus.pacEntry(pacID, revision=self.revision, seed=self.seed)
+
+def _handler(mock: MockServer):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def send(self, status: int, body: dict | None = None):
+            data = json.dumps(body if body is not None else {}).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            if status in (429, 503):
+                self.send_header("Retry-After", "0")
+            self.end_headers()
+            self.wfile.write(data)
+
+        def serve(self, method: str):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}") if length else {}
+            url = urlparse(self.path)
+            delay = mock.latency + (mock.random.uniform(0, mock.jitter) if mock.jitter else 0)
+            if delay:
+                time.sleep(delay)
+            with mock.lock:
+                mock.requests[method] += 1
+                failed = mock.errorRate and mock.random.random() < mock.errorRate
+            if failed:
+                return self.send(mock.errorStatus, {"message": "injected error"})
+            for pattern, route in ROUTES[method]:
+                match = re.fullmatch(pattern, url.path)
+                if match:
+                    if route.__name__ in mock.failures:
+                        return self.send(mock.failures[route.__name__], {"message": "injected failure"})
+                    return route(self, parse_qs(url.query), body, *match.groups())
+            self.send(404, {"message": "not found"})
+
+        def do_GET(self):
+            self.serve("GET")
+
+        def do_POST(self):
+            self.serve("POST")
+
+        def do_PUT(self):
+            self.serve("PUT")
+
+        # misportal
+
+        def pubListing(self, query, body):
+            data = []
+            for pubID in range(1, mock.count + 1):
+                entry = mock.pubEntry(pubID)
+                data.append({"pub_id": entry["pub_id"], "json_record_url": entry["links"]["json_record_url"],
+                             "submit_date": entry["submit_date"], "modification_date": entry["modification_date"]})
+            self.send(200, {"data": data})
+
+        def pubRecord(self, query, body, pubID):
+            if not 1 <= int(pubID) <= mock.count:
+                return self.send(404, {"message": "not found"})
+            self.send(200, mock.pubEntry(int(pubID)))
+
+        def pacListing(self, query, body):
+            self.send(200, {"data": [mock.pacEntry(pacID) for pacID in range(1, mock.count + 1)]})
+
+        # Invenio
+
+        def search(self, query, body):
+            q = query.get("q", [""])[0]
+            field = "rdm:pubID" if "pubID" in q else "pac:pacID"
+            # A half-open range of creation dates, as client.searchAllRecords slices searches
+            created = re.search(r'created:\["([^"]+)" TO "([^"]+)"\}', q)
+            if created:
+                q = q.replace(created.group(0), "")
+                start, end = (datetime.fromisoformat(bound) for bound in created.groups())
+            ids = set(re.findall(r'"([^"]+)"', q))
+            with mock.lock:
+                hits = [record for record in mock.records.values()
+                        if field in record["custom_fields"]
+                        and (not ids or str(record["custom_fields"][field]) in ids)
+                        and (not created or start <= datetime.fromisoformat(record["created"]) < end)]
+            if query.get("sort", [""])[0] == "oldest":
+                hits.sort(key=lambda record: record["created"])
+            size = int(query.get("size", query.get("s", ["10"]))[0])
+            page = int(query.get("page", query.get("p", ["1"]))[0])
+            if page * size > mock.resultWindow:
+                return self.send(400, {"message": "Result window is too large"})
+            self.send(200, {"hits": {"total": len(hits), "hits": hits[(page - 1) * size:page * size]}})
+
+        def create(self, query, body, parent=None):
+            recordID = uuid.uuid4().hex[:10]
+            draft = {**body, "id": recordID, "parent": parent or recordID, "versions": {"index": 1},
+                     "created": datetime.now(timezone.utc).isoformat(),
+                     "links": {"self": f"{mock.url}/api/records/{recordID}/draft"}}
+            with mock.lock:
+                mock.drafts[recordID] = draft
+            self.send(201, draft)
+
+        def review(self, query, body, recordID):
+            with mock.lock:
+                if recordID not in mock.drafts:
+                    return self.send(404, {"message": "not found"})
+            self.send(200, {"links": {"actions": {"submit": f"{mock.url}/api/requests/{recordID}/actions/submit"}}})
+
+        def submit(self, query, body, recordID):
+            self.send(200, {"links": {"actions": {"accept": f"{mock.url}/api/requests/{recordID}/actions/accept"}}})
+
+        def accept(self, query, body, recordID):
+            with mock.lock:
+                draft = mock.drafts.pop(recordID, None)
+                if draft:
+                    mock.records[recordID] = draft
+            self.send(200 if draft else 404, {})
+
+        def newVersion(self, query, body, recordID):
+            with mock.lock:
+                record = mock.records.get(recordID)
+                if record is None:
+                    return self.send(404, {"message": "not found"})
+                draftID = uuid.uuid4().hex[:10]
+                draft = {**record, "id": draftID, "previous": recordID,
+                         "versions": {"index": record["versions"]["index"] + 1},
+                         "links": {"self": f"{mock.url}/api/records/{draftID}/draft"}}
+                mock.drafts[draftID] = draft
+            self.send(201, draft)
+
+        def getDraft(self, query, body, recordID):
+            with mock.lock:
+                draft = mock.drafts.get(recordID)
+            self.send(200 if draft else 404, draft or {})
+
+        def updateDraft(self, query, body, recordID):
+            with mock.lock:
+                draft = mock.drafts.get(recordID)
+                if draft is None:
+                    return self.send(404, {"message": "not found"})
+                draft.update({key: value for key, value in body.items() if key not in ("id", "links", "versions")})
+                draft["links"] = {"publish": f"{mock.url}/api/records/{recordID}/draft/actions/publish"}
+            self.send(200, draft)
+
+        def publish(self, query, body, recordID):
+            with mock.lock:
+                draft = mock.drafts.pop(recordID, None)
+                if draft:
+                    # Searches only return the latest version
+                    mock.records.pop(draft.get("previous"), None)
+                    mock.records[recordID] = draft
+            self.send(202 if draft else 404, {})
+
+    ROUTES = {
+        "GET": [
+            (r"/sti/publications/search\.json", Handler.pubListing),
+            (r"/sti/publications/(\d+)\.json", Handler.pubRecord),
+            (r"/pacProposals/proposals/download\.json", Handler.pacListing),
+            (r"/api/records", Handler.search),
+            (r"/api/records/(\w+)/draft", Handler.getDraft),
+        ],
+        "POST": [
+            (r"/api/records", Handler.create),
+            (r"/api/records/(\w+)/versions", Handler.newVersion),
+            (r"/api/records/(\w+)/draft/actions/publish", Handler.publish),
+            (r"/api/requests/(\w+)/actions/submit", Handler.submit),
+            (r"/api/requests/(\w+)/actions/accept", Handler.accept),
+        ],
+        "PUT": [
+            (r"/api/records/(\w+)/draft/review", Handler.review),
+            (r"/api/records/(\w+)/draft", Handler.updateDraft),
+        ],
+    }
+    return Handler
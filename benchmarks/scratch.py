@@ -0,0 +1,23 @@
+"""Scratch working directory for benchmarks that import the sync modules."""
+import os
+import tempfile
+
+# Directories the sync modules write to, relative to the working directory
+SYNC_DIRECTORIES = ["logs/pub", "logs/pac", "failed/pub", "failed/pac", "checkpoints/pub",
+                    "checkpoints/pac", "index", "cache", "metrics"]
+
+def enterScratchDirectory(prefix: str) -> str:
+    """
+    Creates a scratch copy of the directories the syncs write to and moves into it.
+
+    Args:
+        prefix (str): The prefix of the directory name.
+
+    Returns:
+        str: The path of the scratch directory.
+    """
+    workdir = tempfile.mkdtemp(prefix=prefix)
+    for directory in SYNC_DIRECTORIES:
+        os.makedirs(os.path.join(workdir, directory))
+    os.chdir(workdir)
+    return workdir
@@ -0,0 +1,228 @@
+import glob
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+# Steps after which a record needs no more work
+DONE_STEPS = {"accepted", "published"}
+# Days the journals of completed or abandoned runs are kept before pruneJournals deletes them
+JOURNAL_RETENTION_DAYS = 7
+
+class Journal:
+    """
+    Durable, append-only record of the progress of one sync run.
+
+    The first line holds the passes of the run (the arguments of each
+    callPUBDB/callPACDB call). Every completed step of a record is then
+    appended as one JSON line and fsynced, so an interrupted run can be
+    continued with resumeJournal from the last completed step of each record.
+    A journal without a path keeps its state in memory only.
+
+    Args:
+        path (str, optional): The journal file, reopened if it exists.
+        passes (list[dict], optional): The passes of a new run.
+        owner (str, optional): Who started the run, e.g. "scheduler", so that
+            it only resumes its own runs. None for runs of the command line.
+    """
+
+    def __init__(self, path: str | None = None, passes: list[dict] | None = None, owner: str | None = None):
+        self.path = path
+        self.passes = passes or []
+        self.owner = owner
+        self.states = {}
+        self.donePasses = set()
+        self.finished = False
+        self.abandoned = False
+        self.resumes = 0
+        self.lock = threading.Lock()
+        if path and os.path.exists(path):
+            self._load()
+        elif path:
+            self._write({"passes": self.passes, "owner": owner} if owner else {"passes": self.passes})
+
+    def _load(self):
+        with open(self.path) as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A line cut short by the crash we are resuming from
+                    continue
+                if "passes" in entry:
+                    self.passes = entry["passes"]
+                    self.owner = entry.get("owner")
+                elif "pass" in entry:
+                    self.donePasses.add(entry["pass"])
+                elif "finished" in entry:
+                    self.finished = True
+                elif "resumed" in entry:
+                    self.resumes += 1
+                elif "abandoned" in entry:
+                    self.abandoned = True
+                elif "key" in entry:
+                    key = entry.pop("key")
+                    self.states[key] = {**self.states.get(key, {}), **entry}
+
+    def _write(self, entry: dict):
+        with open(self.path, "a") as file:
+            file.write(json.dumps(entry) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+
+    def get(self, action: str, sourceID) -> dict:
+        """
+        Returns the checkpointed state of a record.
+
+        Args:
+            action (str): "new" or "modify".
+            sourceID: The rdm:pubID or pac:pacID of the record.
+
+        Returns:
+            dict: The data recorded so far, with the last completed step
+                under "step"; empty if the record was not started.
+        """
+        with self.lock:
+            return dict(self.states.get(f"{action}:{sourceID}", {}))
+
+    def record(self, action: str, sourceID, step: str, **data) -> dict:
+        """
+        Records that a record completed a step.
+
+        Args:
+            action (str): "new" or "modify".
+            sourceID: The rdm:pubID or pac:pacID of the record.
+            step (str): The completed step.
+            **data: What later steps need to continue, e.g. record_id.
+
+        Returns:
+            dict: The new state of the record.
+        """
+        key = f"{action}:{sourceID}"
+        with self.lock:
+            state = {**self.states.get(key, {}), **data, "step": step}
+            self.states[key] = state
+            if self.path:
+                self._write({"key": key, **data, "step": step})
+            return dict(state)
+
+    def stranded(self, action: str | None = None) -> list[str]:
+        """
+        Returns the records that were started but not completed.
+
+        Args:
+            action (str, optional): Only return records of this action.
+
+        Returns:
+            list[str]: The keys ("action:sourceID") of the stranded records.
+        """
+        with self.lock:
+            return [key for key, state in self.states.items()
+                    if state.get("step") not in DONE_STEPS and (action is None or key.startswith(f"{action}:"))]
+
+    def isPassDone(self, index: int) -> bool:
+        """A pass is done once it completed and left no stranded records behind."""
+        action = self.passes[index]["action"]
+        # A sync pass creates and versions records, journaled under both actions
+        actions = ["new", "modify"] if action == "sync" else [action]
+        return index in self.donePasses and not any(self.stranded(action) for action in actions)
+
+    def passDone(self, index: int):
+        with self.lock:
+            self.donePasses.add(index)
+            if self.path:
+                self._write({"pass": index})
+
+    def finish(self):
+        with self.lock:
+            self.finished = True
+            if self.path:
+                self._write({"finished": True})
+
+    def markResumed(self):
+        """Records that the run is being continued, counted in resumes."""
+        with self.lock:
+            self.resumes += 1
+            if self.path:
+                self._write({"resumed": True})
+
+    def abandon(self):
+        """Records that the run is given up on, so resumeJournal no longer returns it."""
+        with self.lock:
+            self.abandoned = True
+            if self.path:
+                self._write({"abandoned": True})
+
+def newJournal(directory: str, passes: list[dict], owner: str | None = None) -> Journal:
+    """
+    Starts the journal of a new run.
+
+    Args:
+        directory (str): The checkpoint directory of the sync.
+        passes (list[dict]): The keyword arguments of each pass of the run.
+        owner (str, optional): Who starts the run, see Journal.
+
+    Returns:
+        Journal: The journal, already holding the passes.
+    """
+    path = datetime.now().strftime(f"{directory}/run_%Y-%m-%d_%H%M%S_%f.jsonl")
+    return Journal(path, passes, owner)
+
+def pruneJournals(directory: str, days: float = JOURNAL_RETENTION_DAYS) -> int:
+    """
+    Deletes the journals of runs that completed or were abandoned.
+
+    Journals last written less than days ago are kept, to look into
+    recent runs. Those of runs with work left are always kept.
+
+    Args:
+        directory (str): The checkpoint directory of the sync.
+        days (float): The age in days of the journals pruned.
+
+    Returns:
+        int: The number of journals deleted.
+    """
+    cutoff = time.time() - days * 24 * 60 * 60
+    pruned = 0
+    for path in glob.glob(f"{directory}/run_*.jsonl"):
+        if os.path.getmtime(path) >= cutoff:
+            continue
+        journal = Journal(path)
+        if journal.abandoned or journal.finished and not journal.stranded():
+            os.remove(path)
+            pruned += 1
+    return pruned
+
+def _journalOwner(path: str) -> str | None:
+    with open(path) as file:
+        try:
+            return json.loads(file.readline()).get("owner")
+        except json.JSONDecodeError:
+            return None
+
+def resumeJournal(directory: str, owner: str | None = None) -> Journal | None:
+    """
+    Reopens the journal of the most recent run, if it has work left.
+
+    A run has work left if it was interrupted, or if some of its records
+    stopped partway through their chain, e.g. with a draft that was created
+    but never submitted. An abandoned run has none.
+
+    Args:
+        directory (str): The checkpoint directory of the sync.
+        owner (str, optional): Only consider the runs started by this owner,
+            e.g. "scheduler". By default every run is.
+
+    Returns:
+        Journal | None: The journal to continue, or None if the last run completed.
+    """
+    paths = sorted(glob.glob(f"{directory}/run_*.jsonl"))
+    if owner is not None:
+        paths = [path for path in paths if _journalOwner(path) == owner]
+    if not paths:
+        return None
+    journal = Journal(paths[-1])
+    if journal.abandoned or journal.finished and not journal.stranded():
+        return None
+    return journal
@@ -0,0 +1,430 @@
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timedelta, timezone
+import requests
+from requests.adapters import HTTPAdapter
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+logger = logging.getLogger(__name__)
+
+MISPORTALHOST = "https://misportal.jlab.org"
+
+# Connection pool sizes, per host. Requests beyond POOL_MAXSIZE wait for a
+# free connection when the pool is blocking, which bounds the load on a host.
+INVENIO_POOL_MAXSIZE = 16
+MISPORTAL_POOL_MAXSIZE = 4
+
+# Requests per second allowed per host. Bursts of up to one second's worth
+# of requests are let through.
+INVENIO_RATE_LIMIT = 20.0
+MISPORTAL_RATE_LIMIT = 10.0
+# Halve the rate and concurrency of a host when it answers 429 or 503, and
+# let them grow back on success: the rate by RATE_RECOVERY of its configured
+# value per request, the concurrency by one per window of requests
+ADAPTIVE_LIMITS = True
+MIN_RATE_LIMIT = 0.5
+RATE_RECOVERY = 0.01
+
+# Retries of failed requests, with exponential backoff and full jitter
+MAX_RETRIES = 5
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 60.0
+# Longest Retry-After the server may ask us to wait
+RETRY_AFTER_MAX = 300.0
+# Statuses retried for idempotent requests (GET, PUT, ...)
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Statuses telling us the request was not processed, so POSTs are retried too
+THROTTLE_STATUSES = {429, 503}
+
+# Number of source ids OR-joined into a single Invenio search query
+LOOKUP_BATCH_SIZE = 50
+# Number of hits requested per page of an Invenio search
+LOOKUP_PAGE_SIZE = 100
+# Most hits an Invenio search pages through, its index.max_result_window
+RESULT_WINDOW = 10000
+# Sort of searches paging through many records: by creation date, so new records never shift the pages
+SEARCH_SORT = "oldest"
+# Shortest range of creation dates searchAllRecords splits a search into
+MIN_SEARCH_SLICE = timedelta(seconds=1)
+
+_sessions = {}
+_listingSessions = {}
+_limiters = {}
+_sessionsLock = threading.Lock()
+
+class HostLimiter:
+    """
+    Token-bucket rate limit and concurrency limit for one host.
+
+    With ADAPTIVE_LIMITS, both limits are halved whenever the host throttles
+    us and grow back additively while requests succeed. The bucket holds at
+    least one token, so a rate below one request per second still lets a
+    request through every 1 / rate seconds.
+    """
+
+    def __init__(self, rate: float, concurrency: int):
+        self.maxRate = rate
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.maxConcurrency = concurrency
+        self.concurrency = concurrency
+        self.active = 0
+        self.successes = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        """Blocks until a request may be sent to the host."""
+        with self.condition:
+            while self.active >= self.concurrency:
+                self.condition.wait()
+            self.active += 1
+            while True:
+                now = time.monotonic()
+                self.tokens = min(max(1.0, self.rate), self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                self.condition.wait((1 - self.tokens) / self.rate)
+
+    def release(self, throttled: bool = False):
+        """
+        Marks a request as finished.
+
+        Args:
+            throttled (bool): Whether the host answered with a throttling status.
+        """
+        with self.condition:
+            self.active -= 1
+            if ADAPTIVE_LIMITS:
+                if throttled:
+                    self.rate = max(MIN_RATE_LIMIT, self.rate / 2)
+                    self.concurrency = max(1, self.concurrency // 2)
+                    self.successes = 0
+                    logger.warning(f"Throttled, lowering limits to {self.rate:.1f} req/s "
+                                   f"and {self.concurrency} concurrent requests")
+                else:
+                    self.rate = min(self.maxRate, self.rate + RATE_RECOVERY * self.maxRate)
+                    self.successes += 1
+                    if self.successes >= self.concurrency and self.concurrency < self.maxConcurrency:
+                        self.concurrency += 1
+                        self.successes = 0
+            self.condition.notify_all()
+
+def getRetryDelay(res: requests.Response | None, attempt: int) -> float:
+    """
+    Returns how long to wait before retrying a request.
+
+    Args:
+        res (requests.Response | None): The failed response, or None if no
+            response was received.
+        attempt (int): The number of retries already made.
+
+    Returns:
+        float: The Retry-After of the response if present, otherwise an
+            exponential backoff with full jitter, in seconds.
+    """
+    retryAfter = res.headers.get("Retry-After") if res is not None else None
+    if retryAfter:
+        try:
+            delay = float(retryAfter)
+        except ValueError:
+            try:
+                delay = (parsedate_to_datetime(retryAfter) - datetime.now(timezone.utc)).total_seconds()
+            except (TypeError, ValueError):
+                delay = None
+        if delay is not None:
+            return min(max(delay, 0.0), RETRY_AFTER_MAX)
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+class RetryingSession(requests.Session):
+    """
+    A session that rate limits its requests and retries transient failures.
+
+    Idempotent requests are retried on connection errors and on
+    RETRY_STATUSES. Other requests (POST) are only retried when the request
+    cannot have been processed: on THROTTLE_STATUSES and connect timeouts.
+    This keeps a retried create or publish from running twice.
+    """
+
+    def __init__(self, limiter: HostLimiter):
+        super().__init__()
+        self.limiter = limiter
+
+    def request(self, method, url, *args, **kwargs):
+        idempotent = method.upper() in ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+        attempt = 0
+        while True:
+            self.limiter.acquire()
+            try:
+                res = super().request(method, url, *args, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as err:
+                self.limiter.release()
+                if attempt >= MAX_RETRIES or not (idempotent or isinstance(err, requests.ConnectTimeout)):
+                    raise
+                res = None
+                reason = str(err)
+            else:
+                throttled = res.status_code in THROTTLE_STATUSES
+                self.limiter.release(throttled)
+                if attempt >= MAX_RETRIES or not (throttled or (idempotent and res.status_code in RETRY_STATUSES)):
+                    return res
+                res.close()
+                reason = res.status_code
+            delay = getRetryDelay(res, attempt)
+            attempt += 1
+            logger.warning(f"{method} {url} failed ({reason}), retry {attempt}/{MAX_RETRIES} in {delay:.1f}s")
+            time.sleep(delay)
+
+def _getLimiter(host: str) -> HostLimiter:
+    # Called with _sessionsLock held
+    if host not in _limiters:
+        if host == MISPORTALHOST:
+            _limiters[host] = HostLimiter(MISPORTAL_RATE_LIMIT, MISPORTAL_POOL_MAXSIZE)
+        else:
+            _limiters[host] = HostLimiter(INVENIO_RATE_LIMIT, INVENIO_POOL_MAXSIZE)
+    return _limiters[host]
+
+def setHostLimits(host: str, rate: float | None = None, concurrency: int | None = None):
+    """
+    Changes the rate and concurrency limits of a host.
+
+    The limits apply to every session of the host, so they cap what all the
+    syncs of a process send to it together.
+
+    Args:
+        host (str): The base URL of the host.
+        rate (float, optional): The new requests per second.
+        concurrency (int, optional): The new maximum of concurrent requests.
+    """
+    with _sessionsLock:
+        limiter = _getLimiter(host)
+    with limiter.condition:
+        if rate:
+            limiter.maxRate = limiter.rate = rate
+            limiter.tokens = min(limiter.tokens, max(1.0, rate))
+        if concurrency:
+            limiter.maxConcurrency = limiter.concurrency = concurrency
+        limiter.condition.notify_all()
+
+def getSession(host: str, headers: dict[str, str] | None = None) -> requests.Session:
+    """
+    Returns the shared keep-alive session for a host, creating it on first use.
+
+    Sessions are shared between all callers asking for the same host and
+    headers, so pub and pac reuse each other's TLS connections. All sessions
+    for a host share one HostLimiter.
+
+    Args:
+        host (str): The base URL of the host, e.g. "https://inveniordm.jlab.org".
+        headers (dict, optional): Default headers sent with every request.
+
+    Returns:
+        requests.Session: The session with a connection pool mounted for the host.
+    """
+    headers = headers or {}
+    key = (host, tuple(sorted(headers.items())))
+    with _sessionsLock:
+        if key not in _sessions:
+            if host == MISPORTALHOST:
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MISPORTAL_POOL_MAXSIZE, pool_block=True)
+            else:
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=INVENIO_POOL_MAXSIZE)
+            session = RetryingSession(_getLimiter(host))
+            session.headers.update(headers)
+            session.mount(host, adapter)
+            _sessions[key] = session
+        return _sessions[key]
+
+def getListingSession(host: str) -> requests.Session:
+    """
+    Returns the shared session for the streamed listings of a host.
+
+    A streamed listing holds its connection until it is read to the end,
+    which with concurrent backfill shards could take every connection of
+    the blocking misportal pool and starve the per-record fetches. Listings
+    get a pool of their own, which never blocks; the HostLimiter of the host
+    still bounds the requests sent.
+
+    Args:
+        host (str): The base URL of the host.
+
+    Returns:
+        requests.Session: The session with a non-blocking pool mounted for the host.
+    """
+    with _sessionsLock:
+        if host not in _listingSessions:
+            session = RetryingSession(_getLimiter(host))
+            session.mount(host, HTTPAdapter(pool_connections=1, pool_maxsize=MISPORTAL_POOL_MAXSIZE))
+            _listingSessions[host] = session
+        return _listingSessions[host]
+
+def newSession(host: str, adapter: HTTPAdapter) -> requests.Session:
+    """
+    Returns a session of its own for a host, e.g. to send its requests through a custom adapter.
+
+    Unlike the sessions of getSession it is not shared, but it shares the
+    HostLimiter of the host, so its requests count against the same limits.
+
+    Args:
+        host (str): The base URL of the host.
+        adapter (HTTPAdapter): The adapter mounted for the host.
+
+    Returns:
+        requests.Session: The session.
+    """
+    with _sessionsLock:
+        limiter = _getLimiter(host)
+    session = RetryingSession(limiter)
+    session.mount(host, adapter)
+    return session
+
+def iterData(res: requests.Response):
+    """
+    Yields the entries of the "data" array of a misportal response.
+
+    When ijson is installed and the response was requested with stream=True,
+    the array is parsed incrementally, so entries are yielded as they arrive
+    and the whole document is never held in memory. Otherwise the response
+    is parsed in one go.
+
+    Args:
+        res (requests.Response): The search.json or download.json response.
+
+    Yields:
+        dict: The entries of the listing.
+    """
+    if ijson is None:
+        yield from res.json()["data"]
+        return
+    res.raw.decode_content = True
+    yield from ijson.items(res.raw, "data.item", use_float=True)
+
+def searchRecords(session: requests.Session, host: str, query: str, sort: str | None = None):
+    """
+    Yields every hit of an Invenio record search, fetching it page by page.
+
+    Only the first RESULT_WINDOW hits can be paged through, see
+    searchAllRecords for larger searches.
+
+    Args:
+        session (requests.Session): The Invenio session.
+        host (str): The base URL of the Invenio instance.
+        query (str): The search query.
+        sort (str, optional): The sort option of the search, e.g. "oldest".
+            Defaults to the best match.
+
+    Yields:
+        dict: The records matching the query.
+
+    Raises:
+        requests.RequestException: If a page could not be fetched.
+        ValueError: If a page is not JSON.
+    """
+    params = {"q": query, "size": LOOKUP_PAGE_SIZE, "page": 1}
+    if sort:
+        params["sort"] = sort
+    while True:
+        res = session.get(f"{host}/api/records", params=params, verify=True)
+        res.raise_for_status()
+        hits = res.json()["hits"]
+        yield from hits["hits"]
+        if not hits["hits"] or params["page"] * LOOKUP_PAGE_SIZE >= hits["total"]:
+            return
+        params["page"] += 1
+
+def _searchHead(session: requests.Session, host: str, query: str) -> tuple[int, dict | None]:
+    res = session.get(f"{host}/api/records", params={"q": query, "size": 1, "sort": SEARCH_SORT}, verify=True)
+    res.raise_for_status()
+    hits = res.json()["hits"]
+    return hits["total"], hits["hits"][0] if hits["hits"] else None
+
+def _createdQuery(query: str, start: datetime, end: datetime) -> str:
+    return f'({query}) AND created:["{start.isoformat()}" TO "{end.isoformat()}"}}'
+
+def _searchCreated(session: requests.Session, host: str, query: str, start: datetime, end: datetime, total: int):
+    if total > RESULT_WINDOW and end - start > MIN_SEARCH_SLICE:
+        middle = start + (end - start) / 2
+        for low, high in ((start, middle), (middle, end)):
+            sliceTotal, _ = _searchHead(session, host, _createdQuery(query, low, high))
+            if sliceTotal:
+                yield from _searchCreated(session, host, query, low, high, sliceTotal)
+        return
+    yield from searchRecords(session, host, _createdQuery(query, start, end), sort=SEARCH_SORT)
+
+def searchAllRecords(session: requests.Session, host: str, query: str):
+    """
+    Yields every hit of an Invenio record search, however many there are.
+
+    A search only pages through its first RESULT_WINDOW hits, so the query
+    is restricted to ranges of creation dates, halved until each holds at
+    most RESULT_WINDOW hits. Each range is paged oldest first, so the pages
+    are stable while records are created.
+
+    Args:
+        session (requests.Session): The Invenio session.
+        host (str): The base URL of the Invenio instance.
+        query (str): The search query.
+
+    Yields:
+        dict: The records matching the query, each once.
+
+    Raises:
+        requests.RequestException: If a page could not be fetched, e.g. when
+            more than RESULT_WINDOW records were created within MIN_SEARCH_SLICE.
+        ValueError: If a page is not JSON.
+    """
+    total, oldest = _searchHead(session, host, query)
+    if oldest is None:
+        return
+    start = datetime.fromisoformat(oldest["created"])
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    # The upper bound is exclusive and leaves room for clock skew with Invenio
+    end = datetime.now(timezone.utc) + timedelta(days=1)
+    yield from _searchCreated(session, host, query, start, end, total)
+
+def lookupRecordIDs(session: requests.Session, host: str, field: str, ids: list) -> dict[str, str | None]:
+    """
+    Resolves the Invenio record ids of many source ids with a few searches.
+
+    The ids are OR-joined into queries of LOOKUP_BATCH_SIZE ids each and the
+    results are paginated, so N records cost about N / LOOKUP_BATCH_SIZE
+    searches instead of N.
+
+    Args:
+        session (requests.Session): The Invenio session.
+        host (str): The base URL of the Invenio instance.
+        field (str): The custom field holding the source id, e.g. "rdm:pubID".
+        ids (list): The source ids to resolve.
+
+    Returns:
+        dict: Maps str(id) to its record id, or to None if no record has it.
+            Ids whose batch could not be searched are left out, so callers
+            can fall back to a per-record search for them.
+    """
+    recordIDs = {}
+    uniqueIDs = list(dict.fromkeys(str(sourceID) for sourceID in ids))
+    escapedField = field.replace(":", "\\:")
+    for start in range(0, len(uniqueIDs), LOOKUP_BATCH_SIZE):
+        batch = uniqueIDs[start:start + LOOKUP_BATCH_SIZE]
+        query = " OR ".join(f'"{sourceID}"' for sourceID in batch)
+        found = {}
+        try:
+            for hit in searchRecords(session, host, f"custom_fields.{escapedField}:({query})"):
+                found.setdefault(str(hit["custom_fields"].get(field)), hit["id"])
+        except (requests.RequestException, ValueError, KeyError) as err:
+            # Failed statuses, connection errors after retries and bodies that
+            # are not a search result all leave the batch to per-record searches
+            logger.error(f"Batch lookup of {field} failed: {err}")
+            continue
+        for sourceID in batch:
+            recordIDs[sourceID] = found.get(sourceID)
+    return recordIDs
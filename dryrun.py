@@ -0,0 +1,260 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+import time
+from collections import Counter
+from functools import partial
+import engine
+import metrics
+import pipeline
+import recordindex
+import validation
+from syncsource import Source
+
+# Directory of the reports, whose default names are strftime patterns
+REPORT_DIR = "reports"
+# Number of transformed records validated and looked up in the index together
+CHECK_BATCH_SIZE = pipeline.BATCH_SIZE
+# Number of the most frequent validation errors logged after a dry run
+TOP_ERRORS = 10
+
+def readEntries(path: str):
+    """
+    Yields the misportal records of a local file.
+
+    The file holds either a listing, {"data": [...]}, or a JSON list, or one
+    record per line. It may be gzipped. Its records are transformed as they
+    are, so for publications they must be full records, not listing entries.
+
+    Args:
+        path (str): The file, e.g. a download of a listing.
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as file:
+        try:
+            data = json.load(file)
+        except json.JSONDecodeError:
+            # One record per line
+            file.seek(0)
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+            return
+    yield from data.get("data", []) if isinstance(data, dict) else data
+
+def passEntries(source: Source, passes: list[dict], counts: Counter):
+    """
+    Yields the entries listed by the passes of a sync or backfill.
+
+    Unlike a sync, nothing is skipped as already synced and nothing is
+    marked as listed, so a dry run sees every record of its windows. A
+    record listed by several passes is yielded once.
+
+    Args:
+        source (Source): The source to list.
+        passes (list[dict]): The keyword arguments of each pass, as built by shards.
+        counts (Counter): Counts the entries and why they were skipped.
+    """
+    seen = set()
+    for passKwargs in passes:
+        passKwargs = dict(passKwargs)
+        value = passKwargs.pop(source.valueParam, "")
+        requested = engine.requestListings(source, value=value, **passKwargs)
+        if requested is None:
+            counts["failed_passes"] += 1
+            continue
+        for entry in engine.listedEntries(source, requested[1], counts):
+            key = entry.get(source.listingKeyField, "")
+            if key in seen:
+                counts["duplicate"] += 1
+                continue
+            seen.add(key)
+            counts["listed"] += 1
+            yield entry
+
+def transformBatch(source: Source, entries: list, executor) -> list[tuple]:
+    """
+    Transforms a chunk of records on the process pool.
+
+    Returns:
+        list[tuple]: (entry id, Invenio record or None, error or None) for each entry.
+    """
+    with metrics.timed(source.name, "transform-batch"):
+        results = pipeline.transformMany(source.transform, entries, executor=executor, withErrors=True)
+    return [(str(entry.get(source.entryIDField, "")), invenioDict, error)
+            for entry, (invenioDict, error) in zip(entries, results)]
+
+def diffRecords(old, new, path: str = "", diff: dict | None = None) -> dict:
+    """
+    Compares a record with the one last synced, field by field.
+
+    Args:
+        old: The last synced record, or one of its values.
+        new: The transformed record, or one of its values.
+        path (str): The path of the values, e.g. "metadata.creators[0]".
+        diff (dict, optional): The diff to add to.
+
+    Returns:
+        dict: "changed" maps the path of each changed value to [old, new],
+            "added" and "removed" map paths to the values only in new or old.
+            Empty sections are left out.
+    """
+    diff = {"changed": {}, "added": {}, "removed": {}} if diff is None else diff
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in [*old, *(key for key in new if key not in old)]:
+            keyPath = f"{path}.{key}" if path else key
+            if key not in new:
+                diff["removed"][keyPath] = old[key]
+            elif key not in old:
+                diff["added"][keyPath] = new[key]
+            else:
+                diffRecords(old[key], new[key], keyPath, diff)
+    elif isinstance(old, list) and isinstance(new, list):
+        for index in range(max(len(old), len(new))):
+            if index >= len(new):
+                diff["removed"][f"{path}[{index}]"] = old[index]
+            elif index >= len(old):
+                diff["added"][f"{path}[{index}]"] = new[index]
+            else:
+                diffRecords(old[index], new[index], f"{path}[{index}]", diff)
+    elif old != new:
+        diff["changed"][path] = [old, new]
+    if path:
+        return diff
+    return {section: values for section, values in diff.items() if values}
+
+def checkBatch(source: Source, transformed: list[tuple], schema: dict | None, counts: Counter,
+               errorCounts: Counter) -> list[dict]:
+    """
+    Validates a batch of transformed records and compares them with the index.
+
+    Each record gets a status: "failed" if its transform raised, "invalid"
+    if it fails validation, else "new" if it was never synced, "unchanged"
+    if it is identical to the last synced payload, or "changed".
+
+    Args:
+        source (Source): The source of the records.
+        transformed (list[tuple]): The output of transformBatch.
+        schema (dict | None): A JSON schema to validate against, see validation.validateRecord.
+        counts (Counter): Receives the number of records of each status and their size.
+        errorCounts (Counter): Receives the number of records failing each validation rule.
+
+    Returns:
+        list[dict]: The report row of each record.
+    """
+    sourceIDs = {entryID: str(invenioDict.get("custom_fields", {}).get(source.idField, entryID))
+                 for entryID, invenioDict, _ in transformed if invenioDict is not None}
+    indexed = recordindex.getRecords(source.name, list(sourceIDs.values()))
+    previous = recordindex.getPayloads(source.name, list(sourceIDs.values()))
+    rows = []
+    for entryID, invenioDict, error in transformed:
+        if invenioDict is None:
+            counts["failed"] += 1
+            rows.append({"id": entryID, "status": "failed", "error": error})
+            continue
+        sourceID = sourceIDs[entryID]
+        canonical = recordindex.canonicalJSON(invenioDict)
+        row = {"id": sourceID, "bytes": len(canonical)}
+        errors = validation.validateRecord(invenioDict, schema)
+        known = indexed.get(sourceID)
+        if known is None:
+            row["status"] = "new"
+        elif known["content_hash"] == hashlib.sha256(canonical).hexdigest():
+            row["status"] = "unchanged"
+        else:
+            row["status"] = "changed"
+            if sourceID in previous:
+                row["diff"] = diffRecords(previous[sourceID], invenioDict)
+        if errors:
+            row["status"] = "invalid"
+            row["errors"] = errors
+            # Count each rule once, whichever creator or identifier broke it
+            errorCounts.update({re.sub(r"\[\d+\]", "[]", error.split(": ")[0]) for error in errors})
+        if row["status"] != "unchanged":
+            row["payload"] = invenioDict
+        counts[row["status"]] += 1
+        counts["bytes"] += len(canonical)
+        rows.append(row)
+    return rows
+
+def openReport(path: str):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if path.endswith(".gz"):
+        return gzip.open(path, "wt", encoding="utf-8")
+    return open(path, "w", encoding="utf-8")
+
+def writeRow(file, row: dict):
+    file.write(json.dumps(row, separators=(",", ":"), ensure_ascii=False) + "\n")
+
+def dryRun(source: Source, passes: list[dict], report: str, inputPath: str | None = None,
+           schemaPath: str | None = None, workers: int | None = None, transformProcesses: int | None = None,
+           transformWorkers: int = 2) -> Counter:
+    """
+    Runs the passes of a sync or backfill without touching Invenio.
+
+    The records are listed and fetched from misportal, or read from a local
+    file, transformed on a process pool, validated offline and compared
+    with the payloads last synced. Each record gets a line in a JSONL
+    report, with its payload unless it is unchanged, its validation errors,
+    and its diff against the last synced payload. Nothing is uploaded, and
+    the journal, watermark and record index are left alone.
+
+    Args:
+        source (Source): The source to check.
+        passes (list[dict]): The keyword arguments of each pass, as built by
+            shards. Ignored with inputPath.
+        report (str): The report file, gzipped if it ends in .gz.
+        inputPath (str, optional): Read the records from this file instead of
+            misportal, see readEntries.
+        schemaPath (str, optional): Also validate against this JSON schema.
+        workers (int, optional): Records fetched in parallel. Defaults to source.fetchWorkers.
+        transformProcesses (int, optional): Transform worker processes.
+            Defaults to the number of CPUs.
+        transformWorkers (int): Chunks of records sent to the pool at the same time.
+
+    Returns:
+        Counter: The number of records of each status, of "listed" records, and their "bytes".
+    """
+    logger = source.logger
+    schema = validation.loadSchema(schemaPath) if schemaPath else None
+    counts = Counter()
+    errorCounts = Counter()
+    started = time.monotonic()
+    source.start()
+    stages = []
+    if inputPath:
+        entries = readEntries(inputPath)
+    else:
+        entries = passEntries(source, passes, counts)
+        if source.fetchesRecords:
+            stages.append(pipeline.Stage(partial(engine.fetchRecord, source), workers or source.fetchWorkers))
+    try:
+        with openReport(report) as file, pipeline.processPool(transformProcesses or os.cpu_count()) as executor:
+            # The report is written by a single worker, so its lines never interleave
+            try:
+                pipeline.runStages(entries, stages + [
+                    pipeline.Stage(partial(transformBatch, source, executor=executor),
+                                   transformWorkers, pipeline.TRANSFORM_CHUNK_SIZE),
+                    pipeline.Stage(partial(checkBatch, source, schema=schema, counts=counts, errorCounts=errorCounts),
+                                   1, CHECK_BATCH_SIZE),
+                    pipeline.Stage(partial(writeRow, file), 1)])
+            except Exception as err:
+                logger.error(f"Reading the records failed, the report only covers those read before: {err}")
+                counts["failed_input"] += 1
+    finally:
+        source.finish()
+    elapsed = time.monotonic() - started
+    checked = sum(counts[status] for status in ("new", "changed", "unchanged", "invalid", "failed"))
+    listed = checked if inputPath else counts["listed"]
+    logger.info(f"Dry run checked {checked} of {listed} listed records in {elapsed:.1f}s "
+                f"({checked / elapsed if elapsed else 0:.1f} records/s), "
+                f"{counts['bytes'] / 1e6:.1f} MB of payloads, report in {report}")
+    logger.info(", ".join(f"{counts[status]} {status}"
+                          for status in ("new", "changed", "unchanged", "invalid", "failed")))
+    if counts["failed_passes"]:
+        logger.error(f"{counts['failed_passes']} passes could not be listed")
+    for rule, count in errorCounts.most_common(TOP_ERRORS):
+        logger.warning(f"{count} records fail {rule}")
+    return counts
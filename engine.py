@@ -0,0 +1,826 @@
+import argparse
+import json
+import logging
+import os
+from collections import Counter
+from contextlib import ExitStack, nullcontext
+from datetime import date, datetime
+from functools import partial
+from logging.handlers import RotatingFileHandler
+import requests
+import archive
+import checkpoint
+import client
+import httpcache
+import mapping
+import metrics
+import pipeline
+import profiling
+import recordindex
+import shards
+from syncsource import Source
+
+# Size in bytes at which a log file is rotated, and number of rotated files kept
+LOG_MAX_BYTES = 100000
+LOG_BACKUP_COUNT = 5
+
+class DatedFileHandler(RotatingFileHandler):
+    """
+    A rotating log file whose name is a strftime pattern of the date.
+
+    Each record goes to the file named after the day it was logged, so a
+    long-running process, e.g. the scheduler, starts a new file every day.
+
+    Args:
+        pattern (str): The log file, e.g. "logs/pub/pubdb_sync_logs_%Y-%m-%d.log".
+    """
+
+    def __init__(self, pattern: str, **kwargs):
+        self.pattern = pattern
+        super().__init__(datetime.now().strftime(pattern), delay=True, **kwargs)
+
+    def emit(self, record):
+        # Called with the lock of the handler held
+        path = os.path.abspath(datetime.fromtimestamp(record.created).strftime(self.pattern))
+        if path != self.baseFilename:
+            if self.stream:
+                self.stream.close()
+                self.stream = None
+            self.baseFilename = path
+        super().emit(record)
+
+def setupLogging(logger: logging.Logger, pattern: str, modules: bool = True) -> logging.Handler:
+    """
+    Logs a sync, and the modules it uses, to a rotating file per day.
+
+    Args:
+        logger (logging.Logger): The logger of the sync.
+        pattern (str): The log file, a strftime pattern, see DatedFileHandler.
+        modules (bool): Also log the modules the syncs share, e.g. client.
+            A process running several syncs logs them to one file only.
+
+    Returns:
+        logging.Handler: The handler of the file.
+    """
+    handler = DatedFileHandler(pattern, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT)
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
+    if modules:
+        for module in (archive, client, httpcache, recordindex, pipeline, profiling, shards):
+            module.logger.setLevel(logging.INFO)
+            module.logger.addHandler(handler)
+    return handler
+
+def writeToFile(source: Source, data, file= "defaultName"):
+    timestamp = datetime.now().strftime("%Y-%m-%d")
+    filename = f"{source.failedDir}/{file}_{timestamp}.json"
+    # Uploads run concurrently and share the same file name per day
+    with source.writeLock, open(filename, "w") as file:
+        json.dump(data, file)
+
+def appendToFile(source: Source, data, file= "defaultName"):
+    timestamp = datetime.now().strftime("%Y-%m-%d")
+    filename = f"{source.failedDir}/{file}_{timestamp}.jsonl"
+    with source.writeLock, open(filename, "a") as handle:
+        handle.write(json.dumps(data) + "\n")
+
+def skipRecord(source: Source, key, entry: dict, error, file: str, failed: list | None):
+    """
+    Gives up on a record that cannot sync as misportal has it, e.g. one
+    missing from misportal or failing its transform.
+
+    Retrying it cannot succeed until misportal changes it, so with failed
+    the pass goes on without it: the record is appended to a file of
+    failedDir and its listing key to failed. Without failed, e.g. in a dry
+    run, it is only logged.
+
+    Args:
+        source (Source): The source of the record.
+        key: The listing key of the record.
+        entry (dict): The listing entry or record that failed.
+        error: What failed.
+        file (str): The file of failedDir, e.g. source.transformFailedFile.
+        failed (list, optional): Receives the listing key.
+    """
+    source.logger.error(f"Skipping {source.name} record {key}: {error}")
+    if failed is None:
+        return
+    appendToFile(source, {"key": key, "error": str(error), "entry": entry}, file=file)
+    failed.append(key)
+
+def findRecord(source: Source, sourceID, recordIDs=None):
+    """
+    Looks up the Invenio record holding a misportal id.
+
+    The pre-resolved recordIDs map from lookupRecordIDs is used when it
+    covers the id; otherwise a search query is sent.
+
+    Args:
+        source (Source): The source of the record.
+        sourceID: The misportal id of the record.
+        recordIDs (dict, optional): Maps str(sourceID) to a record id or None.
+
+    Returns:
+        tuple: (exists, recordID). exists is None when the search failed.
+    """
+    if recordIDs is not None and str(sourceID) in recordIDs:
+        recordID = recordIDs[str(sourceID)]
+        return recordID is not None, recordID
+    field = source.idField.replace(":", "\\:")
+    ifExistsUrl = f'{source.invenioHost}/api/records?q=custom_fields.{field}:"{sourceID}"&l=list&p=1&s=10&sort=bestmatch'
+    with metrics.timed(source.name, "exists-check"):
+        res = source.invenio.get(ifExistsUrl, verify=True)
+    if res.status_code != 200:
+        source.logger.error(res.status_code)
+        source.logger.error(res.json())
+        return None, None
+    if res.json()['hits']['total'] == 0:
+        return False, None
+    return True, res.json()['hits']['hits'][0]["id"]
+
+def lookupRecordIDs(source: Source, invenioDictList: list[dict]) -> dict:
+    """
+    Resolves in bulk which of the records already exist in Invenio.
+
+    Ids found in the local index are resolved without touching Invenio; the
+    rest are looked up with batched searches.
+
+    Args:
+        source (Source): The source of the records.
+        invenioDictList (list): The transformed records about to be uploaded.
+
+    Returns:
+        dict: Maps str(sourceID) to its Invenio record id, or None if it is new.
+    """
+    sourceIDs = [invenioDict["custom_fields"][source.idField] for invenioDict in invenioDictList]
+    indexed = recordindex.getRecords(source.name, sourceIDs)
+    recordIDs = {sourceID: row["record_id"] for sourceID, row in indexed.items()}
+    missing = [sourceID for sourceID in sourceIDs if str(sourceID) not in recordIDs]
+    if missing:
+        with metrics.timed(source.name, "lookup"):
+            recordIDs.update(client.lookupRecordIDs(source.invenio, source.invenioHost, source.idField, missing))
+    return recordIDs
+
+def uploadNew(source: Source, invenioDict, recordIDs=None, journal=None):
+    sourceID = invenioDict["custom_fields"][source.idField]
+    logger = source.logger
+    journal = journal or checkpoint.Journal()
+    state = journal.get("new", sourceID)
+    step = state.get("step")
+    if step in checkpoint.DONE_STEPS:
+        return True
+    resumingDraft = step == "created"
+    if step in (None, "discarded"):
+        exists, recordID = findRecord(source, sourceID, recordIDs)
+        if exists is None:
+            # The search failed, so the record is retried by a later run
+            return False
+        if exists:
+            # Nothing left to create, e.g. a new pass over a backfilled window
+            logger.info(f"Record with {source.idField} {sourceID} already exists")
+            return True
+        createURL = f"{source.invenioHost}/api/records"
+        with metrics.timed(source.name, "create"):
+            createRes = source.invenio.post(createURL, data=json.dumps(invenioDict), verify=True)
+        if createRes.status_code != 201:
+            logger.error(createRes.status_code)
+            logger.error(createRes.json())
+            writeToFile(source, invenioDict, file=source.createFailedFile)
+            return False
+        state = journal.record("new", sourceID, "created", record_id=createRes.json()['id'],
+                               version=createRes.json().get("versions", {}).get("index"))
+        step = "created"
+    if step == "created":
+        reviewURL = f'{source.invenioHost}/api/records/{state["record_id"]}/draft/review'
+        reviewData = {"receiver": { "community": source.communityID},"type": "community-submission"}
+        with metrics.timed(source.name, "review"):
+            reviewRes = source.invenio.put(reviewURL, data=json.dumps(reviewData), verify=True)
+        if reviewRes.status_code == 404 and resumingDraft:
+            # The draft created by an earlier run was deleted since, so the record starts over
+            logger.error(f"Draft {state['record_id']} of {source.idField} {sourceID} is gone, creating it again")
+            journal.record("new", sourceID, "discarded")
+            return uploadNew(source, invenioDict, recordIDs, journal)
+        if reviewRes.status_code != 200:
+            logger.error(reviewRes.status_code)
+            logger.error(reviewRes.json())
+            return False
+        state = journal.record("new", sourceID, "reviewed", submit_url=reviewRes.json()['links']['actions']['submit'])
+        step = "reviewed"
+    if step == "reviewed":
+        submitData =  {"payload": {"content": "Thank you in advance for the review.","format": "html"}}
+        with metrics.timed(source.name, "submit"):
+            submitRes = source.invenio.post(state["submit_url"], data=json.dumps(submitData), verify=True)
+        if submitRes.status_code not in [202, 200]:
+            logger.error(submitRes.status_code)
+            logger.error(submitRes.json())
+            return False
+        logger.info("success submit for review")
+        state = journal.record("new", sourceID, "submitted", accept_url=submitRes.json()['links']['actions']['accept'])
+        step = "submitted"
+    if step == "submitted":
+        acceptData = {"payload": {"content": "You are in!", "format": "html"}}
+        with metrics.timed(source.name, "accept"):
+            acceptRes = source.invenio.post(state["accept_url"], data=json.dumps(acceptData), verify=True)
+        if acceptRes.status_code not in [202, 200]:
+            logger.info(acceptRes.status_code)
+            logger.info(acceptRes.json())
+            return False
+        logger.info("Whole upload, review, submit and accept OK")
+        recordindex.updateRecord(source.name, sourceID, state["record_id"], state.get("version"), invenioDict)
+        journal.record("new", sourceID, "accepted")
+    return True
+
+def uploadModify(source: Source, invenioDict, recordIDs=None, journal=None):
+    sourceID = invenioDict["custom_fields"][source.idField]
+    logger = source.logger
+    journal = journal or checkpoint.Journal()
+    state = journal.get("modify", sourceID)
+    step = state.get("step")
+    if step in checkpoint.DONE_STEPS:
+        return True
+    if step == "versioned":
+        # Resuming: the new version's draft already exists, start from its current content
+        with metrics.timed(source.name, "get-draft"):
+            draftRes = source.invenio.get(state["draft_url"], verify=True)
+        if draftRes.status_code == 200:
+            new_data = draftRes.json()
+        else:
+            # The draft was published or deleted since, so the record starts over from a new version
+            logger.error(f"Draft {state['draft_url']} of {source.idField} {sourceID} returned "
+                         f"{draftRes.status_code}, creating a new version again")
+            state = journal.record("modify", sourceID, "discarded")
+            step = "discarded"
+    if step in (None, "discarded"):
+        exists, recordID = findRecord(source, sourceID, recordIDs)
+        if exists is None:
+            return False
+        if not exists:
+            logger.info(f"Record with {source.idField} {sourceID} does not exist")
+            logger.info("This should mean record is new")
+            logger.info("This should NOT happen but we will register it as new.")
+            return uploadNew(source, invenioDict, recordIDs, journal)
+        createNewVersionURL = f'{source.invenioHost}/api/records/{recordID}/versions'
+        with metrics.timed(source.name, "new-version"):
+            newVersionRes = source.invenio.post(createNewVersionURL,data={}, verify=True)
+        if newVersionRes.status_code not in [200, 201]:
+            logger.error(newVersionRes.status_code)
+            logger.error(newVersionRes.json())
+            writeToFile(source, invenioDict, file=source.versionFailedFile)
+            return False
+        new_data = newVersionRes.json()
+        state = journal.record("modify", sourceID, "versioned", record_id=new_data["id"],
+                               version=new_data.get("versions", {}).get("index"),
+                               draft_url=new_data['links']["self"])
+        step = "versioned"
+    if step == "versioned":
+        new_data.update(invenioDict)
+        with metrics.timed(source.name, "update-draft"):
+            updatedraftRecord = source.invenio.put(state["draft_url"],data=json.dumps(new_data), verify=True)
+        if updatedraftRecord.status_code != 200:
+            logger.error("update draft")
+            logger.error(updatedraftRecord.status_code)
+            logger.error(updatedraftRecord.json())
+            return False
+        logger.info("success update draft record")
+        state = journal.record("modify", sourceID, "updated", publish_url=updatedraftRecord.json()['links']["publish"])
+        step = "updated"
+    if step == "updated":
+        with metrics.timed(source.name, "publish"):
+            publishNewVersionRes= source.invenio.post(state["publish_url"], verify=True)
+        if publishNewVersionRes.status_code != 202:
+            logger.error("publish error")
+            logger.error(publishNewVersionRes.status_code)
+            logger.error(publishNewVersionRes.json())
+            return False
+        logger.info("success publish new version")
+        recordindex.updateRecord(source.name, sourceID, state["record_id"], state.get("version"), invenioDict)
+        journal.record("modify", sourceID, "published")
+    return True
+
+def fetchRecord(source: Source, entry: dict, keys: dict | None = None, failed: list | None = None) -> dict | None:
+    """
+    Fetches the full record of a listing entry.
+
+    Args:
+        source (Source): The source of the record.
+        entry (dict): The entry from the listing.
+        keys (dict, optional): Receives the listing key of the record under
+            its misportal id, see trackKeys.
+        failed (list, optional): Receives the listing key of a record
+            misportal does not have, see skipRecord.
+
+    Returns:
+        dict | None: The record, or None if fetching failed.
+    """
+    try:
+        with metrics.timed(source.name, "fetch"):
+            record = source.fetchRecord(entry)
+    except LookupError as err:
+        skipRecord(source, entry.get(source.listingKeyField, ""), entry, err, source.fetchFailedFile, failed)
+        return None
+    if record is not None and keys is not None:
+        keys[str(record.get(source.entryIDField))] = entry.get(source.listingKeyField, "")
+    return record
+
+def trackKeys(source: Source, entries, keys: dict):
+    """
+    Yields listing entries that are full records, remembering the listing
+    key of each under its misportal id, so their upload outcome can be
+    traced back to the listing.
+    """
+    for entry in entries:
+        keys[str(entry.get(source.entryIDField))] = entry.get(source.listingKeyField, "")
+        yield entry
+
+def _transformFailed(source: Source, entry: dict, error, keys: dict | None, failed: list | None):
+    entryID = str(entry.get(source.entryIDField))
+    key = keys.get(entryID, entryID) if keys is not None else entryID
+    skipRecord(source, key, entry, f"transform failed: {error}", source.transformFailedFile, failed)
+
+def transformRecord(source: Source, entry: dict, keys: dict | None = None, failed: list | None = None) -> dict | None:
+    """
+    Transforms a misportal record, logging instead of raising on bad input.
+
+    Args:
+        source (Source): The source of the record.
+        entry (dict): The record from misportal.
+        keys (dict, optional): The listing keys of the records, see trackKeys.
+        failed (list, optional): Receives the listing key of the record if
+            the transform failed, see skipRecord.
+
+    Returns:
+        dict | None: The Invenio record, or None if the transform failed.
+    """
+    try:
+        with metrics.timed(source.name, "transform"):
+            return source.transform(entry)
+    except Exception as err:
+        _transformFailed(source, entry, err, keys, failed)
+        return None
+
+def transformMany(source: Source, entries: list, workers=None, executor=None, keys: dict | None = None,
+                  failed: list | None = None) -> list:
+    """
+    Transforms many misportal records across a process pool.
+
+    Args:
+        source (Source): The source of the records.
+        entries (list): The records from misportal.
+        workers (int, optional): The number of processes. Defaults to the number of CPUs.
+        executor (ProcessPoolExecutor, optional): A pool to reuse across calls.
+        keys (dict, optional): The listing keys of the records, see trackKeys.
+        failed (list, optional): Receives the listing keys of the records
+            whose transform failed, see skipRecord.
+
+    Returns:
+        list: The Invenio records, in the order of entries, with None where
+            the transform failed.
+    """
+    with metrics.timed(source.name, "transform-batch"):
+        results = pipeline.transformMany(source.transform, entries, workers=workers, executor=executor,
+                                         withErrors=True)
+    for entry, (_, error) in zip(entries, results):
+        if error:
+            _transformFailed(source, entry, error, keys, failed)
+    return [invenioDict for invenioDict, _ in results]
+
+def resolveBatch(source: Source, invenioDictList, isModify, counts, synced=None):
+    """
+    Prepares a batch of transformed records for upload.
+
+    The existence of the records is resolved in bulk. In a sync pass
+    (isModify None), records already in Invenio get a new version and the
+    others are created. Records that did not change since the last sync are
+    dropped from the new versions.
+
+    Args:
+        source (Source): The source of the records.
+        invenioDictList (list): The transformed records.
+        isModify (bool | None): Whether the records get new versions instead
+            of being created, or None to decide per record.
+        counts (collections.Counter): Receives the number of "unchanged"
+            records, and of "new" and "modify" records in a sync pass.
+        synced (list, optional): Receives the source ids of the unchanged records.
+
+    Returns:
+        list[tuple]: (invenioDict, recordIDs, isModify) for each record left to upload.
+    """
+    if isModify:
+        changed, unchanged = recordindex.filterUnchanged(source.name, source.idField, invenioDictList)
+        counts["unchanged"] += unchanged
+        trackUnchanged(source, invenioDictList, changed, synced)
+        invenioDictList = changed
+    recordIDs = lookupRecordIDs(source, invenioDictList)
+    if isModify is not None:
+        return [(invenioDict, recordIDs, isModify) for invenioDict in invenioDictList]
+    # Records whose lookup failed go through uploadModify, which looks them up again
+    newRecords, existingRecords = [], []
+    for invenioDict in invenioDictList:
+        if recordIDs.get(str(invenioDict["custom_fields"][source.idField]), "") is None:
+            newRecords.append(invenioDict)
+        else:
+            existingRecords.append(invenioDict)
+    modifiedRecords, unchanged = recordindex.filterUnchanged(source.name, source.idField, existingRecords)
+    counts["unchanged"] += unchanged
+    trackUnchanged(source, existingRecords, modifiedRecords, synced)
+    counts["new"] += len(newRecords)
+    counts["modify"] += len(modifiedRecords)
+    return ([(invenioDict, recordIDs, False) for invenioDict in newRecords] +
+            [(invenioDict, recordIDs, True) for invenioDict in modifiedRecords])
+
+def trackUnchanged(source: Source, invenioDictList: list, changed: list, synced: list | None):
+    if synced is None:
+        return
+    changedRecords = {id(invenioDict) for invenioDict in changed}
+    synced.extend(str(invenioDict["custom_fields"][source.idField]) for invenioDict in invenioDictList
+                  if id(invenioDict) not in changedRecords)
+
+def uploadResolved(source: Source, resolved, journal=None, synced=None):
+    invenioDict, recordIDs, isModify = resolved
+    upload = partial(uploadModify if isModify else uploadNew, source)
+    key = f"{'modify' if isModify else 'new'}:{invenioDict['custom_fields'][source.idField]}"
+    ok = pipeline.uploadOne(upload, invenioDict, key=key, recordIDs=recordIDs, journal=journal)
+    metrics.increment("records", source=source.name, action="modify" if isModify else "new",
+                      outcome="synced" if ok else "failed")
+    if ok and synced is not None:
+        synced.append(str(invenioDict["custom_fields"][source.idField]))
+    return ok
+
+def requestListings(source: Source, action, submit_date_after='', submit_date_before='',
+                    modification_date_after='', modification_date_before='', value='') -> tuple | None:
+    """
+    Checks the window of a pass and requests its listings from misportal.
+
+    Args:
+        source (Source): The source to list.
+        action (str): "new", "modify" or "sync", as for sync.
+        submit_date_after, submit_date_before, modification_date_after,
+        modification_date_before, value (str): The window, as for sync.
+
+    Returns:
+        tuple | None: isModify, None for a sync pass, and the streamed
+            listings as (isModify, response), or None if the pass cannot run.
+    """
+    logger = source.logger
+    # Each listing is (isModify, submit dates, modification dates). A sync
+    # pass merges the listings of a new and a modify pass, so that a record
+    # submitted and edited in the window is fetched and uploaded once.
+    if action == "new":
+        if not (submit_date_after and submit_date_before or value):
+            logger.error("submit_date_after is needed for action new")
+            return None
+        isModify = False
+        listings = [(False, submit_date_after, submit_date_before, modification_date_after, modification_date_before)]
+    elif action == "modify":
+        if not (modification_date_after and modification_date_before or value):
+            logger.error("modification_date is needed for action modify")
+            return None
+        isModify = True
+        listings = [(True, submit_date_after, submit_date_before, modification_date_after, modification_date_before)]
+    elif action == "sync":
+        if not (submit_date_after and submit_date_before and modification_date_after and modification_date_before
+                or value):
+            logger.error("submit_date and modification_date are needed for action sync")
+            return None
+        isModify = None
+        listings = [(False, submit_date_after, submit_date_before, '', ''),
+                    (True, '', '', modification_date_after, modification_date_before)]
+    else:
+        logger.error(f"action {action} not recognized. Available action: new, modify or sync")
+        return None
+
+    listingURL = f'{client.MISPORTALHOST}{source.listingPath}'
+    responses = []
+    for isModifyListing, submitAfter, submitBefore, modifiedAfter, modifiedBefore in listings:
+        params = source.listingParams(submitAfter, submitBefore, modifiedAfter, modifiedBefore, value)
+        with metrics.timed(source.name, "listing"):
+            res = source.misportalListings.get(listingURL, params=params, stream=True)
+        if res.status_code != 200:
+            logger.error(res.status_code)
+            logger.error(res.json())
+            return None
+        responses.append((isModifyListing, res))
+    return isModify, responses
+
+def listedEntries(source: Source, responses: list, counts: Counter, listed: dict | None = None):
+    """
+    Yields the entries of the listings of a pass, each once.
+
+    Entries of a modify listing submitted and modified at the same time are
+    left to the new listing. With listed, entries an earlier pass already
+    synced are skipped too, and the others are added to listed, mapping
+    their key to their modification date, for recordindex.markListed once
+    they synced.
+
+    Args:
+        source (Source): The source listed.
+        responses (list): The listings, as returned by requestListings.
+        counts (Counter): Counts the entries and why they were skipped.
+        listed (dict, optional): Receives the entries yielded.
+    """
+    logger = source.logger
+    seen = set()
+    for isModifyListing, res in responses:
+        for entry in client.iterData(res):
+            counts["entries"] += 1
+            key = entry.get(source.listingKeyField, "")
+            modification_date = entry[source.modifiedDateField]
+            if isModifyListing and entry[source.submitDateField] == modification_date:
+                logger.info("When modify is called and same submit and modify date,\
+                             do nothing")
+                continue
+            if key in seen:
+                counts["duplicate"] += 1
+                continue
+            seen.add(key)
+            if listed is None:
+                yield entry
+                continue
+            # Skip what an earlier pass already synced, e.g. in the overlap of an incremental sync
+            if recordindex.isListed(source.name, key, modification_date):
+                counts["listed"] += 1
+                continue
+            listed[key] = modification_date
+            yield entry
+
+def sync(source: Source, action, submit_date_after = '',
+         submit_date_before = '',
+         modification_date_after = '',
+         modification_date_before = '',
+         value = '',
+         workers = None,
+         transformWorkers = None,
+         transformProcesses = 0,
+         uploadWorkers = pipeline.UPLOAD_WORKERS,
+         journal = None,
+         executor = None):
+    """
+    Runs one pass of a sync: lists a window of misportal, then fetches,
+    transforms and uploads what it lists.
+
+    Args:
+        source (Source): The source to sync.
+        action (str): "new" creates the records submitted in the window,
+            "modify" versions the records modified in it, and "sync" does both.
+        submit_date_after, submit_date_before (str): The submit dates of the
+            window, MM/DD/YYYY.
+        modification_date_after, modification_date_before (str): The
+            modification dates of the window.
+        value (str): Restricts the listing to this source.valueParam instead
+            of dates, e.g. a publication year.
+        workers (int, optional): Records fetched in parallel. Defaults to source.fetchWorkers.
+        transformWorkers (int, optional): Records transformed in parallel.
+            Defaults to source.transformWorkers.
+        transformProcesses (int): Transform on a pool of this many processes instead of threads.
+        uploadWorkers (int): Records uploaded in parallel.
+        journal (checkpoint.Journal, optional): Records the progress of the pass.
+        executor (ProcessPoolExecutor, optional): A process pool to transform
+            on, shared with other passes. Overrides transformProcesses.
+
+    Returns:
+        bool: False if the pass could not run or a listed record failed to
+            fetch, transform or upload.
+    """
+    logger = source.logger
+    requested = requestListings(source, action, submit_date_after, submit_date_before,
+                                modification_date_after, modification_date_before, value)
+    if requested is None:
+        return False
+    isModify, responses = requested
+    counts = Counter()
+    # Listing key to modification date of the entries to sync, misportal id
+    # to listing key, the misportal ids that synced or were unchanged, and
+    # the listing keys of the records that cannot sync as misportal has them.
+    # Only those are marked listed, so the overlap of the next run retries the rest.
+    listed = {}
+    keys = {}
+    synced = []
+    failed = []
+    inputFailed = False
+
+    # Fetch, transform and upload run as overlapping stages fed by the
+    # streamed listing, so the run takes about as long as the slowest stage.
+    # With transformProcesses, transforms run in chunks on a process pool.
+    transformWorkers = transformWorkers or source.transformWorkers
+    stages = []
+    entries = listedEntries(source, responses, counts, listed)
+    if source.fetchesRecords:
+        stages.append(pipeline.Stage(partial(fetchRecord, source, keys=keys, failed=failed),
+                                     workers or source.fetchWorkers))
+    else:
+        entries = trackKeys(source, entries, keys)
+    with nullcontext(executor) if executor else pipeline.processPool(transformProcesses) as executor:
+        if executor:
+            stages.append(pipeline.Stage(partial(transformMany, source, executor=executor, keys=keys, failed=failed),
+                                         transformWorkers, pipeline.TRANSFORM_CHUNK_SIZE))
+        else:
+            stages.append(pipeline.Stage(partial(transformRecord, source, keys=keys, failed=failed),
+                                         transformWorkers))
+        try:
+            pipeline.runStages(entries, stages + [
+                pipeline.Stage(partial(resolveBatch, source, isModify=isModify, counts=counts, synced=synced),
+                               1, pipeline.BATCH_SIZE),
+                pipeline.Stage(partial(uploadResolved, source, journal=journal, synced=synced), uploadWorkers)])
+        except Exception as err:
+            # The entries after the error were never listed, so they are missing from the check below
+            logger.error(f"Reading the listing failed, the pass is left for --resume and the next sync: {err}")
+            inputFailed = True
+    done = {keys[sourceID]: listed[keys[sourceID]] for sourceID in synced if keys.get(sourceID) in listed}
+    # Retrying a skipped record cannot succeed until misportal modifies it, which lists it again
+    skipped = {key: listed[key] for key in failed if key in listed}
+    recordindex.markListed(source.name, list(done.items()) + list(skipped.items()))
+    if skipped:
+        metrics.increment("records", len(skipped), source=source.name, outcome="failed_permanently")
+        logger.error(f"Skipped {len(skipped)} records that cannot sync as misportal has them, see {source.failedDir}")
+    for reason in ("listed", "duplicate", "unchanged"):
+        if counts[reason]:
+            metrics.increment("records", counts[reason], source=source.name, outcome=f"skipped_{reason}")
+    if not counts["entries"]:
+        logger.info("No data available for the query. Its OK.")
+    if counts["duplicate"]:
+        logger.info(f"Merged {counts['duplicate']} records listed as both new and modified")
+    if isModify is None:
+        logger.info(f"Planned {counts['new']} new records and {counts['modify']} new versions")
+    if counts["listed"]:
+        logger.info(f"Skipped {counts['listed']} records already synced by an earlier pass")
+    if counts["unchanged"]:
+        logger.info(f"Skipped {counts['unchanged']} records unchanged since the last sync")
+    if len(done) + len(skipped) < len(listed):
+        logger.error(f"{len(listed) - len(done) - len(skipped)} of {len(listed)} listed records failed to sync, "
+                     "the pass is left for --resume and the next sync")
+        return False
+    return not inputFailed
+
+def runPass(source: Source, action, journal=None, **kwargs):
+    """
+    Runs a pass of a journal, whose arguments name the value of a backfill
+    shard after source.valueParam, e.g. pub_year.
+    """
+    if source.valueParam in kwargs:
+        kwargs["value"] = kwargs.pop(source.valueParam)
+    return sync(source, action, journal=journal, **kwargs)
+
+def runJournal(source: Source, journal: checkpoint.Journal, shardWorkers: int = 1, advance: bool = True,
+               transformProcesses: int = 0, **budget) -> bool:
+    """
+    Runs the pending passes of a journal, then reports on the run.
+
+    The metrics and unmapped values of the source are reset first, so a
+    long-running process reports on each of its runs separately.
+
+    Args:
+        source (Source): The source to sync.
+        journal (checkpoint.Journal): The journal holding the passes.
+        shardWorkers (int): The number of passes run at the same time.
+        advance (bool): Whether to advance the watermark of the source once
+            every pass is done. Backfills leave it alone.
+        transformProcesses (int): Transform on a pool of this many processes
+            instead of threads. The pool is shared by every pass and shard.
+        **budget: Worker counts passed on to sync, e.g. uploadWorkers.
+
+    Returns:
+        bool: Whether every pass is done.
+    """
+    logger = source.logger
+    metrics.reset(source.name)
+    mapping.resetUnmapped(source.unmappedKinds)
+    source.start()
+    with pipeline.processPool(transformProcesses) as executor:
+        done = shards.runPasses(partial(runPass, source, executor=executor, **budget), journal, shardWorkers)
+    if done and advance:
+        shards.advanceWatermark(source.name, journal.passes)
+    mapping.reportUnmapped(logger, source.unmappedKinds)
+    metrics.export(source.name, passes=journal.passes)
+    logger.info("Step timings: " + ", ".join(f"{step} {stats['count']}x p95 {stats['p95_seconds']}s"
+                                             for step, stats in metrics.summary(source.name)["steps"].items()))
+    source.finish()
+    return done
+
+def reconcileIndex(source: Source) -> bool:
+    try:
+        count = recordindex.reconcile(source.name, source.idField, source.invenio, source.invenioHost)
+    except (requests.RequestException, ValueError) as err:
+        source.logger.error(f"Could not list the records of Invenio, the index is left untouched: {err}")
+        return False
+    source.logger.info(f"Index rebuilt with {count} records")
+    return True
+
+def commandPasses(source: Source, args: argparse.Namespace, replay: archive.ReplayAdapter | None = None) -> list[dict]:
+    """
+    Builds the passes of a sync or backfill from its command line.
+
+    Args:
+        source (Source): The source to sync.
+        args (argparse.Namespace): The parsed command line of main.
+        replay (archive.ReplayAdapter, optional): The archive replayed, whose
+            recorded passes a sync lists again instead of the windows since
+            the watermark, which have moved on since the capture.
+
+    Returns:
+        list[dict]: The keyword arguments of each pass.
+    """
+    if args.command == "backfill":
+        return shards.backfillPasses(args.action, args.start, args.end, args.window_days,
+                                     source.valueParam, args.values)
+    if replay is not None and replay.passes:
+        return replay.passes
+    return shards.incrementalPasses(source.name)
+
+def dryRun(source: Source, args: argparse.Namespace, passes: list[dict]):
+    """Runs passes as a dry run with the options of the command line, see dryrun.dryRun."""
+    # Only dry runs need the validation and reporting code
+    import dryrun
+    report = args.report or datetime.now().strftime(f"{dryrun.REPORT_DIR}/{source.name}_dryrun_%Y-%m-%d_%H%M%S.jsonl")
+    with profiling.profiled(args.profile, args.trace_memory):
+        dryrun.dryRun(source, passes, report, inputPath=args.input,
+                      schemaPath=args.schema, transformProcesses=args.transform_processes)
+
+def main(source: Source, argv: list[str] | None = None):
+    """
+    The command line of a sync.
+
+    Args:
+        source (Source): The source to sync.
+        argv (list[str], optional): The arguments. Defaults to sys.argv.
+    """
+    logger = source.logger
+    parser = argparse.ArgumentParser(description=source.description)
+    parser.add_argument("command", nargs="?", default="sync", choices=["sync", "reconcile", "backfill"],
+                        help="sync what changed since the last sync (default), rebuild the local record index from Invenio, "
+                             f"or backfill a date range or a set of {source.valueParam} values")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue the last interrupted sync from its checkpoint journal")
+    parser.add_argument("--from", dest="start", type=date.fromisoformat,
+                        help="backfill: first day (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="end", type=date.fromisoformat, default=date.today(),
+                        help="backfill: last day (YYYY-MM-DD), defaults to today")
+    parser.add_argument(source.valueFlag, dest="values", nargs="+", default=[],
+                        help=f"backfill: shard on these {source.valueParam} values instead of dates")
+    parser.add_argument("--window-days", type=int, default=shards.BACKFILL_WINDOW_DAYS,
+                        help="backfill: days per shard")
+    parser.add_argument("--action", choices=["new", "modify", "sync"], default="new",
+                        help="backfill: create missing records (new, by submit date), "
+                             "version changed ones (modify, by modification date) or both (sync)")
+    parser.add_argument("--shards", type=int, default=shards.BACKFILL_SHARDS,
+                        help="backfill: number of shards synced at the same time")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="list, transform and validate the records of the sync or backfill and report "
+                             "on them, without touching Invenio")
+    parser.add_argument("--input", metavar="PATH",
+                        help="dry run: read the records from this JSON or JSONL file instead of misportal")
+    parser.add_argument("--report", metavar="PATH",
+                        help="dry run: the JSONL report, gzipped if it ends in .gz")
+    parser.add_argument("--schema", metavar="PATH",
+                        help="dry run: also validate the records against this JSON schema")
+    parser.add_argument("--transform-processes", type=int,
+                        help="transform on this many worker processes instead of threads, "
+                             "a dry run defaults to the number of CPUs")
+    archiving = parser.add_mutually_exclusive_group()
+    archiving.add_argument("--capture", metavar="PATH",
+                           help="append the misportal responses of the run to this archive (.jsonl.gz)")
+    archiving.add_argument("--replay", metavar="PATH",
+                           help="answer the misportal requests of the run from this archive, a sync listing "
+                                "the windows it captured and leaving the watermark alone")
+    parser.add_argument("--profile", metavar="PATH",
+                        help="run the sync under cProfile and write its stats to PATH")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="trace memory allocations of the sync and log the top allocation sites")
+    args = parser.parse_args(argv)
+    setupLogging(logger, source.logFile)
+    if args.command == "reconcile":
+        reconcileIndex(source)
+        return
+    if args.dry_run and args.resume:
+        parser.error("a dry run has no checkpoint to resume")
+    if args.command == "backfill" and not (args.resume or args.start or args.values or args.dry_run and args.input):
+        parser.error(f"backfill needs --from or {source.valueFlag}")
+    with ExitStack() as stack:
+        replay = stack.enter_context(archive.replaying(source, args.replay)) if args.replay else None
+        capture = stack.enter_context(archive.capturing(source, args.capture)) if args.capture else None
+        if args.resume:
+            journal = checkpoint.resumeJournal(source.checkpointDir)
+            if journal is None:
+                logger.info("No interrupted sync to resume")
+                return
+            logger.info(f"Resuming sync from {journal.path}")
+            passes = journal.passes
+        elif args.dry_run and args.input:
+            # The records come from the file, nothing is listed
+            passes = []
+        else:
+            passes = commandPasses(source, args, replay)
+        if capture is not None:
+            capture.writePasses(passes)
+        if args.dry_run:
+            dryRun(source, args, passes)
+            return
+        if not args.resume:
+            journal = checkpoint.newJournal(source.checkpointDir, passes)
+        # The passes of a sync run in order, the shards of a backfill concurrently
+        with profiling.profiled(args.profile, args.trace_memory):
+            if args.command == "backfill":
+                runJournal(source, journal, args.shards, advance=False,
+                           transformProcesses=args.transform_processes or 0)
+            else:
+                runJournal(source, journal, advance=replay is None, transformProcesses=args.transform_processes or 0)
@@ -0,0 +1,141 @@
+import logging
+import sqlite3
+import threading
+import time
+from collections import Counter
+import requests
+
+logger = logging.getLogger(__name__)
+
+# On-disk cache of misportal per-record responses
+CACHE_FILE = "cache/http.db"
+# Size of the cached bodies above which the least recently used are evicted
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+# Whether get goes through the cache. Capturing turns it off, so every
+# record is really fetched and lands in the archive, and so does replaying,
+# whose responses are local already.
+ENABLED = True
+
+_connection = None
+_connectionLock = threading.Lock()
+_cachedBytes = 0
+_stats = Counter()
+
+def getConnection() -> sqlite3.Connection:
+    """
+    Returns the connection to the cache, creating the schema on first use.
+
+    Returns:
+        sqlite3.Connection: The connection shared by all threads.
+    """
+    global _connection, _cachedBytes
+    if _connection is None:
+        _connection = sqlite3.connect(CACHE_FILE, check_same_thread=False)
+        _connection.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                modified TEXT,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                used_at REAL NOT NULL
+            )""")
+        _connection.execute("CREATE INDEX IF NOT EXISTS responses_used_at ON responses (used_at)")
+        _connection.commit()
+        _cachedBytes = _connection.execute("SELECT coalesce(sum(size), 0) FROM responses").fetchone()[0]
+    return _connection
+
+def _cachedResponse(url: str, body: bytes) -> requests.Response:
+    res = requests.Response()
+    res.status_code = 200
+    res.url = url
+    res.headers["Content-Type"] = "application/json"
+    res._content = body
+    return res
+
+def _store(url: str, res: requests.Response, modified: str | None):
+    global _cachedBytes
+    body = res.content
+    with _connectionLock:
+        connection = getConnection()
+        old = connection.execute("SELECT size FROM responses WHERE url = ?", (url,)).fetchone()
+        connection.execute(
+            "INSERT OR REPLACE INTO responses (url, etag, last_modified, modified, body, size, used_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (url, res.headers.get("ETag"), res.headers.get("Last-Modified"), modified,
+             body, len(body), time.time()))
+        _cachedBytes += len(body) - (old[0] if old else 0)
+        _stats["misses"] += 1
+        # Evict the least recently used responses, a batch at a time
+        while _cachedBytes > CACHE_MAX_BYTES:
+            evicted = connection.execute(
+                "SELECT url, size FROM responses ORDER BY used_at LIMIT 100").fetchall()
+            if not evicted:
+                break
+            connection.executemany("DELETE FROM responses WHERE url = ?", [(row[0],) for row in evicted])
+            _cachedBytes -= sum(row[1] for row in evicted)
+            _stats["evicted"] += len(evicted)
+        connection.commit()
+
+def _touch(url: str, stat: str):
+    with _connectionLock:
+        connection = getConnection()
+        connection.execute("UPDATE responses SET used_at = ? WHERE url = ?", (time.time(), url))
+        connection.commit()
+        _stats[stat] += 1
+
+def get(session: requests.Session, url: str, modified: str | None = None, **kwargs) -> requests.Response:
+    """
+    GETs a URL through the on-disk cache.
+
+    A cached response with an ETag or Last-Modified header is revalidated
+    with a conditional GET, and reused if the server answers 304. A cached
+    response without either header is reused without a request when the
+    modification date from the listing is unchanged.
+
+    Args:
+        session (requests.Session): The session to send requests with.
+        url (str): The URL, e.g. a json_record_url.
+        modified (str, optional): The modification date of the record in the listing.
+        **kwargs: Passed on to session.get.
+
+    Returns:
+        requests.Response: The response, or a 200 response rebuilt from the
+            cache. Responses other than 200 are returned as is and not cached.
+    """
+    if not ENABLED:
+        return session.get(url, **kwargs)
+    with _connectionLock:
+        row = getConnection().execute(
+            "SELECT etag, last_modified, modified, body FROM responses WHERE url = ?", (url,)).fetchone()
+    headers = {}
+    if row:
+        etag, lastModified, cachedModified, body = row
+        if etag:
+            headers["If-None-Match"] = etag
+        if lastModified:
+            headers["If-Modified-Since"] = lastModified
+        if not headers and modified is not None and modified == cachedModified:
+            _touch(url, "hits")
+            return _cachedResponse(url, body)
+    res = session.get(url, headers=headers, **kwargs)
+    if row and res.status_code == 304:
+        _touch(url, "revalidated")
+        return _cachedResponse(url, body)
+    if res.status_code == 200:
+        _store(url, res, modified)
+    else:
+        with _connectionLock:
+            _stats["misses"] += 1
+    return res
+
+def getStats() -> dict[str, int]:
+    """
+    Returns the counters of the cache.
+
+    Returns:
+        dict: The number of "hits" served without a request, of responses
+            "revalidated" with a 304, of "misses" and of "evicted" responses.
+    """
+    return {key: _stats[key] for key in ("hits", "revalidated", "misses", "evicted")}
@@ -0,0 +1,92 @@
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of identifiers whose detected schemes are kept in memory
+SCHEME_CACHE_SIZE = 100000
+# Where the cache is kept between runs
+SCHEME_CACHE_FILE = "cache/identifier_schemes.json"
+
+_schemes = OrderedDict()
+_schemesLock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+def detectSchemes(identifier: str) -> list[str]:
+    """
+    Returns the schemes idutils detects for an identifier, memoized.
+
+    idutils.detect_identifier_schemes tries the regex of every scheme, and
+    re-syncs keep passing the same DOIs and arXiv ids, so results are kept
+    in a bounded LRU cache keyed on the raw identifier string.
+
+    Args:
+        identifier (str): The identifier, e.g. a doi_link or lanl_number.
+
+    Returns:
+        list[str]: The detected schemes, e.g. ["doi", "url"].
+    """
+    with _schemesLock:
+        schemes = _schemes.get(identifier)
+        if schemes is not None:
+            _schemes.move_to_end(identifier)
+            _stats["hits"] += 1
+            return list(schemes)
+        _stats["misses"] += 1
+    # idutils takes a few hundred milliseconds to import, which a run whose
+    # identifiers are all in the persisted cache never pays
+    import idutils
+    schemes = idutils.detect_identifier_schemes(identifier)
+    with _schemesLock:
+        _schemes[identifier] = list(schemes)
+        _schemes.move_to_end(identifier)
+        while len(_schemes) > SCHEME_CACHE_SIZE:
+            _schemes.popitem(last=False)
+    return list(schemes)
+
+def getStats() -> dict[str, int]:
+    """
+    Returns the hit and miss counters of the cache.
+
+    Returns:
+        dict: The "hits", "misses" and current "size" of the cache.
+    """
+    with _schemesLock:
+        return {**_stats, "size": len(_schemes)}
+
+def loadCache(path: str = SCHEME_CACHE_FILE):
+    """
+    Loads the cache saved by a previous run, if any.
+
+    Args:
+        path (str): The cache file.
+    """
+    try:
+        with open(path) as file:
+            saved = json.load(file)
+    except FileNotFoundError:
+        return
+    except (OSError, json.JSONDecodeError) as err:
+        logger.warning(f"Ignoring unreadable identifier scheme cache {path}: {err}")
+        return
+    with _schemesLock:
+        for identifier, schemes in saved.items():
+            _schemes.setdefault(identifier, schemes)
+        while len(_schemes) > SCHEME_CACHE_SIZE:
+            _schemes.popitem(last=False)
+
+def saveCache(path: str = SCHEME_CACHE_FILE):
+    """
+    Saves the cache for the next run, least recently used entries first.
+
+    Args:
+        path (str): The cache file.
+    """
+    with _schemesLock:
+        saved = dict(_schemes)
+    with open(f"{path}.tmp", "w") as file:
+        json.dump(saved, file)
+    os.replace(f"{path}.tmp", path)
@@ -0,0 +1,245 @@
+import logging
+import re
+import threading
+from collections import Counter
+from functools import lru_cache
+
+# Publication division (misportal "affiliation") to Invenio division id
+PUB_DIVISION_TITLE_ID = {
+    "12 Gev Director's Office" : "12DO",
+    "Accelerator Ops, R&D" : "AORD",
+    "CFO Div Summary" : "CFO",
+    "Chief Operting Officr Off" : "COO",
+    "Chief Scientist Office" : "CSO",
+    "Directorate" : "DIR",
+    "EIC" : "EIC",
+    "ES&H Division" : "ESHD",
+    "Comp Sci&Tech (CST) Div" : "CSDS",
+    "Engineering Division" : "ENG",
+    "Exp Nuclear Physics / Technical Support Groups" : "ENPTSG-CP",
+    "Exp Nuclear Physics / Physics Division Office" : "ENPH-PDO-ADMIN",
+    "Exp Nuclear Physics / Experimental Halls / Physics Magnet": "ENPH-EH-PM",
+    "Exp Nuclear Physics / Experimental Halls / Hall A": "ENPH-EH-HA",
+    "Exp Nuclear Physics / Experimental Halls / Hall B": "ENPH-EH-HB",
+    "Exp Nuclear Physics / Experimental Halls / Hall C": "ENPH-EH-HC",
+    "Exp Nuclear Physics / Experimental Halls / Hall D": "ENPH-EH-HD",
+    "Exp Nuclear Physics / Experimental Halls / Physics EIC": "ENPH-EHPH",
+    "Exp Nuclear Physics / Experimental Halls / Hall B&D Technical Support" : "ENPH-EHBDTS",
+    "Exp Nuclear Physics / OTHERS" : "ENPH-OTHER",
+    "FEL & CTO": "FEL-CTO",
+    "Facilities & Logistcs Mgt": "FLM",
+    "Proj Mgmt & Integration" : "PMI",
+    "SNS PPU" : "SPPU",
+    "Theory & Comp Physics": "TCP",
+    "OTHERS" : "OTHERS"
+}
+
+# PAC experimental hall to Invenio division id
+PAC_HALL_DIVISION_ID = {"A": "ENPH-EH-HA",
+                        "B": "ENPH-EH-HB",
+                        "C": "ENPH-EH-HC",
+                        "D": "ENPH-EH-HD"}
+
+# PAC status to Invenio pac_status id
+PAC_STATUS_DICT = {
+    'A- Approved': 'A',
+    'AT- Approved Test': 'AT',
+    'C1- Conditionally Approve w/Technical Review': 'C1',
+    'C2- Conditionally Approve 2/PAC Review': 'C2',
+    'C3- Conditionally Approve, based on availability': 'C3',
+    'C- Conditionally Approve': 'C',
+    'D- Deffered': 'D',
+    'O- Dropped': 'O',
+    'S- MPS Not yet funded': 'S',
+    'N- New': 'N',
+    'P- Pass': 'P',
+    'R- Rejected': 'R',
+    'Q- Replaced': 'Q',
+    'H- Run Group Proposals': 'H',
+    'G- Run Group Additions': 'G',
+    'U- Unknown': 'U',
+    'W- Withdrawn': 'W'
+}
+
+# Free-text PAC statuses that do not follow the "X- Status" form of PAC_STATUS_DICT
+PAC_STATUS_ALIASES = {
+    "deferred": "D",
+    "conditionally approved": "C",
+}
+
+_statusPattern = re.compile(r'^.*[:\-]\s*|\s*\(.+', flags=re.MULTILINE)
+
+@lru_cache(maxsize=4096)
+def normalizeStatus(status: str) -> str:
+    """
+    Strips the code prefix and any parenthesised remark from a PAC status.
+
+    Args:
+        status (str): The status, e.g. "C1- Conditionally Approve w/Technical Review".
+
+    Returns:
+        str: The bare status text, e.g. "Conditionally Approve w/Technical Review".
+    """
+    return _statusPattern.sub('', status).strip()
+
+# Built once at import. On duplicate normalized keys the first entry wins,
+# like the linear scan this replaces.
+_statusIDs = {}
+for _key, _value in PAC_STATUS_DICT.items():
+    _statusIDs.setdefault(normalizeStatus(_key), _value)
+_hallDivisionIDs = {}
+for _key, _value in PAC_HALL_DIVISION_ID.items():
+    _hallDivisionIDs.setdefault(_key.lower(), _value)
+
+_unmapped = Counter()
+_unmappedLock = threading.Lock()
+
+def countUnmapped(kind: str, value):
+    """
+    Counts a value that had no mapping and fell back to a default.
+
+    Args:
+        kind (str): What was being mapped, e.g. "pac status".
+        value: The unmapped value.
+    """
+    with _unmappedLock:
+        _unmapped[(kind, str(value))] += 1
+
+def getUnmapped(kind: str | None = None) -> dict:
+    """
+    Returns the unmapped values counted so far in this process.
+
+    Transforms running in worker processes count in those processes.
+
+    Args:
+        kind (str, optional): Only return values of this kind.
+
+    Returns:
+        dict: Maps (kind, value) to the number of times it was seen.
+    """
+    with _unmappedLock:
+        return {key: count for key, count in _unmapped.items() if kind is None or key[0] == kind}
+
+def resetUnmapped(kinds: list[str]):
+    """Forgets the unmapped values of the given kinds, e.g. before a new run of a sync."""
+    with _unmappedLock:
+        for key in [key for key in _unmapped if key[0] in kinds]:
+            del _unmapped[key]
+
+def reportUnmapped(logger: logging.Logger, kinds: list[str]):
+    """
+    Logs the unmapped values of the given kinds, most frequent first.
+
+    Args:
+        logger (logging.Logger): The logger of the sync.
+        kinds (list[str]): The kinds to report.
+    """
+    unmapped = Counter()
+    for kind in kinds:
+        unmapped.update(getUnmapped(kind))
+    for (kind, value), count in unmapped.most_common():
+        logger.warning(f"Unmapped {kind} {value!r} seen {count} times")
+
+def getStatusID(status) -> str:
+    """
+    Resolves a PAC status to its pac_status id.
+
+    Args:
+        status: The status from misportal.
+
+    Returns:
+        str: The status id, "U" if the status is unknown.
+    """
+    try:
+        extracted_status = normalizeStatus(status)
+    except TypeError:
+        countUnmapped("pac status", status)
+        return PAC_STATUS_DICT["U- Unknown"]
+    statusID = PAC_STATUS_ALIASES.get(extracted_status.lower()) or _statusIDs.get(extracted_status)
+    if not statusID:
+        countUnmapped("pac status", status)
+        statusID = PAC_STATUS_DICT["U- Unknown"]
+    return statusID
+
+def getHallDivisionID(exp_hall: str) -> str:
+    """
+    Resolves a PAC experimental hall to its division id, ignoring case.
+
+    Args:
+        exp_hall (str): The experimental hall, e.g. "A".
+
+    Returns:
+        str: The division id, "AORD" if the hall is unknown.
+    """
+    divisionID = _hallDivisionIDs.get(exp_hall.lower())
+    if not divisionID:
+        countUnmapped("pac hall", exp_hall)
+        divisionID = "AORD"
+    return divisionID
+
+@lru_cache(maxsize=4096)
+def _getPubDivisionID(division: str) -> tuple[str, bool]:
+    firstDiv = division.split("/")[0].strip()
+    if firstDiv.startswith("Exp"):
+        divisionID = PUB_DIVISION_TITLE_ID.get(division)
+        return (divisionID, True) if divisionID else ("ENPH-OTHER", False)
+    divisionID = PUB_DIVISION_TITLE_ID.get(firstDiv)
+    return (divisionID, True) if divisionID else ("OTHERS", False)
+
+def getPubDivisionID(division: str) -> str:
+    """
+    Resolves a publication affiliation to its division id.
+
+    Experimental Nuclear Physics divisions are matched on the full path,
+    others on their first component.
+
+    Args:
+        division (str): The affiliation, e.g. "Exp Nuclear Physics / Experimental Halls / Hall A".
+
+    Returns:
+        str: The division id, "ENPH-OTHER" or "OTHERS" if the division is unknown.
+    """
+    divisionID, mapped = _getPubDivisionID(division)
+    if not mapped:
+        countUnmapped("pub division", division)
+    return divisionID
+
+def cleanedName(fullname: str) -> dict[str, str]:
+    """
+    Splits the full name into given and family names.
+
+    Args:
+        fullname (str): The full name of a person.
+
+    Returns:
+        dict: A personal person_or_org with given_name and family_name.
+    """
+    names = fullname.split()
+    # The first name includes the middle name if present
+    first_name = ' '.join(names[:-1])
+    # Last name is the last element in the names list
+    last_name = names[-1]
+    return {"type": "personal", "given_name":first_name, "family_name":last_name}
+
+def getRightsDict() -> dict:
+    rights = [
+                {
+                "icon": "cc-by-icon","id": "cc-by-4.0",
+                    "props": {
+                    "url": "https://creativecommons.org/licenses/by/4.0/legalcode",
+                    "scheme": "spdx"
+                    },
+                    "title": {
+                    "en": "Creative Commons Attribution 4.0 International"
+                    },
+                    "description": {
+                    "en": "The Creative Commons Attribution license allows re-distribution and re-use of a licensed work on the condition that the creator is appropriately credited."
+                    }
+                }
+            ]
+    return {"rights": rights}
+
+def getAccessDict() -> dict:
+    access = {"files": "public", "record": "public", "embargo": {"active": False}}
+    files = {"enabled": False}
+    return {"access": access, "files": files}
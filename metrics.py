@@ -0,0 +1,197 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Where the metrics of the last run of each sync are written
+METRICS_DIR = "metrics"
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Prefix of the exported Prometheus metric names
+PROMETHEUS_PREFIX = "misportal_sync"
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+
+class Histogram:
+    """Cumulative latency histogram with Prometheus-style buckets."""
+
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.buckets[index] += 1
+                break
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, fraction: float) -> float:
+        """Estimates a quantile as the upper bound of the bucket it falls in."""
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+def observe(source: str, step: str, seconds: float):
+    """
+    Records the duration of one step of a sync.
+
+    Args:
+        source (str): "pub" or "pac".
+        step (str): The step, e.g. "create" or "transform".
+        seconds (float): How long the step took, retries and rate limiting included.
+    """
+    with _lock:
+        histogram = _histograms.get((source, step))
+        if histogram is None:
+            histogram = _histograms[(source, step)] = Histogram()
+        histogram.observe(seconds)
+
+@contextmanager
+def timed(source: str, step: str):
+    """
+    Times the body of a with statement as one step of a sync.
+
+    Args:
+        source (str): "pub" or "pac".
+        step (str): The step, e.g. "create" or "transform".
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(source, step, time.perf_counter() - started)
+
+def increment(name: str, value: int = 1, **labels):
+    """
+    Adds to a counter.
+
+    Args:
+        name (str): The counter, e.g. "records".
+        value (int): The amount to add.
+        **labels: The labels of the counter, e.g. source="pub", outcome="failed".
+    """
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def _hasSource(labels: tuple, source: str | None) -> bool:
+    return source is None or dict(labels).get("source") == source
+
+def reset(source: str | None = None):
+    """
+    Forgets the metrics collected so far.
+
+    Args:
+        source (str, optional): Only forget the metrics of this sync, e.g.
+            when a long-running process starts a new run of it.
+    """
+    with _lock:
+        for key in [key for key in _histograms if source in (None, key[0])]:
+            del _histograms[key]
+        for key in [key for key in _counters if _hasSource(key[1], source)]:
+            del _counters[key]
+
+def summary(source: str | None = None) -> dict:
+    """
+    Returns the metrics collected so far.
+
+    Args:
+        source (str, optional): Only return the metrics of this sync.
+
+    Returns:
+        dict: "steps" maps "source/step" to its count, total, mean, p50, p95
+            and max seconds; "counters" lists every counter with its labels.
+    """
+    with _lock:
+        steps = {f"{stepSource}/{step}": {"count": histogram.count,
+                                       "total_seconds": round(histogram.sum, 3),
+                                       "mean_seconds": round(histogram.sum / histogram.count, 4),
+                                       "p50_seconds": round(histogram.quantile(0.5), 4),
+                                       "p95_seconds": round(histogram.quantile(0.95), 4),
+                                       "max_seconds": round(histogram.max, 4)}
+                 for (stepSource, step), histogram in sorted(_histograms.items())
+                 if source in (None, stepSource)}
+        counters = [{"name": name, **dict(labels), "value": value}
+                    for (name, labels), value in sorted(_counters.items()) if _hasSource(labels, source)]
+    return {"steps": steps, "counters": counters}
+
+def _writeAtomically(path: str, text: str):
+    # Readers such as the node_exporter textfile collector must never see a partial file
+    with open(f"{path}.tmp", "w") as file:
+        file.write(text)
+    os.replace(f"{path}.tmp", path)
+
+def writeSummary(path: str, source: str | None = None, **extra):
+    """
+    Writes the metrics as a JSON summary.
+
+    Args:
+        path (str): The file to write.
+        source (str, optional): Only write the metrics of this sync.
+        **extra: More fields of the summary, e.g. the passes of the run.
+    """
+    _writeAtomically(path, json.dumps({"finished_at": time.time(), "source": source, **extra,
+                                       **summary(source)}, indent=2))
+
+def _labels(labels: dict) -> str:
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+def writePrometheus(path: str, source: str):
+    """
+    Writes the metrics of a sync in the Prometheus text exposition format,
+    for the node_exporter textfile collector.
+
+    Args:
+        path (str): The file to write, ending in ".prom".
+        source (str): The sync whose metrics are written. Every series is
+            labelled with it, so the files of pub and pac do not clash.
+    """
+    name = f"{PROMETHEUS_PREFIX}_step_duration_seconds"
+    lines = [f"# HELP {name} Duration of the steps of a sync run, retries included.",
+             f"# TYPE {name} histogram"]
+    with _lock:
+        for (stepSource, step), histogram in sorted(_histograms.items()):
+            if stepSource != source:
+                continue
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, histogram.buckets):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels({'source': source, 'step': step, 'le': bound})} {cumulative}")
+            lines.append(f"{name}_bucket{_labels({'source': source, 'step': step, 'le': '+Inf'})} {histogram.count}")
+            lines.append(f"{name}_sum{_labels({'source': source, 'step': step})} {histogram.sum}")
+            lines.append(f"{name}_count{_labels({'source': source, 'step': step})} {histogram.count}")
+        counterNames = sorted({counterName for counterName, labels in _counters if _hasSource(labels, source)})
+        for counterName in counterNames:
+            metricName = f"{PROMETHEUS_PREFIX}_{counterName}_total"
+            lines += [f"# HELP {metricName} Number of {counterName.replace('_', ' ')} in the last sync run.",
+                      f"# TYPE {metricName} counter"]
+            for (otherName, labels), value in sorted(_counters.items()):
+                if otherName == counterName and _hasSource(labels, source):
+                    lines.append(f"{metricName}{_labels(dict(labels))} {value}")
+    lines.append(f"# HELP {PROMETHEUS_PREFIX}_last_run_timestamp_seconds When the last sync run finished.")
+    lines.append(f"# TYPE {PROMETHEUS_PREFIX}_last_run_timestamp_seconds gauge")
+    lines.append(f"{PROMETHEUS_PREFIX}_last_run_timestamp_seconds{_labels({'source': source})} {time.time()}")
+    _writeAtomically(path, "\n".join(lines) + "\n")
+
+def export(source: str, **extra):
+    """
+    Writes the metrics of a sync run to METRICS_DIR, as <source>.json and <source>.prom.
+
+    Args:
+        source (str): "pub" or "pac".
+        **extra: More fields of the JSON summary.
+    """
+    writeSummary(f"{METRICS_DIR}/{source}.json", source, **extra)
+    writePrometheus(f"{METRICS_DIR}/{source}.prom", source)
@@ -0,0 +1,233 @@
+import logging
+import queue
+import threading
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from functools import partial
+
+logger = logging.getLogger(__name__)
+
+# Number of records whose existence is resolved together before uploading
+BATCH_SIZE = 50
+# Seconds a batching stage waits for more records before processing a partial batch
+BATCH_WAIT = 1.0
+# Maximum number of records waiting between two stages
+QUEUE_SIZE = 100
+# Number of records sent to a transform worker process at once
+TRANSFORM_CHUNK_SIZE = 64
+# Number of records one sync uploads to Invenio at the same time
+UPLOAD_WORKERS = 8
+# Maximum number of records uploaded at the same time by all syncs in the process
+MAX_CONCURRENT_UPLOADS = 16
+
+_uploadSlots = threading.BoundedSemaphore(MAX_CONCURRENT_UPLOADS)
+_recordLocks = {}
+_recordLocksLock = threading.Lock()
+
+# A step of runStages. func takes one item and returns the item for the next
+# stage, or None to drop it. With batchSize set, func takes a list of up to
+# batchSize items and returns a list of items for the next stage, in which
+# None items are dropped.
+Stage = namedtuple("Stage", ["func", "workers", "batchSize"], defaults=[1, None])
+
+_DONE = object()
+
+def _holdRecord(key):
+    with _recordLocksLock:
+        entry = _recordLocks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    return entry
+
+def _releaseRecord(key, entry):
+    with _recordLocksLock:
+        entry[1] -= 1
+        if not entry[1]:
+            del _recordLocks[key]
+
+def uploadOne(upload, invenioDict: dict, key: str | None = None, **kwargs) -> bool:
+    """
+    Runs the create/review/submit/accept or new-version chain of one record.
+
+    The record waits for one of the MAX_CONCURRENT_UPLOADS slots shared by
+    every sync in the process. An exception is logged and counted as a
+    failed upload, so it does not stop the other records.
+
+    Args:
+        upload (callable): uploadNew or uploadModify.
+        invenioDict (dict): The transformed record.
+        key (str, optional): Records with the same key are never uploaded at
+            the same time, e.g. when the overlapping windows of a backfill
+            list the same record. The second one then finds the first one's
+            progress in the journal.
+        **kwargs: Passed on to upload.
+
+    Returns:
+        bool: The result of upload.
+    """
+    entry = _holdRecord(key) if key else None
+    try:
+        with entry[0] if entry else nullcontext(), _uploadSlots:
+            try:
+                return upload(invenioDict, **kwargs)
+            except Exception as err:
+                logger.exception(f"Upload failed: {err}")
+                return False
+    finally:
+        if entry:
+            _releaseRecord(key, entry)
+
+def _transformOne(transform, entry):
+    try:
+        return transform(entry), None
+    except Exception as err:
+        return None, f"{type(err).__name__}: {err}"
+
+def processPool(processes: int):
+    """
+    Returns a process pool to pass to transformMany, or a null context when processes is 0.
+
+    Args:
+        processes (int): The number of worker processes.
+
+    Returns:
+        A context manager yielding a ProcessPoolExecutor, or None.
+    """
+    return ProcessPoolExecutor(max_workers=processes) if processes else nullcontext()
+
+def transformMany(transform, entries: list, workers: int | None = None,
+                  chunkSize: int = TRANSFORM_CHUNK_SIZE, executor: ProcessPoolExecutor | None = None,
+                  withErrors: bool = False) -> list:
+    """
+    Transforms many entries across a process pool.
+
+    Entries are sent to the worker processes in chunks of chunkSize, so the
+    CPU-bound transform work does not serialize behind the GIL. transform
+    must be a module-level function, since it is pickled.
+
+    Args:
+        transform (callable): The transform function of a sync.
+        entries (list): The entries to transform.
+        workers (int, optional): The number of processes of a pool created
+            for this call. Defaults to the number of CPUs.
+        chunkSize (int): The number of entries sent to a process at once.
+        executor (ProcessPoolExecutor, optional): A pool to reuse across calls.
+        withErrors (bool): Return (record, error) pairs instead of logging
+            the errors, e.g. to report them.
+
+    Returns:
+        list: The transformed records, in the order of entries, with None
+            for entries whose transform raised.
+    """
+    func = partial(_transformOne, transform)
+    with nullcontext(executor) if executor else ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(func, entries, chunksize=chunkSize))
+    if withErrors:
+        return results
+    invenioDictList = []
+    for result, error in results:
+        if error:
+            logger.error(f"Transform failed: {error}")
+        invenioDictList.append(result)
+    return invenioDictList
+
+def _collectBatch(inQueue: queue.Queue, size: int) -> tuple[list, bool]:
+    batch = []
+    while len(batch) < size:
+        try:
+            item = inQueue.get(timeout=BATCH_WAIT) if batch else inQueue.get()
+        except queue.Empty:
+            break
+        if item is _DONE:
+            return batch, True
+        batch.append(item)
+    return batch, False
+
+def runStages(items, stages: list[Stage], queueSize: int = QUEUE_SIZE) -> list:
+    """
+    Runs items through a chain of stages connected by bounded queues.
+
+    Every stage has its own worker threads, so fetching, transforming and
+    uploading overlap and the run takes about as long as its slowest stage.
+    A full queue blocks the stage feeding it, which keeps a fast stage from
+    running ahead of a slow one. An exception raised for an item is logged
+    and the item is dropped. An exception raised while reading items ends
+    the input: the items read before it still run through every stage, then
+    it is raised, so callers know items are missing.
+
+    Args:
+        items (iterable): The input of the first stage. It is consumed on a
+            separate thread, so it may be a slow generator.
+        stages (list[Stage]): The stages, in order.
+        queueSize (int): The maximum number of items waiting before a stage.
+
+    Returns:
+        list: The non-None outputs of the last stage, in completion order.
+
+    Raises:
+        Exception: Whatever reading items raised.
+    """
+    queues = [queue.Queue(maxsize=queueSize) for _ in stages]
+    remaining = [stage.workers for stage in stages]
+    results = []
+    inputErrors = []
+    lock = threading.Lock()
+
+    def emit(index, item):
+        if index == len(stages):
+            with lock:
+                results.append(item)
+        else:
+            queues[index].put(item)
+
+    def call(func, arg):
+        try:
+            return func(arg)
+        except Exception as err:
+            logger.exception(f"Pipeline stage {getattr(func, '__name__', func)} failed: {err}")
+            return None
+
+    def feed():
+        try:
+            for item in items:
+                queues[0].put(item)
+        except Exception as err:
+            logger.exception(f"Reading the pipeline input failed: {err}")
+            inputErrors.append(err)
+        finally:
+            queues[0].put(_DONE)
+
+    def work(index, stage):
+        done = False
+        while not done:
+            if stage.batchSize:
+                batch, done = _collectBatch(queues[index], stage.batchSize)
+                if batch:
+                    for item in call(stage.func, batch) or []:
+                        if item is not None:
+                            emit(index + 1, item)
+            else:
+                item = queues[index].get()
+                done = item is _DONE
+                if not done:
+                    item = call(stage.func, item)
+                    if item is not None:
+                        emit(index + 1, item)
+        # Let the other workers of this stage see the end of the input too
+        queues[index].put(_DONE)
+        with lock:
+            remaining[index] -= 1
+            last = remaining[index] == 0
+        if last and index + 1 < len(stages):
+            queues[index + 1].put(_DONE)
+
+    threads = [threading.Thread(target=feed, daemon=True)]
+    for index, stage in enumerate(stages):
+        threads += [threading.Thread(target=work, args=(index, stage), daemon=True) for _ in range(stage.workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if inputErrors:
+        raise inputErrors[0]
+    return results
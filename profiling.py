@@ -0,0 +1,71 @@
+import cProfile
+import logging
+import pstats
+import sys
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Number of functions and allocation sites logged at the end of a profiled run
+PROFILE_TOP = 25
+
+@contextmanager
+def profiled(profilePath: str | None = None, traceMemory: bool = False):
+    """
+    Profiles the body of a with statement, when asked to.
+
+    With profilePath, the body runs under cProfile. The stats are dumped to
+    profilePath, for pstats or snakeviz, and the top functions by cumulative
+    time are logged. With traceMemory, the body runs under tracemalloc, and
+    the peak traced memory and the top allocation sites are logged. Without
+    either, the body runs unchanged.
+
+    Args:
+        profilePath (str, optional): Where to write the cProfile stats.
+        traceMemory (bool): Whether to trace memory allocations.
+    """
+    profilers = []
+    lock = threading.Lock()
+
+    def profileThread(*args):
+        # The work runs on pipeline and shard threads, which cProfile does
+        # not follow before Python 3.12, so each new thread gets its own
+        sys.setprofile(None)
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+ already profiles every thread from the first profiler
+            return
+        with lock:
+            profilers.append(profiler)
+
+    if traceMemory:
+        tracemalloc.start()
+    if profilePath:
+        profilers.append(cProfile.Profile())
+        profilers[0].enable()
+        threading.setprofile(profileThread)
+    try:
+        yield
+    finally:
+        if profilePath:
+            threading.setprofile(None)
+            profilers[0].disable()
+        if traceMemory:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            top = [str(stat) for stat in snapshot.statistics("lineno")[:PROFILE_TOP]]
+            logger.info(f"Traced memory: {current / 2**20:.1f} MiB at the end, {peak / 2**20:.1f} MiB peak. "
+                        f"Top allocation sites:\n" + "\n".join(top))
+        if profilePath:
+            with lock:
+                stats = pstats.Stats(*profilers)
+            stats.dump_stats(profilePath)
+            top = [f"{pstats.func_std_string(func)}: {cumulative:.3f}s cumulative, {calls} calls"
+                   for func, (_, calls, _, cumulative, _) in
+                   sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:PROFILE_TOP]]
+            logger.info(f"Profile written to {profilePath}. Top functions:\n" + "\n".join(top))
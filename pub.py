@@ -1,80 +1,25 @@
-import requests
-import glob
-import json
 import re
-from datetime import datetime, timedelta
+from datetime import datetime
 import logging
-from logging.handlers import RotatingFileHandler
-import idutils
-# Set up logging
+import identifiers
+import mapping
+import syncsource
+
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
 
 INVENIOHOST = "https://inveniordm.jlab.org"
 TOKEN = ""
 COMMUNITYID = "69cf8901-1a33-44c6-83fa-04b4acf24941"
 LOG_DIR = "logs/pub"
 FAILED_DIR = "failed/pub"
+CHECKPOINT_DIR = "checkpoints/pub"
+# Number of per-record JSON documents fetched in parallel. Requests to
+# misportal are further capped by client.MISPORTAL_POOL_MAXSIZE.
+FETCH_WORKERS = 8
+# Number of records transformed in parallel
+TRANSFORM_WORKERS = 2
 
-# Define log file name with timestamp and rotation
-
-log_file = datetime.now().strftime(f"{LOG_DIR}/pubdb_sync_logs_%Y-%m-%d.log")
-handler = RotatingFileHandler(log_file, maxBytes=100000, backupCount=5)
-formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-handler.setFormatter(formatter)
-logger.addHandler(handler)
-
-h = {
-        "Accept": "application/json",
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {TOKEN}"
-        }
-
-division_title_id = {
-    "12 Gev Director's Office" : "12DO",
-    "Accelerator Ops, R&D" : "AORD",
-    "CFO Div Summary" : "CFO",
-    "Chief Operting Officr Off" : "COO",
-    "Chief Scientist Office" : "CSO",
-    "Directorate" : "DIR",
-    "EIC" : "EIC",
-    "ES&H Division" : "ESHD",
-    "Comp Sci&Tech (CST) Div" : "CSDS",
-    "Engineering Division" : "ENG",
-    "Exp Nuclear Physics / Technical Support Groups" : "ENPTSG-CP",
-    "Exp Nuclear Physics / Physics Division Office" : "ENPH-PDO-ADMIN",
-    "Exp Nuclear Physics / Experimental Halls / Physics Magnet": "ENPH-EH-PM",
-    "Exp Nuclear Physics / Experimental Halls / Hall A": "ENPH-EH-HA",
-    "Exp Nuclear Physics / Experimental Halls / Hall B": "ENPH-EH-HB",
-    "Exp Nuclear Physics / Experimental Halls / Hall C": "ENPH-EH-HC",
-    "Exp Nuclear Physics / Experimental Halls / Hall D": "ENPH-EH-HD",
-    "Exp Nuclear Physics / Experimental Halls / Physics EIC": "ENPH-EHPH",
-    "Exp Nuclear Physics / Experimental Halls / Hall B&D Technical Support" : "ENPH-EHBDTS",
-    "Exp Nuclear Physics / OTHERS" : "ENPH-OTHER",
-    "FEL & CTO": "FEL-CTO",
-    "Facilities & Logistcs Mgt": "FLM",
-    "Proj Mgmt & Integration" : "PMI",
-    "SNS PPU" : "SPPU",
-    "Theory & Comp Physics": "TCP",
-    "OTHERS" : "OTHERS"
-}
-
-def cleanedName(fullname: str) -> dict[str, str]:
-    """
-    Splits the full name into given and family names.
-    
-    Args:
-        fullname (str): The full name of a person.
-        
-    Returns:
-        dict: A dictionary with given_name and family_name.
-    """
-    names = fullname.split()
-    # The first name includes the middle name if present
-    first_name = ' '.join(names[:-1])
-    # Last name is the last element in the names list
-    last_name = names[-1]
-    return {"type": "personal", "given_name":first_name, "family_name":last_name}
+division_title_id = mapping.PUB_DIVISION_TITLE_ID
 
 def getPublicationDate(publication_date: str) -> str:
     """
@@ -105,27 +50,14 @@ def getExperimentDict(experimentList):
             expID = ''.join(expIDSplits)
             expIDList.append(expID)
         experimentNumberList.append(experimentNumber)
-    returnDict = {"rdm:experiment_number": experimentNumberList, "rdm:expID": list(set(expIDList))}
+    returnDict = {"rdm:experiment_number": experimentNumberList, "rdm:expID": list(dict.fromkeys(expIDList))}
     return returnDict
 
 
 def getDivisionDict(division):
     if not division:
         return {"rdm:division": [{"id": "OTHERS"}]}
-    division_split = division.split("/")
-    if division_split:
-        firstDiv = division_split[0].strip()
-        if firstDiv.startswith("Exp"):
-            try:
-                divisonid = division_title_id[division]
-            except Exception as err:
-                divisonid = "ENPH-OTHER"
-        else:
-            try:
-                divisonid = division_title_id[firstDiv]
-            except Exception as err:
-                divisonid = "OTHERS"
-    
+    divisonid = mapping.getPubDivisionID(division)
     return {"rdm:full_division": division, "rdm:division": [{"id": divisonid}]}
 
 def getAuthorDict(authors):
@@ -133,7 +65,7 @@ def getAuthorDict(authors):
     for author in authors:
         author_name = author.get("name","")
         if author_name:
-            authorNameDict = cleanedName(author_name)
+            authorNameDict = mapping.cleanedName(author_name)
             institution = author['institution']
             try:
                 institution_fullname = author['institution_fullname'].split(",", 1)[0]
@@ -179,31 +111,6 @@ def getAttachmentDict(attachments):
     returnDict = {"related_identifiers": isdocumentedbyList}
     return returnDict
 
-def getRightsDict():
-    rights = [
-                {
-                "icon": "cc-by-icon","id": "cc-by-4.0",
-                    "props": {
-                    "url": "https://creativecommons.org/licenses/by/4.0/legalcode",
-                    "scheme": "spdx"
-                    },
-                    "title": {
-                    "en": "Creative Commons Attribution 4.0 International"
-                    },
-                    "description": {
-                    "en": "The Creative Commons Attribution license allows re-distribution and re-use of a licensed work on the condition that the creator is appropriately credited."
-                    }
-                }
-            ]
-    returnDict = {"rights": rights}
-    return returnDict
-
-def getAccessDict():
-    access = {"files": "public", "record": "public", "embargo": {"active": False}}
-    files = {"enabled": False}
-    returnDict = {"access": access, "files": files}
-    return returnDict
-
 def getLDRDDict(ldrd, proposals= []):
     returnDict = {}
     if ldrd.lower() == "yes":
@@ -242,7 +149,7 @@ def getDocumentDict(entry):
                     advisor_name = advisor.get("advisor","")
                     advisor_affiliation = advisor.get('institution',"")
                     if advisor_name:
-                        advisorNameDict = cleanedName(advisor_name)
+                        advisorNameDict = mapping.cleanedName(advisor_name)
                         advidict = {"person_or_org":advisorNameDict,
                                 "role": {"id": "supervisor"}}
                         if advisor_affiliation:
@@ -303,7 +210,7 @@ def transform(entry):
     submitter_name = entry.get('submitter_name',"")
     if submitter_name:
         submitter_cleaned_name = re.sub(r'\([^)]*\)', '', submitter_name).strip()
-        submitterNameDict = cleanedName(submitter_cleaned_name)
+        submitterNameDict = mapping.cleanedName(submitter_cleaned_name)
         
     
     inveniodict["metadata"]["title"] = entry['title']
@@ -324,7 +231,7 @@ def transform(entry):
 
     lanl_number = entry.get("lanl_number", None)
     if lanl_number:
-        detected_schemes = idutils.detect_identifier_schemes(lanl_number)
+        detected_schemes = identifiers.detectSchemes(lanl_number)
         if detected_schemes:
             # If other schemas are present, add them to identifiers list
             other_schemas = [schema for schema in detected_schemes if schema != "url"]
@@ -359,8 +266,8 @@ def transform(entry):
         linkDict = getLinksDict(entry["links"])
         inveniodict["metadata"]["related_identifiers"]  += linkDict["related_identifiers"]
 
-    inveniodict["metadata"].update(getRightsDict())
-    inveniodict.update(getAccessDict())
+    inveniodict["metadata"].update(mapping.getRightsDict())
+    inveniodict.update(mapping.getAccessDict())
     inveniodict["communities"] =  {"ids": [COMMUNITYID]}
 
 
@@ -379,7 +286,7 @@ def transform(entry):
     doi_link = entry.get("doi_link", "")
     if doi_link:
         # check which schema it is from
-        detected_schemes = idutils.detect_identifier_schemes(doi_link)
+        detected_schemes = identifiers.detectSchemes(doi_link)
         if detected_schemes:
             # If other schemas are present, add them to identifiers list
             other_schemas = [schema for schema in detected_schemes if schema != "url"]
@@ -394,217 +301,112 @@ def transform(entry):
 
     return inveniodict
 
-def writeToFile(data, file= "defaultName"):
-    timestamp = datetime.now().strftime("%Y-%m-%d")
-    filename = f"{FAILED_DIR}/{file}_{timestamp}.json"
-    with open(filename, "w") as file:
-        json.dump(data, file)
-
-def uploadNew(invenioDict):
-    pubID = invenioDict["custom_fields"]["rdm:pubID"]
-    ifExistsUrl = f'{INVENIOHOST}/api/records?q=custom_fields.rdm\\:pubID:"{pubID}"&l=list&p=1&s=10&sort=bestmatch'
-    res = requests.get(ifExistsUrl, headers=h, verify=True)
-    if res.status_code == 200:
-        if res.json()['hits']['total'] != 0:
-            logger.info(f"Record with pubID {pubID} already exists")
-            return False
-        if res.json()['hits']['total'] == 0:
-            createURL = f"{INVENIOHOST}/api/records"
-            createRes = requests.post(createURL, data=json.dumps(invenioDict), headers=h,verify=True)
-            if createRes.status_code == 201:
-                record_id = createRes.json()['id']
-                reviewURL = f'{INVENIOHOST}/api/records/{record_id}/draft/review'
-                reviewData = {"receiver": { "community": COMMUNITYID},"type": "community-submission"}
-                reviewRes = requests.put(reviewURL, data=json.dumps(reviewData), headers=h,verify=True)
-                if reviewRes.status_code == 200:
-                    submitData =  {"payload": {"content": "Thank you in advance for the review.","format": "html"}}
-                    submitURL = reviewRes.json()['links']['actions']['submit']
-                    submitRes = requests.post(submitURL, data=json.dumps(submitData), headers=h,verify=True)
-                    if submitRes.status_code in [202, 200]:
-                            logger.info("success submit for review")
-                            acceptURL = submitRes.json()['links']['actions']['accept']
-                            acceptData = {"payload": {"content": "You are in!", "format": "html"}}
-                            acceptRes = requests.post(acceptURL, data=json.dumps(acceptData), headers=h,verify=True)
-                            if acceptRes.status_code in [202, 200]:
-                                logger.info("Whole upload, review, submit and accept OK")
-                            else:
-                                logger.info(acceptRes.status_code)
-                                logger.info(acceptRes.json())
-                                return False
-                    else:
-                        logger.error(submitRes.status_code)
-                        logger.error(submitRes.json())
-                        return False
-                else:
-                    logger.error(reviewRes.status_code)
-                    logger.error(reviewRes.json())
-                    return False
-            else:
-                logger.error(createRes.status_code)
-                logger.error(createRes.json())
-                writeToFile(invenioDict, file="failed_to_create_draft")
-                return False
-
-    return True
-
-
-def uploadModify(invenioDict):
-    pubID = invenioDict["custom_fields"]["rdm:pubID"]
-    ifExistsUrl = f'{INVENIOHOST}/api/records?q=custom_fields.rdm\\:pubID:"{pubID}"&l=list&p=1&s=10&sort=bestmatch'
-    res = requests.get(ifExistsUrl,headers=h,verify=True)
-    if res.status_code == 200:
-        if res.json()['hits']['total'] == 0:
-            logger.info(f"Record with pubID {pubID} does not exist")
-            logger.info("This should mean record is new")
-            logger.info("This should NOT happen but we will register it as new.")
-            uploadNew(invenioDict)
-            return True
-        if res.json()['hits']['total'] !=0:
-            recordID = res.json()['hits']['hits'][0]["id"]
-            createNewVersionURL = f'{INVENIOHOST}/api/records/{recordID}/versions'
-            newVersionRes = requests.post(createNewVersionURL,data={}, headers=h,verify=True)
-            new_data = newVersionRes.json()
-            new_data.update(invenioDict)
-            if newVersionRes.status_code in [200, 201]:
-                updatedraftRecordURL =  newVersionRes.json()['links']["self"] #f'{INVENIOHOST}/api/records/{recordID}/draft'
-                updatedraftRecord = requests.put(updatedraftRecordURL,data=json.dumps(new_data), headers=h,verify=True)
-                if updatedraftRecord.status_code == 200:
-                    logger.info("success update draft record")
-                    publishNewVersionURL =updatedraftRecord.json()['links']["publish"]  #f'{INVENIOHOST}/api/records/{recordID}/draft/actions/publish'
-                    publishNewVersionRes= requests.post(publishNewVersionURL,headers=h,verify=True)
-                    if publishNewVersionRes.status_code == 202:
-                        logger.info("success publish new version")
-                    else:
-                        logger.error("publish error")
-                        logger.error(publishNewVersionRes.status_code)
-                        logger.error(publishNewVersionRes.json())
-                        return False
-                else:
-                    logger.error("update draft")
-                    logger.error(updatedraftRecord.status_code)
-                    logger.error(updatedraftRecord.json())
-                    return False
-            else:
-                logger.error(newVersionRes.status_code)
-                logger.error(newVersionRes.json())
-                writeToFile(invenioDict, file="failed_to_create_new_version")
-                return False
-    else:
-        logger.error(res.status_code)
-        logger.error(res.json())
-        return False
-    return True
+class PubSource(syncsource.Source):
+    """Publications: the listing holds summaries, each publication JSON is fetched from its json_record_url."""
+    name = "pub"
+    logFile = f"{LOG_DIR}/pubdb_sync_logs_%Y-%m-%d.log"
+    description = "Sync publications from misportal to Invenio."
+    idField = "rdm:pubID"
+    entryIDField = "pub_id"
+    listingPath = "/sti/publications/search.json"
+    listingKeyField = "json_record_url"
+    submitDateField = "submit_date"
+    modifiedDateField = "modification_date"
+    valueParam = "pub_year"
+    valueFlag = "--pub-year"
+    fetchesRecords = True
+    fetchWorkers = FETCH_WORKERS
+    transformWorkers = TRANSFORM_WORKERS
+    unmappedKinds = ["pub division"]
+
+    def listingParams(self, submitAfter, submitBefore, modifiedAfter, modifiedBefore, value):
+        return {
+            'action': 'search',
+            'commit': 'Search',
+            'controller': 'publ_mains',
+            'json_download': 'true',
+            'search[abstract]': '',
+            'search[author_name]': '',
+            'search[department]': '',
+            'search[division]': '',
+            'search[document_number]': '',
+            'search[grp]': '',
+            'search[journal_id]': '',
+            'search[meeting_id]': '',
+            'search[proposal_num]': '',
+            'search[pub_type]': '',
+            'search[pub_year]': value,
+            'search[publ_author_ID]': '',
+            'search[publ_author_NAME]': '',
+            'search[publ_signer_ID]': '',
+            'search[publ_signer_NAME]': '',
+            'search[publ_submitter_ID]': '',
+            'search[publ_submitter_NAME]': '',
+            'search[published_only]': 'N',
+            'search[submit_date_after]':submitAfter,
+            'search[submit_date_before]':submitBefore,
+            'search[updated_date_after]':modifiedAfter,
+            'search[updated_date_before]':modifiedBefore,
+            'search[title]': '',
+            'utf8': '✓'
+        }
 
+    def fetchRecord(self, entry: dict) -> dict | None:
+        """
+        Fetches a single publication JSON from misportal, through httpcache.
+
+        Args:
+            entry (dict): The publication in the listing.
+
+        Returns:
+            dict | None: The publication JSON, or None if fetching failed.
+
+        Raises:
+            LookupError: If misportal does not have the publication (404 or 410).
+        """
+        # Loaded on first use, like the sessions of the source
+        import httpcache
+        import requests
+        URL = entry["json_record_url"]
+        try:
+            pubDBResEachJSON = httpcache.get(self.misportal, URL, entry["modification_date"])
+        except requests.RequestException as err:
+            logger.error(f"Failed to fetch {URL}: {err}")
+            return None
+        if pubDBResEachJSON.status_code in (404, 410):
+            raise LookupError(f"{URL} returned {pubDBResEachJSON.status_code}")
+        if pubDBResEachJSON.status_code != 200:
+            logger.error(f"Failed to fetch {URL}: {pubDBResEachJSON.status_code}")
+            return None
+        return pubDBResEachJSON.json()
+
+    def start(self):
+        identifiers.loadCache()
+
+    def finish(self):
+        import httpcache
+        identifiers.saveCache()
+        stats = identifiers.getStats()
+        logger.info(f"Identifier scheme cache: {stats['hits']} hits, {stats['misses']} misses, {stats['size']} entries")
+        stats = httpcache.getStats()
+        logger.info(f"Record response cache: {stats['hits']} hits, {stats['revalidated']} revalidated, "
+                    f"{stats['misses']} misses, {stats['evicted']} evicted")
+
+source = PubSource(logger, transform, COMMUNITYID, INVENIOHOST, TOKEN, FAILED_DIR, CHECKPOINT_DIR)
 
 def callPUBDB(action, submit_date_after = '',
               submit_date_before = '',
               modification_date_after = '',
               modification_date_before = '',
-              pub_year = ''):
-    isModify = False
-    isNew = False
-    if action == "new":
-        if not (submit_date_after and submit_date_before):
-            logger.error("submit_date_after is needed for action new")
-            return False
-        isNew = True
-    elif action == "modify":
-        if not (modification_date_after and modification_date_before):
-            logger.error("modification_date is needed for action modify")
-            return False
-        isModify = True
-    else:
-        logger.error(f"action {action} not recognized. Available action: new or modify")
-        return False
-
-    invenioDictList = []
-    newVersionInvenioDictList = []
-    pubDBURL = 'https://misportal.jlab.org/sti/publications/search.json'
-    pubDBParams = {
-        'action': 'search',
-        'commit': 'Search',
-        'controller': 'publ_mains',
-        'json_download': 'true',
-        'search[abstract]': '',
-        'search[author_name]': '',
-        'search[department]': '',
-        'search[division]': '',
-        'search[document_number]': '',
-        'search[grp]': '',
-        'search[journal_id]': '',
-        'search[meeting_id]': '',
-        'search[proposal_num]': '',
-        'search[pub_type]': '',
-        'search[pub_year]': pub_year,
-        'search[publ_author_ID]': '',
-        'search[publ_author_NAME]': '',
-        'search[publ_signer_ID]': '',
-        'search[publ_signer_NAME]': '',
-        'search[publ_submitter_ID]': '',
-        'search[publ_submitter_NAME]': '',
-        'search[published_only]': 'N',
-        'search[submit_date_after]':submit_date_after,
-        'search[submit_date_before]':submit_date_before,
-        'search[updated_date_after]':modification_date_after,
-        'search[updated_date_before]':modification_date_before,
-        'search[title]': '',
-        'utf8': '✓'
-    }
-    pubDBRes = requests.get(pubDBURL, params=pubDBParams)
-    jsonRecordURLList = []
-    newVersionJsonURLList = []
-    if pubDBRes.status_code == 200:
-        dataJSON = pubDBRes.json()
-        dataList = dataJSON["data"]
-        for  dat in dataList:
-            json_record_url = dat["json_record_url"]
-            modification_date   = dat["modification_date"]
-            submit_date = dat["submit_date"]
-            if isModify:
-                if submit_date == modification_date:
-                    logger.info("When modify is called and same submit and modify date,\
-                                 do nothing")
-                else:
-                    newVersionJsonURLList.append(json_record_url)
-            else:
-                jsonRecordURLList.append(json_record_url)
-    else:
-        logger.error(pubDBRes.status_code)
-        logger.error(pubDBRes.json())
-        return False
-
-    if newVersionJsonURLList:
-        for URL in newVersionJsonURLList:
-            pubDBResEachJSON = requests.get(URL)
-            if pubDBResEachJSON.status_code == 200:
-                dataJSON = pubDBResEachJSON.json()
-                invenioDict = transform(dataJSON)
-                newVersionInvenioDictList.append(invenioDict)
-
-    if jsonRecordURLList:
-        for URL in jsonRecordURLList:
-            pubDBResEachJSON = requests.get(URL)
-            if pubDBResEachJSON.status_code == 200:
-                dataJSON = pubDBResEachJSON.json()
-                invenioDict = transform(dataJSON)
-                invenioDictList.append(invenioDict)
-
-    if invenioDictList:
-        for invenioDict in invenioDictList:
-            uploadNew(invenioDict)
-
-    if newVersionInvenioDictList:
-        for invenioDict in newVersionInvenioDictList:
-            uploadModify(invenioDict)
-
-today = datetime.now()
-today_str = today.strftime("%m/%d/%Y")
-yesterday = datetime.now() - timedelta(days=1)
-yesterday_str = yesterday.strftime("%m/%d/%Y")
+              pub_year = '',
+              **kwargs):
+    import engine
+    return engine.sync(source, action, submit_date_after, submit_date_before, modification_date_after,
+                       modification_date_before, value=pub_year, **kwargs)
 
 def main():
-    callPUBDB("new", submit_date_after=yesterday_str, submit_date_before=today_str)
-    callPUBDB("modify", modification_date_after=yesterday_str, modification_date_before=today_str)
+    import engine
+    engine.main(source)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,287 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import zlib
+from datetime import datetime
+import requests
+import client
+
+logger = logging.getLogger(__name__)
+
+# Local index mapping source ids (rdm:pubID, pac:pacID) to Invenio records
+INDEX_FILE = "index/records.db"
+
+_connection = None
+_connectionLock = threading.Lock()
+
+def getConnection() -> sqlite3.Connection:
+    """
+    Returns the connection to the index, creating the schema on first use.
+
+    Returns:
+        sqlite3.Connection: The connection shared by all threads.
+    """
+    global _connection
+    if _connection is None:
+        _connection = sqlite3.connect(INDEX_FILE, check_same_thread=False)
+        _connection.execute("""
+            CREATE TABLE IF NOT EXISTS records (
+                source TEXT NOT NULL,
+                source_id TEXT NOT NULL,
+                record_id TEXT NOT NULL,
+                version INTEGER,
+                content_hash TEXT,
+                synced_at TEXT NOT NULL,
+                PRIMARY KEY (source, source_id)
+            )""")
+        _connection.execute("""
+            CREATE TABLE IF NOT EXISTS listed (
+                source TEXT NOT NULL,
+                entry_key TEXT NOT NULL,
+                modified TEXT NOT NULL,
+                PRIMARY KEY (source, entry_key)
+            )""")
+        # The last synced payload of each record, zlib-compressed canonical
+        # JSON, so dry runs can diff against it without asking Invenio
+        _connection.execute("""
+            CREATE TABLE IF NOT EXISTS payloads (
+                source TEXT NOT NULL,
+                source_id TEXT NOT NULL,
+                payload BLOB NOT NULL,
+                PRIMARY KEY (source, source_id)
+            )""")
+        _connection.execute("""
+            CREATE TABLE IF NOT EXISTS watermarks (
+                source TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )""")
+        _connection.commit()
+    return _connection
+
+def contentHash(invenioDict: dict) -> str:
+    """
+    Computes a canonical hash of a transformed record.
+
+    Args:
+        invenioDict (dict): The output of transform().
+
+    Returns:
+        str: The SHA-256 hex digest of the record serialized with sorted keys.
+    """
+    return hashlib.sha256(canonicalJSON(invenioDict)).hexdigest()
+
+def canonicalJSON(invenioDict: dict) -> bytes:
+    """
+    Serializes a record the way contentHash hashes it, with sorted keys and no whitespace.
+
+    Args:
+        invenioDict (dict): The transformed record.
+
+    Returns:
+        bytes: The UTF-8 encoded JSON.
+    """
+    return json.dumps(invenioDict, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+def getRecords(source: str, ids: list) -> dict[str, dict]:
+    """
+    Looks up many source ids in the index.
+
+    Args:
+        source (str): The sync the ids belong to, "pub" or "pac".
+        ids (list): The source ids to look up.
+
+    Returns:
+        dict: Maps str(id) to its row as a dict with record_id, version and
+            content_hash. Ids missing from the index are left out.
+    """
+    rows = {}
+    uniqueIDs = list(dict.fromkeys(str(sourceID) for sourceID in ids))
+    with _connectionLock:
+        connection = getConnection()
+        # Stay well below SQLite's limit on bound parameters
+        for start in range(0, len(uniqueIDs), 500):
+            batch = uniqueIDs[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            cursor = connection.execute(
+                f"SELECT source_id, record_id, version, content_hash FROM records "
+                f"WHERE source = ? AND source_id IN ({placeholders})", [source, *batch])
+            for sourceID, recordID, version, hashValue in cursor:
+                rows[sourceID] = {"record_id": recordID, "version": version, "content_hash": hashValue}
+    return rows
+
+def filterUnchanged(source: str, field: str, invenioDictList: list[dict]) -> tuple[list[dict], int]:
+    """
+    Drops the records whose payload is identical to the last synced one.
+
+    Args:
+        source (str): The sync the records belong to, "pub" or "pac".
+        field (str): The custom field holding the source id, e.g. "rdm:pubID".
+        invenioDictList (list): The transformed records.
+
+    Returns:
+        tuple: The records that changed, and the number of records dropped.
+    """
+    indexed = getRecords(source, [invenioDict["custom_fields"][field] for invenioDict in invenioDictList])
+    changed = []
+    for invenioDict in invenioDictList:
+        row = indexed.get(str(invenioDict["custom_fields"][field]))
+        if row and row["content_hash"] == contentHash(invenioDict):
+            continue
+        changed.append(invenioDict)
+    return changed, len(invenioDictList) - len(changed)
+
+def updateRecord(source: str, sourceID, recordID: str, version: int | None = None,
+                 invenioDict: dict | None = None):
+    """
+    Records a successful create or publish in the index.
+
+    Args:
+        source (str): The sync the record belongs to, "pub" or "pac".
+        sourceID: The rdm:pubID or pac:pacID of the record.
+        recordID (str): The id of the latest published version in Invenio.
+        version (int, optional): The version index of that record.
+        invenioDict (dict, optional): The payload that was synced; its
+            contentHash is stored alongside.
+    """
+    canonical = canonicalJSON(invenioDict) if invenioDict is not None else None
+    hashValue = hashlib.sha256(canonical).hexdigest() if canonical is not None else None
+    with _connectionLock:
+        connection = getConnection()
+        connection.execute(
+            "INSERT OR REPLACE INTO records (source, source_id, record_id, version, content_hash, synced_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (source, str(sourceID), recordID, version, hashValue, datetime.now().isoformat()))
+        if canonical is not None:
+            connection.execute("INSERT OR REPLACE INTO payloads (source, source_id, payload) VALUES (?, ?, ?)",
+                               (source, str(sourceID), zlib.compress(canonical)))
+        connection.commit()
+
+def getPayloads(source: str, ids: list) -> dict[str, dict]:
+    """
+    Returns the last synced payloads of many source ids.
+
+    Args:
+        source (str): The sync the ids belong to, "pub" or "pac".
+        ids (list): The source ids to look up.
+
+    Returns:
+        dict: Maps str(id) to its last synced payload. Ids synced before
+            payloads were kept are left out.
+    """
+    payloads = {}
+    uniqueIDs = list(dict.fromkeys(str(sourceID) for sourceID in ids))
+    with _connectionLock:
+        connection = getConnection()
+        for start in range(0, len(uniqueIDs), 500):
+            batch = uniqueIDs[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            payloads.update(connection.execute(
+                f"SELECT source_id, payload FROM payloads WHERE source = ? AND source_id IN ({placeholders})",
+                [source, *batch]))
+    return {sourceID: json.loads(zlib.decompress(payload)) for sourceID, payload in payloads.items()}
+
+def isListed(source: str, key: str, modified: str) -> bool:
+    """
+    Checks whether a listing entry was already synced in its current state.
+
+    Args:
+        source (str): The sync the entry belongs to, "pub" or "pac".
+        key (str): What identifies the entry in the listing, e.g. its json_record_url.
+        modified (str): The modification date of the entry in the listing.
+
+    Returns:
+        bool: Whether a completed pass already listed the entry with this modification date.
+    """
+    with _connectionLock:
+        row = getConnection().execute(
+            "SELECT modified FROM listed WHERE source = ? AND entry_key = ?", (source, str(key))).fetchone()
+    return row is not None and row[0] == str(modified)
+
+def markListed(source: str, entries: list[tuple]):
+    """
+    Records the listing entries a pass synced or found unchanged.
+
+    Args:
+        source (str): The sync the entries belong to, "pub" or "pac".
+        entries (list[tuple]): (key, modified) of each entry.
+    """
+    with _connectionLock:
+        connection = getConnection()
+        connection.executemany(
+            "INSERT OR REPLACE INTO listed (source, entry_key, modified) VALUES (?, ?, ?)",
+            [(source, str(key), str(modified)) for key, modified in entries])
+        connection.commit()
+
+def getWatermark(source: str) -> str | None:
+    """
+    Returns the day up to which a source was completely synced.
+
+    Args:
+        source (str): "pub" or "pac".
+
+    Returns:
+        str | None: The day as YYYY-MM-DD, or None before the first sync.
+    """
+    with _connectionLock:
+        row = getConnection().execute("SELECT value FROM watermarks WHERE source = ?", (source,)).fetchone()
+    return row[0] if row else None
+
+def setWatermark(source: str, value: str):
+    """
+    Moves the watermark of a source forward. An older day is ignored, so a
+    backfill of past windows never moves it back.
+
+    Args:
+        source (str): "pub" or "pac".
+        value (str): The day as YYYY-MM-DD.
+    """
+    with _connectionLock:
+        connection = getConnection()
+        connection.execute(
+            "INSERT INTO watermarks (source, value) VALUES (?, ?) "
+            "ON CONFLICT (source) DO UPDATE SET value = max(value, excluded.value)", (source, value))
+        connection.commit()
+
+def reconcile(source: str, field: str, session: requests.Session, host: str) -> int:
+    """
+    Rebuilds the index of a source from the records currently in Invenio.
+
+    Content hashes are kept for records whose latest version did not change,
+    since they cannot be recomputed from the Invenio side.
+
+    Args:
+        source (str): The sync to rebuild, "pub" or "pac".
+        field (str): The custom field holding the source id, e.g. "rdm:pubID".
+        session (requests.Session): The Invenio session.
+        host (str): The base URL of the Invenio instance.
+
+    Returns:
+        int: The number of records in the rebuilt index.
+
+    Raises:
+        requests.RequestException: If the records could not be listed; the
+            index is then left untouched.
+        ValueError: If a page of the search is not JSON.
+    """
+    escapedField = field.replace(":", "\\:")
+    latest = {}
+    for hit in client.searchAllRecords(session, host, f"_exists_:custom_fields.{escapedField}"):
+        sourceID = str(hit["custom_fields"][field])
+        latest.setdefault(sourceID, (hit["id"], hit.get("versions", {}).get("index")))
+
+    now = datetime.now().isoformat()
+    with _connectionLock:
+        connection = getConnection()
+        hashes = dict(connection.execute(
+            "SELECT source_id || ' ' || record_id, content_hash FROM records WHERE source = ?", (source,)))
+        connection.execute("DELETE FROM records WHERE source = ?", (source,))
+        connection.executemany(
+            "INSERT INTO records (source, source_id, record_id, version, content_hash, synced_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [(source, sourceID, recordID, version, hashes.get(f"{sourceID} {recordID}"), now)
+             for sourceID, (recordID, version) in latest.items()])
+        connection.commit()
+    logger.info(f"Reconciled {len(latest)} {source} records from Invenio")
+    return len(latest)
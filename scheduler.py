@@ -0,0 +1,134 @@
+import argparse
+import importlib
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+import checkpoint
+import client
+import engine
+import shards
+
+logger = logging.getLogger(__name__)
+
+LOG_DIR = "logs"
+# Modules of the syncs the scheduler runs, each defining a module-level engine.Source named source
+SOURCES = ["pub", "pac"]
+# Seconds between the starts of two scheduled runs
+SCHEDULE_INTERVAL = 24 * 60 * 60
+# Worker counts of each source, passed on to engine.runJournal. They budget
+# how much of the shared misportal and Invenio limits each source may take,
+# and transformProcesses how many CPUs its transforms may take.
+SOURCE_BUDGETS = {
+    "pub": {"workers": 8, "transformWorkers": 2, "uploadWorkers": 8},
+    "pac": {"transformWorkers": 2, "uploadWorkers": 4},
+}
+# Requests to Invenio in flight at the same time, all sources together
+INVENIO_MAX_CONCURRENCY = client.INVENIO_POOL_MAXSIZE
+# Owner of the journals the scheduler starts, so it never resumes a run of the command line
+JOURNAL_OWNER = "scheduler"
+# Times a run is resumed before it is abandoned for a new incremental sync
+MAX_RESUME_ATTEMPTS = 3
+
+def syncSource(source: engine.Source, budget: dict) -> bool:
+    """
+    Runs an incremental sync of one source.
+
+    If the last scheduled run of the source was interrupted or left records
+    partway through their chain, it is continued instead of starting a new
+    one. A run still failing after MAX_RESUME_ATTEMPTS resumes is abandoned,
+    so a record that can never sync does not hold back every later run; the
+    new run lists again from the watermark, which the abandoned run never
+    advanced. Backfills and syncs started from the command line are left to
+    their --resume.
+
+    Args:
+        source (engine.Source): The source to sync.
+        budget (dict): The worker counts of the source.
+
+    Returns:
+        bool: Whether every pass is done.
+    """
+    pruned = checkpoint.pruneJournals(source.checkpointDir)
+    if pruned:
+        logger.info(f"Pruned {pruned} completed {source.name} journals")
+    journal = checkpoint.resumeJournal(source.checkpointDir, JOURNAL_OWNER)
+    if journal is not None and journal.resumes >= MAX_RESUME_ATTEMPTS:
+        logger.error(f"Abandoning {source.name} sync {journal.path} after {journal.resumes} resumes, "
+                     f"{len(journal.stranded())} records left stranded")
+        journal.abandon()
+        journal = None
+    if journal is None:
+        journal = checkpoint.newJournal(source.checkpointDir, shards.incrementalPasses(source.name), JOURNAL_OWNER)
+    else:
+        journal.markResumed()
+        logger.info(f"Resuming {source.name} sync from {journal.path}, attempt {journal.resumes}")
+    started = time.monotonic()
+    try:
+        done = engine.runJournal(source, journal, **budget)
+    except Exception as err:
+        logger.exception(f"{source.name} sync failed: {err}")
+        done = False
+    logger.info(f"{source.name} sync {'done' if done else 'FAILED'} in {time.monotonic() - started:.1f}s")
+    return done
+
+def runOnce(sources: list[engine.Source], budgets: dict[str, dict] = SOURCE_BUDGETS) -> bool:
+    """
+    Syncs every source at the same time, on one thread each.
+
+    The sources share the connection pools and host limits of client and the
+    upload slots of pipeline, so the run takes about as long as the longest
+    sync while Invenio never sees more than its configured load.
+
+    Args:
+        sources (list[engine.Source]): The sources to sync.
+        budgets (dict): Maps the name of a source to its worker counts.
+
+    Returns:
+        bool: Whether every source synced.
+    """
+    with ThreadPoolExecutor(max_workers=len(sources), thread_name_prefix="sync") as executor:
+        results = list(executor.map(lambda source: syncSource(source, budgets.get(source.name, {})), sources))
+    return all(results)
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync publications and PAC proposals to Invenio, side by side, on a schedule.")
+    parser.add_argument("--sources", nargs="+", choices=SOURCES, default=SOURCES,
+                        help="the syncs to run")
+    parser.add_argument("--interval", type=float, default=SCHEDULE_INTERVAL,
+                        help="seconds between the starts of two runs")
+    parser.add_argument("--once", action="store_true",
+                        help="run every sync once and exit")
+    parser.add_argument("--invenio-concurrency", type=int, default=INVENIO_MAX_CONCURRENCY,
+                        help="requests to Invenio in flight at the same time, all syncs together")
+    parser.add_argument("--invenio-rate", type=float, default=client.INVENIO_RATE_LIMIT,
+                        help="requests per second to Invenio, all syncs together")
+    parser.add_argument("--transform-processes", type=int,
+                        help="transform on this many worker processes per sync instead of threads")
+    args = parser.parse_args()
+    # The modules the syncs share log to the file of the scheduler only
+    engine.setupLogging(logger, f"{LOG_DIR}/scheduler_logs_%Y-%m-%d.log")
+
+    sources = [importlib.import_module(name).source for name in args.sources]
+    for source in sources:
+        engine.setupLogging(source.logger, source.logFile, modules=False)
+    for invenioHost in {source.invenioHost for source in sources}:
+        client.setHostLimits(invenioHost, args.invenio_rate, args.invenio_concurrency)
+    budgets = SOURCE_BUDGETS
+    if args.transform_processes is not None:
+        budgets = {name: {**SOURCE_BUDGETS.get(name, {}), "transformProcesses": args.transform_processes}
+                   for name in args.sources}
+    while True:
+        started = time.monotonic()
+        logger.info(f"Starting a run of {', '.join(args.sources)}")
+        runOnce(sources, budgets)
+        if args.once:
+            return
+        wait = started + args.interval - time.monotonic()
+        if wait <= 0:
+            logger.warning(f"The run took longer than the {args.interval:.0f}s interval, starting the next one now")
+            continue
+        logger.info(f"Next run in {wait:.0f}s")
+        time.sleep(wait)
+
+if __name__ == "__main__":
+    main()
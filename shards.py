@@ -0,0 +1,161 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+import recordindex
+
+logger = logging.getLogger(__name__)
+
+# Days covered by one shard of a backfill
+BACKFILL_WINDOW_DAYS = 30
+# Number of shards of a backfill synced at the same time. Uploads of all
+# shards together are further capped by pipeline.MAX_CONCURRENT_UPLOADS and
+# requests by the per-host limits in client.
+BACKFILL_SHARDS = 4
+# Days before the watermark that an incremental sync lists again, so that
+# records modified while the previous run was listing are not missed
+SYNC_OVERLAP_DAYS = 1
+# Date format of the misportal search parameters
+DATE_FORMAT = "%m/%d/%Y"
+
+def dateWindows(start: date, end: date, days: int = BACKFILL_WINDOW_DAYS) -> list[tuple[str, str]]:
+    """
+    Splits a date range into consecutive windows.
+
+    Consecutive windows share their boundary day, like two nightly syncs do,
+    so no record falls between two windows.
+
+    Args:
+        start (date): The first day of the range.
+        end (date): The last day of the range.
+        days (int): The number of days of each window.
+
+    Returns:
+        list[tuple]: The (after, before) dates of each window, as misportal
+            search parameters.
+    """
+    windows = []
+    while True:
+        stop = min(start + timedelta(days=days), end)
+        windows.append((start.strftime(DATE_FORMAT), stop.strftime(DATE_FORMAT)))
+        if stop >= end:
+            return windows
+        start = stop
+
+def backfillPasses(action: str, start: date | None = None, end: date | None = None,
+                   days: int = BACKFILL_WINDOW_DAYS, valueParam: str = "", values: list | None = None) -> list[dict]:
+    """
+    Builds the passes of a backfill, one per date window or per value.
+
+    Args:
+        action (str): "new" shards on the submit date, "modify" on the
+            modification date and "sync" on both.
+        start (date, optional): The first day of the backfill.
+        end (date, optional): The last day of the backfill.
+        days (int): The number of days of each window.
+        valueParam (str): The search parameter sharded on instead of the
+            date, e.g. "pub_year" or "pac_number".
+        values (list, optional): The values of valueParam, one pass each.
+
+    Returns:
+        list[dict]: The keyword arguments of each pass.
+    """
+    if values:
+        return [{"action": action, valueParam: str(value)} for value in values]
+    prefixes = {"new": ["submit_date"], "modify": ["modification_date"],
+                "sync": ["submit_date", "modification_date"]}[action]
+    return [{"action": action, **{f"{prefix}_{bound}": value for prefix in prefixes
+                                  for bound, value in (("after", after), ("before", before))}}
+            for after, before in dateWindows(start, end, days)]
+
+def incrementalPasses(source: str, today: date | None = None) -> list[dict]:
+    """
+    Builds the sync pass of an incremental sync.
+
+    The passes list everything from the watermark of the source, less
+    SYNC_OVERLAP_DAYS, up to today. Before the first sync they cover the
+    last day. Entries listed again by the overlap are skipped through
+    recordindex.isListed.
+
+    Args:
+        source (str): "pub" or "pac".
+        today (date, optional): The last day to sync. Defaults to today.
+
+    Returns:
+        list[dict]: The keyword arguments of the pass, which lists both the
+            records submitted and the records modified in the window.
+    """
+    today = today or date.today()
+    watermark = recordindex.getWatermark(source)
+    if watermark:
+        start = date.fromisoformat(watermark) - timedelta(days=SYNC_OVERLAP_DAYS)
+    else:
+        start = today - timedelta(days=1)
+    after, before = start.strftime(DATE_FORMAT), today.strftime(DATE_FORMAT)
+    return [{"action": "sync", "submit_date_after": after, "submit_date_before": before,
+             "modification_date_after": after, "modification_date_before": before}]
+
+def advanceWatermark(source: str, passes: list[dict]):
+    """
+    Moves the watermark of a source to the last day covered by completed passes.
+
+    Args:
+        source (str): "pub" or "pac".
+        passes (list[dict]): The passes, all done.
+    """
+    days = [datetime.strptime(kwargs[param], DATE_FORMAT).date() for kwargs in passes
+            for param in ("submit_date_before", "modification_date_before") if kwargs.get(param)]
+    if days:
+        recordindex.setWatermark(source, max(days).isoformat())
+        logger.info(f"{source} synced up to {max(days).isoformat()}")
+
+def runPasses(call, journal, workers: int = 1) -> bool:
+    """
+    Runs the passes of a journal that are not done yet.
+
+    Passes run workers at a time. A pass that fails, by returning False or
+    raising, is logged and left undone for --resume, without stopping the
+    others. The journal is finished once every pass is done.
+
+    Args:
+        call (callable): Runs one pass, e.g. engine.runPass bound to a source, or callPUBDB.
+        journal (checkpoint.Journal): The journal holding the passes.
+        workers (int): The number of passes run at the same time. Passes
+            whose order matters, like a "new" pass followed by a "modify"
+            pass over the same window, need 1.
+
+    Returns:
+        bool: Whether every pass is done.
+    """
+    pending = [index for index in range(len(journal.passes)) if not journal.isPassDone(index)]
+    failed = []
+    finished = 0
+    lock = threading.Lock()
+
+    def runPass(index):
+        nonlocal finished
+        kwargs = journal.passes[index]
+        started = time.monotonic()
+        try:
+            ok = call(**kwargs, journal=journal) is not False
+        except Exception as err:
+            logger.exception(f"Pass {kwargs} failed: {err}")
+            ok = False
+        if ok:
+            journal.passDone(index)
+        with lock:
+            finished += 1
+            if not ok:
+                failed.append(index)
+            logger.info(f"Pass {finished}/{len(pending)} {kwargs} {'done' if ok else 'FAILED'} "
+                        f"in {time.monotonic() - started:.1f}s")
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        list(executor.map(runPass, pending))
+    if failed:
+        logger.error(f"{len(failed)} of {len(pending)} passes failed, rerun with --resume: "
+                     f"{[journal.passes[index] for index in sorted(failed)]}")
+        return False
+    journal.finish()
+    return True
@@ -0,0 +1,149 @@
+import logging
+import threading
+
+class Source:
+    """
+    A misportal collection synced to Invenio: the plugin interface of engine.
+
+    The engine lists what was submitted or modified in a window, fetches and
+    transforms each record, then creates it or gives it a new version in
+    Invenio. A source tells it how: subclasses set the class attributes and
+    implement listingParams, and fetchRecord when the listing only holds
+    summaries of the records.
+
+    Args:
+        logger (logging.Logger): The logger of the sync.
+        transform (callable): Turns a misportal record into an Invenio
+            record. It must be a module-level function, since it is pickled
+            when transforms run on a process pool.
+        communityID (str): The Invenio community the records are submitted to.
+        invenioHost (str): The base URL of Invenio.
+        token (str): The Invenio API token.
+        failedDir (str): Where records that failed to upload are written.
+        checkpointDir (str): Where the journals of the sync are kept.
+    """
+    # Labels the index, watermark, metrics and log lines of the source
+    name = ""
+    description = ""
+    # Log file of the sync, a strftime pattern
+    logFile = ""
+    # Invenio custom field holding the misportal id of a record
+    idField = ""
+    # Field of a misportal record holding its id
+    entryIDField = ""
+    # misportal path of the listing, relative to client.MISPORTALHOST
+    listingPath = ""
+    # Fields of a listing entry: its key, submit date and modification date
+    listingKeyField = ""
+    submitDateField = ""
+    modifiedDateField = ""
+    # Listing parameter a backfill can shard on instead of dates, and its command line flag
+    valueParam = ""
+    valueFlag = ""
+    # Whether the listing only holds summaries, whose records fetchRecord gets
+    fetchesRecords = False
+    # Number of records fetched and transformed in parallel
+    fetchWorkers = 0
+    transformWorkers = 2
+    # Kinds of mapping.countUnmapped reported after a run
+    unmappedKinds = []
+    # Files in failedDir of the records that failed to be created or versioned,
+    # and of those skipped as misportal has them: missing or failing their transform
+    createFailedFile = "failed_to_create_draft"
+    versionFailedFile = "failed_to_create_new_version"
+    fetchFailedFile = "failed_to_fetch"
+    transformFailedFile = "failed_to_transform"
+
+    def __init__(self, logger: logging.Logger, transform, communityID: str, invenioHost: str, token: str,
+                 failedDir: str, checkpointDir: str):
+        self.logger = logger
+        self.transform = transform
+        self.communityID = communityID
+        self.invenioHost = invenioHost
+        self.failedDir = failedDir
+        self.checkpointDir = checkpointDir
+        self.headers = {
+            "Accept": "application/json",
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {token}"
+        }
+        self.writeLock = threading.Lock()
+        self._invenio = None
+        self._misportal = None
+        self._misportalListings = None
+
+    # The sessions are created on first use, so importing a source, e.g. to
+    # reuse its transform, does not load requests
+
+    @property
+    def invenio(self):
+        if self._invenio is None:
+            import client
+            self._invenio = client.getSession(self.invenioHost, self.headers)
+        return self._invenio
+
+    @invenio.setter
+    def invenio(self, session):
+        self._invenio = session
+
+    @property
+    def misportal(self):
+        if self._misportal is None:
+            import client
+            self._misportal = client.getSession(client.MISPORTALHOST)
+        return self._misportal
+
+    @misportal.setter
+    def misportal(self, session):
+        self._misportal = session
+
+    @property
+    def misportalListings(self):
+        # Listings are streamed, and kept off the pool of the record fetches
+        if self._misportalListings is None:
+            import client
+            self._misportalListings = client.getListingSession(client.MISPORTALHOST)
+        return self._misportalListings
+
+    @misportalListings.setter
+    def misportalListings(self, session):
+        self._misportalListings = session
+
+    def listingParams(self, submitAfter: str, submitBefore: str, modifiedAfter: str, modifiedBefore: str,
+                      value: str) -> dict:
+        """
+        Returns the query parameters of a listing.
+
+        Args:
+            submitAfter (str): First submit date, MM/DD/YYYY, or "".
+            submitBefore (str): Last submit date, or "".
+            modifiedAfter (str): First modification date, or "".
+            modifiedBefore (str): Last modification date, or "".
+            value (str): The valueParam the listing is restricted to, or "".
+
+        Returns:
+            dict: The parameters of the listing request.
+        """
+        raise NotImplementedError
+
+    def fetchRecord(self, entry: dict) -> dict | None:
+        """
+        Fetches the full record of a listing entry, with fetchesRecords set.
+
+        Args:
+            entry (dict): The entry from the listing.
+
+        Returns:
+            dict | None: The record, or None if fetching failed and may succeed later.
+
+        Raises:
+            LookupError: If misportal does not have the record, so fetching it
+                again cannot succeed.
+        """
+        return entry
+
+    def start(self):
+        """Called before the passes of a run, e.g. to load caches."""
+
+    def finish(self):
+        """Called after the passes of a run, e.g. to save caches and log their stats."""
@@ -0,0 +1,59 @@
+import os
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "benchmarks")]
+
+import mockservers
+import scratch
+
+# Number of records of the mock corpus
+RECORDS = 5
+# Window listing the whole mock corpus
+WINDOW = mockservers.WINDOW
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """
+    Moves into tmp_path, holding the directories the syncs write to, with a
+    fresh record index and response cache.
+
+    Returns:
+        pathlib.Path: The directory.
+    """
+    monkeypatch.chdir(tmp_path)
+    for directory in scratch.SYNC_DIRECTORIES:
+        os.makedirs(directory)
+    import httpcache
+    import recordindex
+    monkeypatch.setattr(recordindex, "_connection", None)
+    monkeypatch.setattr(httpcache, "_connection", None)
+    monkeypatch.setattr(httpcache, "_cachedBytes", 0)
+    monkeypatch.setattr(httpcache, "_stats", httpcache.Counter())
+    return tmp_path
+
+@pytest.fixture
+def servers(workdir, monkeypatch):
+    """
+    Starts a mock misportal and a mock Invenio and points the sync modules at them.
+
+    The syncs run in workdir, with fresh sessions.
+
+    Returns:
+        tuple: The misportal and the Invenio MockServer.
+    """
+    misportal = mockservers.MockServer(RECORDS).start()
+    invenio = mockservers.MockServer(RECORDS).start()
+
+    import client
+    import pac
+    import pub
+    monkeypatch.setattr(client, "MISPORTALHOST", misportal.url)
+    for module in (pub, pac):
+        monkeypatch.setattr(module.source, "invenioHost", invenio.url)
+        for attribute in ("_invenio", "_misportal", "_misportalListings"):
+            monkeypatch.setattr(module.source, attribute, None)
+    yield misportal, invenio
+    for server in (misportal, invenio):
+        server.stop()
@@ -0,0 +1,44 @@
+import gzip
+from datetime import date
+import archive
+import dryrun
+import pub
+import shards
+from conftest import RECORDS, WINDOW
+
+def test_request_keys_sort_the_query_and_drop_the_host():
+    assert archive.requestKey("https://a.invalid/sti/search.json?b=2&a=1") == "/sti/search.json?a=1&b=2"
+    assert archive.requestKey("http://b.invalid/sti/1.json") == "/sti/1.json"
+
+def test_replayed_dry_run_matches_the_captured_one(servers, tmp_path):
+    misportal, _ = servers
+    path = str(tmp_path / "archives" / "pub.jsonl.gz")
+    passes = shards.backfillPasses("new", date(1990, 1, 1), date(2099, 12, 31), days=100000)
+    with archive.capturing(pub.source, path) as writer:
+        captured = dryrun.dryRun(pub.source, passes, str(tmp_path / "captured.jsonl"), transformProcesses=1)
+    assert writer.count > RECORDS
+    misportal.stop()
+
+    with archive.replaying(pub.source, path) as adapter:
+        replayed = dryrun.dryRun(pub.source, passes, str(tmp_path / "replayed.jsonl"), transformProcesses=1)
+    assert adapter.missing == 0
+    assert replayed["listed"] == captured["listed"] == RECORDS
+    assert replayed == captured
+
+def test_truncated_archives_replay_what_was_read(tmp_path):
+    path = str(tmp_path / "pub.jsonl.gz")
+    writer = archive.ArchiveWriter(path)
+    writer.write("https://a.invalid/sti/1.json", 200, {"ETag": '"x"'}, b"{}")
+    writer.writePasses([WINDOW])
+    writer.close()
+    with gzip.open(path, "at", encoding="utf-8") as file:
+        file.write('{"key": "/sti/2.json", "sta')
+    with open(path, "rb") as file:
+        data = file.read()
+    with open(path, "wb") as file:
+        file.write(data[:-6])
+
+    responses, passes = archive.readArchive(path)
+    assert list(responses) == ["/sti/1.json"]
+    assert responses["/sti/1.json"][:2] == (200, {"ETag": '"x"'})
+    assert passes == [WINDOW]
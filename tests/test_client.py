@@ -0,0 +1,40 @@
+import threading
+import time
+import client
+
+def throttle(limiter: client.HostLimiter, times: int):
+    for _ in range(times):
+        limiter.acquire()
+        limiter.release(throttled=True)
+
+def test_limiter_still_sends_below_one_request_per_second(monkeypatch):
+    monkeypatch.setattr(client, "ADAPTIVE_LIMITS", True)
+    limiter = client.HostLimiter(10.0, 4)
+    throttle(limiter, 4)
+    assert limiter.rate == 0.625 and limiter.concurrency == 1
+    acquired = threading.Event()
+    thread = threading.Thread(target=lambda: limiter.acquire() or acquired.set(), daemon=True)
+    thread.start()
+    # The bucket refills one token in 1 / 0.625 = 1.6s
+    assert acquired.wait(3)
+    limiter.release()
+
+def test_limiter_floors_at_the_minimum_rate_and_recovers(monkeypatch):
+    monkeypatch.setattr(client, "ADAPTIVE_LIMITS", True)
+    monkeypatch.setattr(client, "RATE_RECOVERY", 0.5)
+    limiter = client.HostLimiter(1000.0, 8)
+    throttle(limiter, 12)
+    assert limiter.rate == client.MIN_RATE_LIMIT and limiter.concurrency == 1
+    for _ in range(40):
+        limiter.acquire()
+        limiter.release()
+    assert limiter.rate == limiter.maxRate
+    assert limiter.concurrency == limiter.maxConcurrency
+
+def test_set_host_limits_below_one_request_per_second():
+    client.setHostLimits("http://limited.invalid", rate=0.5)
+    limiter = client._limiters["http://limited.invalid"]
+    started = time.monotonic()
+    limiter.acquire()
+    limiter.release()
+    assert time.monotonic() - started < 2.5
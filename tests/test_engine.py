@@ -0,0 +1,83 @@
+import glob
+import itertools
+from conftest import RECORDS
+import checkpoint
+import client
+import engine
+import pipeline
+import pub
+import recordindex
+import shards
+
+def test_journal_passes_share_one_transform_pool(servers, monkeypatch):
+    _, invenio = servers
+    pools = []
+    processPool = pipeline.processPool
+    monkeypatch.setattr(pipeline, "processPool", lambda processes: pools.append(processes) or processPool(processes))
+    journal = checkpoint.Journal(passes=[
+        {"action": "new", "submit_date_after": "01/01/1990", "submit_date_before": "12/31/2099"},
+        {"action": "new", "submit_date_after": "01/01/1980", "submit_date_before": "12/31/1989"},
+    ])
+    assert engine.runJournal(pub.source, journal, shardWorkers=2, advance=False, transformProcesses=2)
+    assert pools == [2]
+    assert len(invenio.records) == RECORDS
+
+def test_callPACDB_takes_the_window_positionally_and_keeps_its_failure_files(servers):
+    _, invenio = servers
+    import pac
+    invenio.failures["create"] = 500
+    assert pac.callPACDB("new", "01/01/1990", "12/31/2099") is False
+    assert glob.glob(f"{pac.source.failedDir}/PAC_failed_to_create_record_*.json")
+    invenio.failures.clear()
+    assert pac.callPACDB("new", "01/01/1990", "12/31/2099")
+    assert len(invenio.records) == RECORDS
+
+def test_sync_fails_when_the_listing_breaks_off(servers, monkeypatch):
+    _, invenio = servers
+    iterData = client.iterData
+
+    def truncated(res):
+        yield from itertools.islice(iterData(res), 2)
+        raise ValueError("incomplete JSON")
+    monkeypatch.setattr(client, "iterData", truncated)
+    journal = checkpoint.Journal(passes=[{"action": "new", "submit_date_after": "01/01/1990",
+                                          "submit_date_before": "12/31/2099"}])
+    assert engine.runJournal(pub.source, journal) is False
+    assert len(invenio.records) == 2
+    assert recordindex.getWatermark("pub") is None
+
+def test_records_misportal_does_not_have_are_skipped_without_holding_the_watermark(servers):
+    misportal, invenio = servers
+    misportal.failures["pubRecord"] = 404
+    journal = checkpoint.Journal(passes=[{"action": "new", "submit_date_after": "01/01/1990",
+                                          "submit_date_before": "12/31/2099"}])
+    assert engine.runJournal(pub.source, journal)
+    assert recordindex.getWatermark("pub") == "2099-12-31"
+    [path] = glob.glob(f"{pub.source.failedDir}/{pub.source.fetchFailedFile}_*.jsonl")
+    with open(path) as file:
+        assert len(file.readlines()) == RECORDS
+    assert not invenio.records
+
+def test_records_failing_their_transform_are_skipped(servers, monkeypatch):
+    _, invenio = servers
+    transform = pub.source.transform
+
+    def failing(entry):
+        if str(entry["pub_id"]) == "2":
+            raise KeyError("title")
+        return transform(entry)
+    monkeypatch.setattr(pub.source, "transform", failing)
+    journal = checkpoint.Journal(passes=[{"action": "new", "submit_date_after": "01/01/1990",
+                                          "submit_date_before": "12/31/2099"}])
+    assert engine.runJournal(pub.source, journal)
+    assert len(invenio.records) == RECORDS - 1
+    assert glob.glob(f"{pub.source.failedDir}/{pub.source.transformFailedFile}_*.jsonl")
+
+def test_modify_backfill_sharded_on_values(servers):
+    misportal, invenio = servers
+    assert engine.runJournal(pub.source, checkpoint.Journal(passes=shards.backfillPasses(
+        "new", valueParam="pub_year", values=[2020])), advance=False)
+    misportal.revise()
+    assert engine.runJournal(pub.source, checkpoint.Journal(passes=shards.backfillPasses(
+        "modify", valueParam="pub_year", values=[2020])), advance=False)
+    assert all(record["versions"]["index"] == 2 for record in invenio.records.values())
@@ -0,0 +1,56 @@
+import requests
+import httpcache
+
+URL = "https://misportal.invalid/sti/publications/1.json"
+
+class Session:
+    """Answers every GET with the next of responses, recording the headers sent."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.sent = []
+
+    def get(self, url, headers=None, **kwargs):
+        self.sent.append(headers or {})
+        return self.responses.pop(0)
+
+def response(status: int, body: bytes = b"", headers: dict | None = None) -> requests.Response:
+    res = requests.Response()
+    res.status_code = status
+    res._content = body
+    res.headers.update(headers or {})
+    return res
+
+def test_unchanged_records_are_served_from_the_cache(workdir):
+    session = Session(response(200, b'{"v": 1}'), response(200, b'{"v": 2}'))
+    assert httpcache.get(session, URL, "2024-01-01").json() == {"v": 1}
+    assert httpcache.get(session, URL, "2024-01-01").json() == {"v": 1}
+    assert len(session.sent) == 1
+    assert httpcache.get(session, URL, "2024-02-01").json() == {"v": 2}
+    assert httpcache.getStats() == {"hits": 1, "revalidated": 0, "misses": 2, "evicted": 0}
+
+def test_responses_with_an_etag_are_revalidated(workdir):
+    session = Session(response(200, b'{"v": 1}', {"ETag": '"abc"'}), response(304))
+    httpcache.get(session, URL, "2024-01-01")
+    assert httpcache.get(session, URL, "2024-01-01").json() == {"v": 1}
+    assert session.sent[1] == {"If-None-Match": '"abc"'}
+    assert httpcache.getStats()["revalidated"] == 1
+
+def test_failed_responses_are_not_cached(workdir):
+    session = Session(response(503), response(200, b'{"v": 1}'))
+    assert httpcache.get(session, URL, "2024-01-01").status_code == 503
+    assert httpcache.get(session, URL, "2024-01-01").json() == {"v": 1}
+
+def test_least_recently_used_responses_are_evicted(workdir, monkeypatch):
+    monkeypatch.setattr(httpcache, "CACHE_MAX_BYTES", 10)
+    session = Session(*(response(200, b'{"v": 12345}') for _ in range(3)))
+    for recordID in range(3):
+        httpcache.get(session, f"{URL}?id={recordID}", "2024-01-01")
+    assert httpcache.getStats()["evicted"] >= 2
+
+def test_disabled_cache_sends_every_request(workdir, monkeypatch):
+    monkeypatch.setattr(httpcache, "ENABLED", False)
+    session = Session(response(200, b"{}"), response(200, b"{}"))
+    httpcache.get(session, URL, "2024-01-01")
+    httpcache.get(session, URL, "2024-01-01")
+    assert len(session.sent) == 2
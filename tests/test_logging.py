@@ -0,0 +1,31 @@
+import logging
+from datetime import datetime
+import client
+import engine
+
+def logAt(handler: logging.Handler, day: str, message: str):
+    record = logging.LogRecord("test", logging.INFO, __file__, 0, message, None, None)
+    record.created = datetime.fromisoformat(day).timestamp()
+    handler.handle(record)
+
+def test_dated_handler_starts_a_file_per_day(tmp_path):
+    handler = engine.DatedFileHandler(str(tmp_path / "sync_%Y-%m-%d.log"))
+    logAt(handler, "2024-01-01T23:59:00", "first day")
+    logAt(handler, "2024-01-02T00:01:00", "second day")
+    handler.close()
+    assert (tmp_path / "sync_2024-01-01.log").read_text() == "first day\n"
+    assert (tmp_path / "sync_2024-01-02.log").read_text() == "second day\n"
+
+def test_shared_modules_log_to_one_file(tmp_path):
+    handlers = client.logger.handlers[:]
+    first = engine.setupLogging(logging.getLogger("first"), str(tmp_path / "first_%Y.log"))
+    second = engine.setupLogging(logging.getLogger("second"), str(tmp_path / "second_%Y.log"), modules=False)
+    try:
+        assert client.logger.handlers == handlers + [first]
+        assert second not in client.logger.handlers
+    finally:
+        for module in (engine.archive, client, engine.httpcache, engine.recordindex, engine.pipeline,
+                       engine.profiling, engine.shards):
+            module.logger.removeHandler(first)
+        logging.getLogger("first").removeHandler(first)
+        logging.getLogger("second").removeHandler(second)
@@ -0,0 +1,20 @@
+import pytest
+import pipeline
+
+def brokenInput(count: int):
+    yield from range(count)
+    raise ValueError("truncated listing")
+
+def test_run_stages_chains_stages_and_drops_failed_items():
+    def double(item):
+        if item == 3:
+            raise RuntimeError("bad item")
+        return item * 2
+    stages = [pipeline.Stage(double, 4), pipeline.Stage(lambda batch: [sum(batch)], 1, 100)]
+    assert pipeline.runStages(range(10), stages) == [sum(item * 2 for item in range(10) if item != 3)]
+
+def test_run_stages_raises_input_errors_after_draining_what_was_read():
+    seen = []
+    with pytest.raises(ValueError, match="truncated listing"):
+        pipeline.runStages(brokenInput(2), [pipeline.Stage(seen.append, 2)])
+    assert sorted(seen) == [0, 1]
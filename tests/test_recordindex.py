@@ -0,0 +1,30 @@
+from conftest import RECORDS, WINDOW
+import checkpoint
+import client
+import engine
+import pub
+import recordindex
+
+def syncCorpus(invenio) -> dict:
+    assert engine.runJournal(pub.source, checkpoint.Journal(passes=[{"action": "sync", **WINDOW}]), advance=False)
+    for day, record in enumerate(invenio.records.values(), 1):
+        record["created"] = f"2024-01-{day:02d}T00:00:00+00:00"
+    return {str(record["custom_fields"]["rdm:pubID"]): record["id"] for record in invenio.records.values()}
+
+def test_reconcile_slices_searches_larger_than_the_result_window(servers, monkeypatch):
+    _, invenio = servers
+    recordIDs = syncCorpus(invenio)
+    invenio.resultWindow = 2
+    monkeypatch.setattr(client, "RESULT_WINDOW", 2)
+    monkeypatch.setattr(client, "LOOKUP_PAGE_SIZE", 1)
+    assert engine.reconcileIndex(pub.source)
+    indexed = recordindex.getRecords("pub", list(recordIDs))
+    assert {sourceID: record["record_id"] for sourceID, record in indexed.items()} == recordIDs
+    assert len(recordIDs) == RECORDS
+
+def test_reconcile_logs_a_failed_search_and_keeps_the_index(servers):
+    _, invenio = servers
+    recordIDs = syncCorpus(invenio)
+    invenio.failures["search"] = 400
+    assert engine.reconcileIndex(pub.source) is False
+    assert len(recordindex.getRecords("pub", list(recordIDs))) == RECORDS
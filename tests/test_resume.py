@@ -0,0 +1,70 @@
+from conftest import RECORDS, WINDOW
+import checkpoint
+import engine
+import pub
+
+def test_sync_pass_with_stranded_records_is_not_done(tmp_path):
+    journal = checkpoint.newJournal(str(tmp_path), [{"action": "sync", **WINDOW}])
+    journal.record("new", "1", "created", record_id="abc")
+    journal.passDone(0)
+    assert not journal.isPassDone(0)
+    journal.record("new", "1", "accepted")
+    journal.record("modify", "2", "versioned", draft_url="http://invenio/api/records/def/draft")
+    assert not journal.isPassDone(0)
+    journal.record("modify", "2", "published")
+    assert journal.isPassDone(0)
+
+def test_resume_finishes_records_stranded_by_a_failed_review(servers):
+    _, invenio = servers
+    invenio.failures["review"] = 400
+    journal = checkpoint.newJournal(pub.source.checkpointDir, [{"action": "sync", **WINDOW}])
+    assert engine.runJournal(pub.source, journal, advance=False) is False
+    assert len(journal.stranded("new")) == RECORDS
+    assert not invenio.records and len(invenio.drafts) == RECORDS
+
+    invenio.failures.clear()
+    resumed = checkpoint.resumeJournal(pub.source.checkpointDir)
+    assert resumed is not None and resumed.path == journal.path
+    assert not resumed.isPassDone(0)
+    assert engine.runJournal(pub.source, resumed, advance=False)
+    assert not resumed.stranded("new")
+    assert resumed.isPassDone(0)
+    # The stranded drafts were published, not created again
+    assert len(invenio.records) == RECORDS
+    assert not invenio.drafts
+    assert checkpoint.resumeJournal(pub.source.checkpointDir) is None
+
+def test_resume_versions_again_when_the_stranded_draft_is_gone(servers):
+    misportal, invenio = servers
+    assert engine.runJournal(pub.source, checkpoint.newJournal(pub.source.checkpointDir, [{"action": "sync", **WINDOW}]),
+                             advance=False)
+    misportal.revise()
+    invenio.failures["updateDraft"] = 400
+    journal = checkpoint.newJournal(pub.source.checkpointDir, [{"action": "sync", **WINDOW}])
+    assert engine.runJournal(pub.source, journal, advance=False) is False
+    assert len(journal.stranded("modify")) == RECORDS
+
+    # The drafts are deleted in Invenio before the run is resumed
+    invenio.drafts.clear()
+    invenio.failures.clear()
+    resumed = checkpoint.resumeJournal(pub.source.checkpointDir)
+    assert engine.runJournal(pub.source, resumed, advance=False)
+    assert not resumed.stranded()
+    # Each record was published as the new version made again on resume
+    assert not invenio.drafts
+    assert len(invenio.records) == RECORDS
+    assert all(record["versions"]["index"] == 2 for record in invenio.records.values())
+
+def test_resume_creates_again_when_the_stranded_draft_is_gone(servers):
+    _, invenio = servers
+    invenio.failures["review"] = 400
+    journal = checkpoint.newJournal(pub.source.checkpointDir, [{"action": "sync", **WINDOW}])
+    assert engine.runJournal(pub.source, journal, advance=False) is False
+
+    # The drafts are deleted in Invenio before the run is resumed
+    invenio.drafts.clear()
+    invenio.failures.clear()
+    resumed = checkpoint.resumeJournal(pub.source.checkpointDir)
+    assert engine.runJournal(pub.source, resumed, advance=False)
+    assert not resumed.stranded()
+    assert len(invenio.records) == RECORDS
@@ -0,0 +1,44 @@
+import glob
+from conftest import WINDOW
+import checkpoint
+import engine
+import pub
+import scheduler
+import shards
+
+def test_scheduler_leaves_command_line_journals_alone(tmp_path, monkeypatch):
+    monkeypatch.setattr(pub.source, "checkpointDir", str(tmp_path))
+    monkeypatch.setattr(shards, "incrementalPasses", lambda source: [{"action": "sync", **WINDOW}])
+    ran = []
+    monkeypatch.setattr(engine, "runJournal", lambda source, journal, **budget: ran.append(journal) or True)
+    backfill = checkpoint.newJournal(str(tmp_path), [{"action": "new", "pub_year": "2020"}])
+    assert scheduler.syncSource(pub.source, {})
+    assert ran[0].path != backfill.path and ran[0].owner == scheduler.JOURNAL_OWNER
+    reopened = checkpoint.Journal(backfill.path)
+    assert reopened.resumes == 0 and not reopened.abandoned
+
+def test_scheduler_abandons_a_run_after_its_resume_attempts(tmp_path, monkeypatch):
+    monkeypatch.setattr(pub.source, "checkpointDir", str(tmp_path))
+    monkeypatch.setattr(shards, "incrementalPasses", lambda source: [{"action": "sync", **WINDOW}])
+    ran = []
+    monkeypatch.setattr(engine, "runJournal", lambda source, journal, **budget: ran.append(journal.path) and False)
+    for _ in range(scheduler.MAX_RESUME_ATTEMPTS + 2):
+        assert not scheduler.syncSource(pub.source, {})
+    first = ran[0]
+    assert ran[:scheduler.MAX_RESUME_ATTEMPTS + 1] == [first] * (scheduler.MAX_RESUME_ATTEMPTS + 1)
+    assert ran[-1] != first
+    assert checkpoint.Journal(first).abandoned
+    assert checkpoint.resumeJournal(str(tmp_path), scheduler.JOURNAL_OWNER).path == ran[-1]
+
+def test_prune_journals_keeps_runs_with_work_left(tmp_path):
+    finished = checkpoint.newJournal(str(tmp_path), [{"action": "sync", **WINDOW}])
+    finished.finish()
+    abandoned = checkpoint.newJournal(str(tmp_path), [{"action": "sync", **WINDOW}])
+    abandoned.abandon()
+    stranded = checkpoint.newJournal(str(tmp_path), [{"action": "sync", **WINDOW}])
+    stranded.record("new", "1", "created", record_id="abc")
+    stranded.finish()
+    interrupted = checkpoint.newJournal(str(tmp_path), [{"action": "sync", **WINDOW}])
+    assert checkpoint.pruneJournals(str(tmp_path), days=1) == 0
+    assert checkpoint.pruneJournals(str(tmp_path), days=-1) == 2
+    assert sorted(glob.glob(f"{tmp_path}/run_*.jsonl")) == [stranded.path, interrupted.path]
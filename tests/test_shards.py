@@ -0,0 +1,53 @@
+from datetime import date
+import checkpoint
+import recordindex
+import shards
+
+def test_date_windows_share_their_boundary_days():
+    assert shards.dateWindows(date(2024, 1, 1), date(2024, 3, 1), 30) == [
+        ("01/01/2024", "01/31/2024"), ("01/31/2024", "03/01/2024")]
+    assert shards.dateWindows(date(2024, 1, 1), date(2024, 1, 1)) == [("01/01/2024", "01/01/2024")]
+
+def test_backfill_passes_shard_on_the_dates_of_their_action():
+    [new] = shards.backfillPasses("new", date(2024, 1, 1), date(2024, 1, 10))
+    assert new == {"action": "new", "submit_date_after": "01/01/2024", "submit_date_before": "01/10/2024"}
+    [modify] = shards.backfillPasses("modify", date(2024, 1, 1), date(2024, 1, 10))
+    assert modify == {"action": "modify", "modification_date_after": "01/01/2024",
+                      "modification_date_before": "01/10/2024"}
+    [sync] = shards.backfillPasses("sync", date(2024, 1, 1), date(2024, 1, 10))
+    assert set(sync) == {"action", "submit_date_after", "submit_date_before",
+                         "modification_date_after", "modification_date_before"}
+
+def test_backfill_passes_shard_on_values():
+    assert shards.backfillPasses("modify", valueParam="pub_year", values=[2020, 2021]) == [
+        {"action": "modify", "pub_year": "2020"}, {"action": "modify", "pub_year": "2021"}]
+
+def test_incremental_passes_start_before_the_watermark(workdir):
+    [first] = shards.incrementalPasses("pub", today=date(2024, 1, 20))
+    assert (first["submit_date_after"], first["submit_date_before"]) == ("01/19/2024", "01/20/2024")
+    recordindex.setWatermark("pub", "2024-01-10")
+    [later] = shards.incrementalPasses("pub", today=date(2024, 1, 20))
+    assert later["modification_date_after"] == "01/09/2024"
+
+def test_advance_watermark_to_the_last_day_of_the_passes(workdir):
+    shards.advanceWatermark("pub", shards.backfillPasses("new", date(2024, 1, 1), date(2024, 3, 1), 30))
+    assert recordindex.getWatermark("pub") == "2024-03-01"
+
+def test_run_passes_leaves_failed_passes_for_resume():
+    journal = checkpoint.Journal(passes=[{"action": "new", "pub_year": str(year)} for year in (2020, 2021, 2022)])
+    calls = []
+    failing = {"2021": RuntimeError("listing failed"), "2022": False}
+
+    def call(action, pub_year, journal):
+        calls.append(pub_year)
+        if isinstance(failing.get(pub_year), Exception):
+            raise failing[pub_year]
+        return failing.get(pub_year, True)
+
+    assert not shards.runPasses(call, journal, workers=2)
+    assert journal.donePasses == {0} and not journal.finished
+    failing.clear()
+    calls.clear()
+    assert shards.runPasses(call, journal)
+    assert calls == ["2021", "2022"]
+    assert journal.finished
@@ -0,0 +1,35 @@
+import copy
+import pytest
+import corpus
+import pac
+import pub
+import validation
+
+def test_transformed_corpus_records_are_valid():
+    for recordID in range(1, 20):
+        assert validation.validateRecord(pub.transform(corpus.pubEntry(recordID))) == []
+        assert validation.validateRecord(pac.transform(corpus.pacEntry(recordID))) == []
+
+def test_invalid_records_report_each_broken_rule():
+    record = copy.deepcopy(pub.transform(corpus.pubEntry(1)))
+    record["metadata"]["title"] = " "
+    record["metadata"]["publication_date"] = "March 2020"
+    record["metadata"]["creators"][0]["person_or_org"] = {"type": "personal"}
+    record["access"]["files"] = "open"
+    del record["communities"]
+    errors = validation.validateRecord(record)
+    assert "metadata.title: is required" in errors
+    assert "metadata.publication_date: 'March 2020' is not an EDTF date" in errors
+    assert "metadata.creators[0].person_or_org.family_name: is required for a personal creator" in errors
+    assert "access.files: must be public or restricted" in errors
+    assert "communities.ids: must name the community to submit to" in errors
+
+def test_unknown_vocabulary_ids_are_reported():
+    record = copy.deepcopy(pac.transform(corpus.pacEntry(1)))
+    record["custom_fields"]["pac:pac_status"] = {"id": "maybe"}
+    assert "custom_fields.pac:pac_status.id: unknown id 'maybe'" in validation.validateRecord(record)
+
+def test_validate_against_a_schema():
+    pytest.importorskip("jsonschema")
+    schema = {"type": "object", "required": ["pids"]}
+    assert validation.validateSchema({"metadata": {}}, schema) == ["(record): 'pids' is a required property"]
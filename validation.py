@@ -0,0 +1,171 @@
+import json
+import re
+import mapping
+try:
+    import jsonschema
+except ImportError:
+    jsonschema = None
+
+# Resource types of the Invenio instance the syncs submit to
+RESOURCE_TYPES = {"publication-article", "publication-thesis", "publication-book", "publication-proposal",
+                  "publication-conferenceproceeding", "presentation", "poster", "other"}
+# Creator and contributor roles of the Invenio instance
+ROLES = {"researcher", "supervisor", "projectleader", "other"}
+# Relation types the syncs use in related_identifiers
+RELATION_TYPES = {"isderivedfrom", "isdocumentedby"}
+# Date types the syncs use in dates
+DATE_TYPES = {"submitted"}
+# Access levels of records and files
+ACCESS_LEVELS = {"public", "restricted"}
+# Division ids of the Invenio vocabulary, including the fallbacks of mapping
+DIVISION_IDS = (set(mapping.PUB_DIVISION_TITLE_ID.values()) | set(mapping.PAC_HALL_DIVISION_ID.values())
+                | {"OTHERS", "ENPH-OTHER", "AORD"})
+# PAC status ids of the Invenio vocabulary
+PAC_STATUS_IDS = set(mapping.PAC_STATUS_DICT.values())
+
+# A level 0 EDTF date or interval, the only dates Invenio accepts
+_edtfPattern = re.compile(r"^\d{4}(-\d{2}(-\d{2})?)?(/\d{4}(-\d{2}(-\d{2})?)?)?$")
+
+def _isEDTF(value) -> bool:
+    return isinstance(value, str) and bool(_edtfPattern.match(value))
+
+def _checkVocabulary(errors: list, path: str, value, allowed: set):
+    if not isinstance(value, dict) or "id" not in value:
+        errors.append(f"{path}: must be an object with an id")
+    elif value["id"] not in allowed:
+        errors.append(f"{path}.id: unknown id {value['id']!r}")
+
+def _checkPeople(errors: list, path: str, people, required: bool):
+    if not isinstance(people, list):
+        errors.append(f"{path}: must be a list")
+        return
+    if required and not people:
+        errors.append(f"{path}: must not be empty")
+    for index, person in enumerate(people):
+        personPath = f"{path}[{index}]"
+        personOrOrg = person.get("person_or_org") if isinstance(person, dict) else None
+        if not isinstance(personOrOrg, dict):
+            errors.append(f"{personPath}.person_or_org: is required")
+            continue
+        if personOrOrg.get("type") == "personal":
+            if not personOrOrg.get("family_name"):
+                errors.append(f"{personPath}.person_or_org.family_name: is required for a personal creator")
+        elif personOrOrg.get("type") == "organizational":
+            if not personOrOrg.get("name"):
+                errors.append(f"{personPath}.person_or_org.name: is required for an organizational creator")
+        else:
+            errors.append(f"{personPath}.person_or_org.type: must be personal or organizational")
+        if "role" in person:
+            _checkVocabulary(errors, f"{personPath}.role", person["role"], ROLES)
+        for affiliation in person.get("affiliations", []):
+            if not affiliation.get("name") and not affiliation.get("id"):
+                errors.append(f"{personPath}.affiliations: needs a name or an id")
+
+def _checkIdentifiers(errors: list, path: str, identifiers, related: bool):
+    if not isinstance(identifiers, list):
+        errors.append(f"{path}: must be a list")
+        return
+    for index, identifier in enumerate(identifiers):
+        if not isinstance(identifier, dict) or not identifier.get("identifier"):
+            errors.append(f"{path}[{index}].identifier: is required")
+            continue
+        if not identifier.get("scheme"):
+            errors.append(f"{path}[{index}].scheme: is required")
+        if related:
+            _checkVocabulary(errors, f"{path}[{index}].relation_type", identifier.get("relation_type"),
+                             RELATION_TYPES)
+
+def validateRecord(invenioDict: dict, schema: dict | None = None) -> list[str]:
+    """
+    Validates a transformed record offline, without asking Invenio.
+
+    The built-in rules cover what Invenio rejects a draft or its publication
+    for: the required metadata, EDTF dates, well-formed creators and
+    identifiers, and the ids of the vocabularies the syncs use. They are a
+    subset of the Invenio record schema, so a record passing them can still
+    be rejected for a rule they miss. With schema, the record is also
+    validated against that JSON schema.
+
+    Args:
+        invenioDict (dict): The transformed record.
+        schema (dict, optional): A JSON schema of the records, e.g. exported
+            from the Invenio instance. Needs the jsonschema package.
+
+    Returns:
+        list[str]: The errors found, as "path: message", empty if the record is valid.
+    """
+    errors = []
+    metadata = invenioDict.get("metadata")
+    if not isinstance(metadata, dict):
+        return ["metadata: is required"]
+    if not isinstance(metadata.get("title"), str) or not metadata["title"].strip():
+        errors.append("metadata.title: is required")
+    _checkVocabulary(errors, "metadata.resource_type", metadata.get("resource_type"), RESOURCE_TYPES)
+    if not _isEDTF(metadata.get("publication_date")):
+        errors.append(f"metadata.publication_date: {metadata.get('publication_date')!r} is not an EDTF date")
+    _checkPeople(errors, "metadata.creators", metadata.get("creators"), required=True)
+    if "contributors" in metadata:
+        _checkPeople(errors, "metadata.contributors", metadata["contributors"], required=False)
+    for index, dateDict in enumerate(metadata.get("dates", [])):
+        if not _isEDTF(dateDict.get("date")):
+            errors.append(f"metadata.dates[{index}].date: {dateDict.get('date')!r} is not an EDTF date")
+        _checkVocabulary(errors, f"metadata.dates[{index}].type", dateDict.get("type"), DATE_TYPES)
+    _checkIdentifiers(errors, "metadata.identifiers", metadata.get("identifiers", []), related=False)
+    _checkIdentifiers(errors, "metadata.related_identifiers", metadata.get("related_identifiers", []), related=True)
+    for index, rights in enumerate(metadata.get("rights", [])):
+        if not rights.get("id") and not rights.get("title"):
+            errors.append(f"metadata.rights[{index}]: needs an id or a title")
+
+    access = invenioDict.get("access")
+    if not isinstance(access, dict):
+        errors.append("access: is required")
+    else:
+        for field in ("record", "files"):
+            if access.get(field) not in ACCESS_LEVELS:
+                errors.append(f"access.{field}: must be public or restricted")
+    if not invenioDict.get("communities", {}).get("ids"):
+        errors.append("communities.ids: must name the community to submit to")
+
+    customFields = invenioDict.get("custom_fields", {})
+    for index, division in enumerate(customFields.get("rdm:division", [])):
+        _checkVocabulary(errors, f"custom_fields.rdm:division[{index}]", division, DIVISION_IDS)
+    if "pac:pac_status" in customFields:
+        _checkVocabulary(errors, "custom_fields.pac:pac_status", customFields["pac:pac_status"], PAC_STATUS_IDS)
+
+    if schema is not None:
+        errors += validateSchema(invenioDict, schema)
+    return errors
+
+def validateSchema(invenioDict: dict, schema: dict) -> list[str]:
+    """
+    Validates a record against a JSON schema.
+
+    Args:
+        invenioDict (dict): The transformed record.
+        schema (dict): The JSON schema.
+
+    Returns:
+        list[str]: The errors found, as "path: message".
+    """
+    if jsonschema is None:
+        raise RuntimeError("Validating against a schema needs the jsonschema package")
+    validator = jsonschema.validators.validator_for(schema)(schema)
+    return [f"{'.'.join(str(part) for part in error.absolute_path) or '(record)'}: {error.message}"
+            for error in validator.iter_errors(invenioDict)]
+
+def loadSchema(path: str) -> dict:
+    """
+    Loads a JSON schema of the records, checking that it can be used.
+
+    Args:
+        path (str): The schema file.
+
+    Returns:
+        dict: The schema.
+    """
+    if jsonschema is None:
+        raise RuntimeError("Validating against a schema needs the jsonschema package")
+    with open(path) as file:
+        schema = json.load(file)
+    jsonschema.validators.validator_for(schema).check_schema(schema)
+    return schema